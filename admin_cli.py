@@ -0,0 +1,323 @@
+"""
+🧰 Annapurna Admin CLI
+Bulk operations over every users/{uid} document (schema fixes, data
+clean-ups, re-encoding), run from your computer with the same
+firebase_credentials.json as the voice listener:
+
+1. Pages through users/ with a cursor (never all users in memory)
+2. Runs the chosen transforms on a page of users concurrently
+3. Commits what they return in size-capped batch() chunks
+4. Saves the cursor after every page, so a stopped run can --resume
+5. Saves the ids of users that failed, so --retry-failed can redo just those
+
+HOW TO USE:
+    python admin_cli.py --list
+    python admin_cli.py -t normalize-grocery-list --dry-run
+    python admin_cli.py -t migrate-subcollections -t compress-fields
+    python admin_cli.py -t my_fixes:fix_diet_charts --resume
+    python admin_cli.py -t my_fixes:fix_diet_charts --retry-failed
+
+A transform is fn(user_doc) → writes, where user_doc is the users/{uid}
+snapshot and writes use the user_data_store format:
+    ("set", (), {...})                          user document (merged)
+    ("set", (collection, doc_id), {...})        subcollection document (merged)
+    ("delete", (collection, doc_id), None)
+Give it a `fields` attribute (list of user-document fields it reads) so
+pages are fetched with a field mask; without one the whole document is read.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from field_codec import ENCODED_FIELDS, encode_value, is_encoded
+from firestore_admin import (
+    BATCH_SIZE, CREDENTIALS_FILE, PAGE_SIZE, ChunkedBatch, CredentialsMissing,
+    connect, print_credentials_help, user_pages,
+)
+from user_data_store import SCHEMA_VERSION, SUBCOLLECTIONS, doc_id, migration_writes, needs_migration
+
+STATE_FILE = ".admin_cli_state.json"
+WORKERS = 8
+
+# ═══════════════════════════════════════════════════════════════
+# BUILT-IN TRANSFORMS
+# ═══════════════════════════════════════════════════════════════
+
+TRANSFORMS = {}
+
+
+def transform(name, fields=None):
+    """Register a built-in transform under `name`"""
+    def register(fn):
+        fn.fields = fields
+        TRANSFORMS[name] = fn
+        return fn
+    return register
+
+
+@transform("normalize-grocery-list", fields=["grocery_list"])
+def normalize_grocery_list(user_doc):
+    """Grocery items → unique, trimmed, lower-case names"""
+    legacy = (user_doc.to_dict() or {}).get("grocery_list")
+    if legacy is not None:
+        # Still an array on the user document (schema_version 2)
+        if isinstance(legacy, str):
+            legacy = legacy.split(",")
+        elif isinstance(legacy, dict):
+            legacy = list(legacy)
+        cleaned = sorted({str(item).strip().lower() for item in legacy if str(item).strip()})
+        return [] if cleaned == legacy else [("set", (), {"grocery_list": cleaned})]
+
+    writes = []
+    for doc in user_doc.reference.collection("grocery_list").stream():
+        name = str((doc.to_dict() or {}).get("name", "")).strip().lower()
+        if name and doc.id == doc_id(name) and doc.to_dict().get("name") == name:
+            continue
+        writes.append(("delete", ("grocery_list", doc.id), None))
+        if name:
+            writes.append(("set", ("grocery_list", doc_id(name)), {"name": name}))
+    return writes
+
+
+@transform("migrate-subcollections")
+def migrate_subcollections(user_doc):
+    """Move an older user document's inline maps / grocery array into subcollections"""
+    root = user_doc.to_dict() or {}
+    if not needs_migration(root):
+        return []
+    # Docs already in a subcollection are newer than the inline copy
+    existing = {c: [doc.id for doc in user_doc.reference.collection(c).stream()] for c in SUBCOLLECTIONS}
+    writes = migration_writes(root, existing)
+    if writes:
+        writes.append(("set", (), {"schema_version": SCHEMA_VERSION}))
+    return writes
+
+
+@transform("compress-fields", fields=ENCODED_FIELDS["root"])
+def compress_fields(user_doc):
+    """Re-encode large fields written before the field codec existed"""
+    writes = []
+    root = user_doc.to_dict() or {}
+    updates = _encoded_updates("root", root)
+    if updates:
+        writes.append(("set", (), updates))
+    for collection in ENCODED_FIELDS:
+        if collection == "root":
+            continue
+        for doc in user_doc.reference.collection(collection).stream():
+            updates = _encoded_updates(collection, doc.to_dict() or {})
+            if updates:
+                writes.append(("set", (collection, doc.id), updates))
+    return writes
+
+
+def _encoded_updates(kind, data):
+    updates = {}
+    for field in ENCODED_FIELDS[kind]:
+        value = data.get(field)
+        if value is None or is_encoded(value):
+            continue
+        encoded = encode_value(value)
+        if encoded is not value:
+            updates[field] = encoded
+    return updates
+
+
+def load_transform(name):
+    """Built-in name or 'module:function'"""
+    if name in TRANSFORMS:
+        return TRANSFORMS[name]
+    module_name, _, function_name = name.partition(":")
+    if not function_name:
+        raise ValueError(f"Unknown transform '{name}' (use --list, or module:function)")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def field_mask(transforms):
+    """Union of the transforms' fields (None = whole document)"""
+    fields = set()
+    for fn in transforms:
+        wanted = getattr(fn, "fields", None)
+        if wanted is None:
+            return None
+        fields.update(wanted)
+    return sorted(fields)
+
+
+# ═══════════════════════════════════════════════════════════════
+# RUNNING
+# ═══════════════════════════════════════════════════════════════
+
+def run_transforms(transforms, user_doc):
+    """(user_doc, writes, error) for one user"""
+    try:
+        writes = []
+        for fn in transforms:
+            writes.extend(fn(user_doc) or [])
+        return user_doc, writes, None
+    except Exception as e:
+        return user_doc, [], e
+
+
+def apply_user_writes(batch, user_doc, writes, stamp=None):
+    """Queue one user's writes; stamps last_updated so open app sessions reload"""
+    root = user_doc.reference
+    for kind, path, data in writes:
+        ref = root if not path else root.collection(path[0]).document(path[1])
+        if kind == "delete":
+            batch.delete(ref, owner=user_doc.id)
+        else:
+            batch.set(ref, data, owner=user_doc.id)
+    if stamp:
+        batch.set(root, {"last_updated": stamp}, owner=user_doc.id)
+
+
+def failed_user_pages(db, user_ids, page_size, fields=None):
+    """Pages of users/{uid} snapshots for the given ids (users deleted since are left out)"""
+    users = db.collection("users")
+    for start in range(0, len(user_ids), page_size):
+        page = []
+        for user_id in user_ids[start:start + page_size]:
+            user_doc = users.document(user_id).get(field_paths=fields) if fields else users.document(user_id).get()
+            if user_doc.exists:
+                page.append(user_doc)
+        yield page
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run bulk transforms over every Annapurna user")
+    parser.add_argument("-t", "--transform", action="append", default=[],
+                        help="built-in name or module:function (repeatable, run in order)")
+    parser.add_argument("--list", action="store_true", help="show the built-in transforms")
+    parser.add_argument("--credentials", default=CREDENTIALS_FILE)
+    parser.add_argument("--dry-run", action="store_true", help="count writes without committing")
+    parser.add_argument("--resume", action="store_true", help="continue after the cursor in --state")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="only re-run the users that failed, as saved in --state")
+    parser.add_argument("--start-after", help="user id to start after")
+    parser.add_argument("--state", default=STATE_FILE, help="where the cursor and failed users are saved")
+    parser.add_argument("--limit", type=int, help="stop after this many users")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--no-stamp", action="store_true", help="don't bump last_updated on changed users")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, fn in TRANSFORMS.items():
+            print(f"  {name:<26} {fn.__doc__}")
+        return
+    if not args.transform:
+        parser.error("pick at least one --transform (see --list)")
+
+    try:
+        transforms = [load_transform(name) for name in args.transform]
+    except (ValueError, ImportError, AttributeError) as e:
+        print(f"❌ {str(e)}")
+        sys.exit(1)
+
+    try:
+        db = connect(args.credentials)
+    except CredentialsMissing:
+        print_credentials_help(args.credentials)
+        sys.exit(1)
+
+    state = {}
+    if args.resume or args.retry_failed:
+        state = load_state(args.state)
+        if state.get("transforms") not in (None, args.transform):
+            print(f"⚠️ {args.state} was saved for {state['transforms']}, not {args.transform}")
+    start_after = args.start_after or (state.get("last_user") if args.resume else None)
+    failed_ids = set(state.get("failed", []))  # carried over: still failed until a run fixes them
+
+    fields = field_mask(transforms)
+    batch = ChunkedBatch(db, size=args.batch_size, dry_run=args.dry_run)
+    started = time.time()
+    users = changed = writes_total = 0
+    last_user = start_after or state.get("last_user")
+
+    if args.retry_failed:
+        if not failed_ids:
+            print(f"✅ No failed users saved in {args.state}")
+            return
+        pages = failed_user_pages(db, sorted(failed_ids), args.page_size, fields=fields)
+        print(f"🧰 {', '.join(args.transform)}{' (dry run)' if args.dry_run else ''}"
+              f" for {len(failed_ids)} failed user(s)")
+    else:
+        pages = user_pages(db, args.page_size, fields=fields, start_after=start_after)
+        print(f"🧰 {', '.join(args.transform)}{' (dry run)' if args.dry_run else ''}"
+              f"{f' after {start_after}' if start_after else ''}")
+
+    failed_now = set()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for page in pages:
+            if args.limit is not None:
+                page = page[:max(0, args.limit - users)]
+            stamp = None if args.no_stamp else datetime.now().isoformat()
+            failed_ids.difference_update(user_doc.id for user_doc in page)
+            for user_doc, writes, error in pool.map(lambda doc: run_transforms(transforms, doc), page):
+                users += 1
+                if error is not None:
+                    failed_now.add(user_doc.id)
+                    print(f"❌ {user_doc.id}: {str(error)}")
+                    continue
+                if writes:
+                    changed += 1
+                    writes_total += len(writes)
+                    try:
+                        apply_user_writes(batch, user_doc, writes, stamp)
+                    except Exception as e:
+                        print(f"❌ Batch failed at {user_doc.id}: {str(e)}")
+            try:
+                batch.commit()
+            except Exception as e:
+                print(f"❌ Batch failed: {str(e)}")
+            # Every user with a write in a chunk that didn't commit is redone by --retry-failed
+            failed_now |= batch.failed_owners
+            failed_ids |= failed_now
+            if page and not args.retry_failed:
+                last_user = page[-1].id
+            if not args.dry_run and last_user:
+                save_state(args.state, {"transforms": args.transform, "last_user": last_user,
+                                        "failed": sorted(failed_ids),
+                                        "saved": datetime.now().isoformat()})
+
+            elapsed = max(time.time() - started, 1e-6)
+            print(f"   ...{users} users ({users / elapsed:.0f}/s), {changed} changed, "
+                  f"{writes_total} writes ({writes_total / elapsed:.0f}/s), "
+                  f"{batch.bytes / 1024:.0f} KB in {batch.commits} batches")
+            if args.limit is not None and users >= args.limit:
+                break
+
+    elapsed = time.time() - started
+    print(f"✅ {users} users ({changed} changed, {len(failed_now)} failed), {writes_total} writes, "
+          f"{batch.committed} committed in {batch.commits} batches, {elapsed:.1f}s")
+    if last_user:
+        print(f"   Last user: {last_user}")
+    if failed_now:
+        print(f"   Failed users are saved in {args.state}; re-run them with --retry-failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+📊 Annapurna User-Data Benchmark (Firestore EMULATOR only)
+Measures how the persistence layer behaves as documents and user counts
+grow: login load, auto-save during a session, and voice command delivery.
+For every scenario it reports latency (p50/p95), bytes moved and
+Firestore operations per simulated session minute, and can compare a run
+against a saved baseline to catch regressions.
+
+HOW TO USE:
+1. Start the emulator:   firebase emulators:start --only firestore
+2. Point at it:          export FIRESTORE_EMULATOR_HOST=localhost:8080
+3. Run:                  python benchmark_user_data.py --save bench_results/base.json
+4. After a change:       python benchmark_user_data.py --compare bench_results/base.json
+
+Exits with status 1 when a metric got worse than --threshold (default 15%).
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from field_codec import encode_fields
+from firestore_monitor import percentile
+from firestore_writer import WriteBehindQueue
+from local_cache import LocalCache
+from user_data_store import (
+    ChangeTracker, apply_writes, build_records, diff_records, load_user_records, records_to_state,
+    EAGER_COLLECTIONS, EAGER_ROOT_FIELDS,
+)
+from voice_channel import VoiceCommandHub, save_voice_command
+
+# ═══════════════════════════════════════════════════════════════
+# SYNTHETIC USERS
+# ═══════════════════════════════════════════════════════════════
+
+ITEMS = [
+    "Tomato", "Onion", "Potato", "Paneer", "Milk", "Curd", "Rice", "Atta", "Toor Dal", "Moong Dal",
+    "Ghee", "Butter", "Eggs", "Chicken", "Spinach", "Cauliflower", "Capsicum", "Ginger", "Garlic",
+    "Green Chilli", "Coriander", "Jeera", "Turmeric", "Garam Masala", "Besan", "Poha", "Rava", "Oats",
+]
+QUANTITIES = ["1 kg", "500 g", "250 g", "2 L", "1 L", "12", "6", "1 packet", "200 g"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MEALS = ["Breakfast", "Mid-morning", "Lunch", "Evening snack", "Dinner"]
+
+
+def synthetic_state(rng, items, charts, favourites, tried):
+    """Session-state shaped user data of the requested size"""
+    names = [f"{ITEMS[i % len(ITEMS)]} {i // len(ITEMS)}" if i >= len(ITEMS) else ITEMS[i] for i in range(items)]
+    return {
+        "inventory": {name: rng.choice(QUANTITIES) for name in names},
+        "inventory_prices": {name: round(rng.uniform(10, 600), 2) for name in names if rng.random() < 0.7},
+        "inventory_expiry": {name: rng.randint(-3, 30) for name in names if rng.random() < 0.5},
+        "grocery_list": {rng.choice(ITEMS) for _ in range(rng.randint(3, 15))},
+        "diet_charts": {
+            f"Plan {c + 1}": {
+                "type": rng.choice(["Weight Loss", "Muscle Gain", "Balanced"]),
+                "duration": "1 Week",
+                "schedule": {
+                    day: {meal: f"{rng.choice(ITEMS)} with {rng.choice(ITEMS)} ({rng.randint(150, 600)} kcal)" for meal in MEALS}
+                    for day in DAYS
+                },
+                "notes": "Drink 3 L water daily. " * rng.randint(1, 5),
+                "created": datetime.now().isoformat(),
+            }
+            for c in range(charts)
+        },
+        "favourite_recipes": {
+            f"Recipe {f + 1}": "### Ingredients\n" + "\n".join(f"- {rng.choice(ITEMS)}" for _ in range(8))
+            + "\n### Steps\n" + "\n".join(f"{s + 1}. Cook for {rng.randint(2, 20)} minutes" for s in range(10))
+            for f in range(favourites)
+        },
+        "tried_recipes": [
+            {"recipe": f"Recipe {t + 1}", "rating": rng.randint(1, 5), "date": datetime.now().isoformat()}
+            for t in range(tried)
+        ],
+    }
+
+
+def seed_user(db, writer, user_id, state):
+    writer.set(db.collection("users").document(user_id), {"email": f"{user_id}@bench.local", "name": user_id}, merge=True)
+    apply_writes(db, writer, user_id, diff_records({}, build_records(state)))
+    writer.flush(timeout=120)
+
+
+def delete_user(db, user_id):
+    root = db.collection("users").document(user_id)
+    for collection in root.collections():
+        for doc in collection.stream():
+            doc.reference.delete()
+    root.delete()
+
+
+# ═══════════════════════════════════════════════════════════════
+# MEASURING
+# ═══════════════════════════════════════════════════════════════
+
+def value_size(value):
+    """Firestore storage size of a value (https://firebase.google.com/docs/firestore/storage-size)"""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(key).encode("utf-8")) + 1 + value_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(value_size(item) for item in value)
+    return len(str(value)) + 1
+
+
+def doc_size(path, data):
+    return len(path.encode("utf-8")) + 1 + 32 + value_size(data or {})
+
+
+def summarize(latencies, **extra):
+    return dict(
+        p50_ms=round(percentile(latencies, 50) * 1000, 2),
+        p95_ms=round(percentile(latencies, 95) * 1000, 2),
+        **extra,
+    )
+
+
+def bench_load(db, user_ids, repeats, collections=None, fields=None):
+    """User doc + subcollections (default: everything; chat path: field mask + inventory)"""
+    latencies, reads, read_bytes = [], 0, 0
+    for _ in range(repeats):
+        for user_id in user_ids:
+            started = time.perf_counter()
+            root_data, records, _ = load_user_records(db, user_id, collections=collections, fields=fields)
+            latencies.append(time.perf_counter() - started)
+
+            reads += 1
+            # Sizes as stored (codec fields compressed), not as decoded
+            read_bytes += doc_size(f"users/{user_id}", encode_fields("root", root_data))
+            for collection, docs in records.items():
+                if collection == "root":
+                    continue
+                reads += len(docs)
+                read_bytes += sum(
+                    doc_size(f"users/{user_id}/{collection}/{key}", encode_fields(collection, doc))
+                    for key, doc in docs.items()
+                )
+    runs = repeats * len(user_ids)
+    return summarize(latencies, reads_per_load=reads / runs, bytes_per_load=int(read_bytes / runs))
+
+
+def bench_local_load(db, user_ids, repeats):
+    """Warm login from the local SQLite cache"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LocalCache(os.path.join(tmp, "bench.sqlite3"))
+        for user_id in user_ids:
+            root_data, records, _ = load_user_records(db, user_id)
+            cache.merge_remote(user_id, root_data, records)
+        latencies = []
+        for _ in range(repeats):
+            for user_id in user_ids:
+                started = time.perf_counter()
+                cache.load(user_id)
+                latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
+
+
+def bench_autosave(db, user_ids, rng, minutes, edits_per_minute):
+    """
+    The auto-save block over simulated session minutes: every edit is a
+    rerun that diffs the session and queues the changed records.
+    """
+    writer = WriteBehindQueue(db)
+    latencies, write_bytes = [], 0
+    committed_before = writer.stats["committed"]
+
+    for user_id in user_ids:
+        root_data, records, _ = load_user_records(db, user_id)
+        state = records_to_state(records)
+        tracker = ChangeTracker()
+        tracker.mark_persisted(state)
+
+        for _ in range(minutes * edits_per_minute):
+            edit = rng.random()
+            items = list(state["inventory"]) or ["Tomato"]
+            if edit < 0.5:
+                state["inventory"][rng.choice(items)] = rng.choice(QUANTITIES)
+            elif edit < 0.7:
+                state["inventory_expiry"][rng.choice(items)] = rng.randint(0, 30)
+            elif edit < 0.9:
+                state["grocery_list"].add(rng.choice(ITEMS))
+            else:
+                state["inventory"].pop(rng.choice(items), None)
+
+            started = time.perf_counter()
+            writes = tracker.collect_writes(state)
+            apply_writes(db, writer, user_id, writes)
+            tracker.mark_persisted(state)
+            latencies.append(time.perf_counter() - started)
+
+            write_bytes += sum(value_size(data) for _, _, data in writes)
+
+    writer.flush(timeout=120)
+    session_minutes = minutes * len(user_ids)
+    return summarize(
+        latencies,
+        writes_per_minute=round((writer.stats["committed"] - committed_before) / session_minutes, 2),
+        batches_per_minute=round(writer.stats["batches"] / session_minutes, 2),
+        bytes_per_minute=int(write_bytes / session_minutes),
+        errors=writer.stats["errors"],
+    )
+
+
+def bench_voice(db, user_id, commands, timeout=10):
+    """Listener → app inbox delivery (on_snapshot + atomic claim)"""
+    hub = VoiceCommandHub(db)
+    hub.subscribe("bench-session", user_id)
+    time.sleep(1)  # let the listener attach
+
+    latencies, lost = [], 0
+    for i in range(commands):
+        text = f"bench command {i}"
+        started = time.perf_counter()
+        save_voice_command(db, user_id, text)
+        while time.perf_counter() - started < timeout:
+            if hub.poll("bench-session") == text:
+                latencies.append(time.perf_counter() - started)
+                break
+            time.sleep(0.005)
+        else:
+            lost += 1
+
+    hub.unsubscribe("bench-session")
+    return summarize(latencies or [timeout], lost=lost)
+
+
+# ═══════════════════════════════════════════════════════════════
+# REPORTING
+# ═══════════════════════════════════════════════════════════════
+
+# metric → True if bigger is worse
+LOWER_IS_BETTER = {
+    "p50_ms": True, "p95_ms": True, "reads_per_load": True, "bytes_per_load": True,
+    "writes_per_minute": True, "batches_per_minute": True, "bytes_per_minute": True,
+    "errors": True, "lost": True,
+}
+
+
+def compare(baseline, results, threshold):
+    """Lines for every metric that moved; returns (lines, regressions)"""
+    lines, regressions = [], 0
+    for scenario, metrics in results["scenarios"].items():
+        old_metrics = baseline.get("scenarios", {}).get(scenario)
+        if not old_metrics:
+            lines.append(f"  {scenario}: new scenario")
+            continue
+        for metric, value in metrics.items():
+            old = old_metrics.get(metric)
+            if not isinstance(old, (int, float)) or metric not in LOWER_IS_BETTER:
+                continue
+            if old == 0:
+                worse = value > 0
+                change = "new" if worse else "="
+            else:
+                ratio = (value - old) / old
+                worse = ratio > threshold
+                change = f"{ratio:+.0%}"
+            marker = "❌ REGRESSION" if worse else ("✅ better" if value < old else "")
+            if worse:
+                regressions += 1
+            lines.append(f"  {scenario:<28} {metric:<20} {old:>12} → {value:<12} {change:>6} {marker}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Annapurna's Firestore user-data layer (emulator only)")
+    parser.add_argument("--project", default="annapurna-bench")
+    parser.add_argument("--users", type=int, default=5, help="synthetic users per size")
+    parser.add_argument("--sizes", default="20,100,400", help="inventory sizes to test")
+    parser.add_argument("--charts", type=int, default=3)
+    parser.add_argument("--favourites", type=int, default=10)
+    parser.add_argument("--tried", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--minutes", type=int, default=2, help="simulated session minutes per user")
+    parser.add_argument("--edits-per-minute", type=int, default=6)
+    parser.add_argument("--voice-commands", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown before flagging (0.15 = 15%%)")
+    parser.add_argument("--keep", action="store_true", help="don't delete the synthetic users afterwards")
+    args = parser.parse_args()
+
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        print("❌ FIRESTORE_EMULATOR_HOST is not set - this benchmark only runs against the emulator")
+        print("💡 firebase emulators:start --only firestore  then  export FIRESTORE_EMULATOR_HOST=localhost:8080")
+        sys.exit(2)
+
+    from google.cloud import firestore as gcloud_firestore
+    db = gcloud_firestore.Client(project=args.project)
+
+    rng = random.Random(args.seed)
+    run_id = f"bench_{int(time.time())}"
+    results = {"created": datetime.now().isoformat(), "args": vars(args), "scenarios": {}}
+    seeded = []
+
+    print("=" * 60)
+    print("📊 Annapurna user-data benchmark")
+    print("=" * 60)
+
+    try:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            user_ids = [f"{run_id}_{size}_{n}" for n in range(args.users)]
+            print(f"🌱 Seeding {len(user_ids)} users with {size} inventory items...")
+            seed_writer = WriteBehindQueue(db)
+            for user_id in user_ids:
+                state = synthetic_state(rng, size, args.charts, args.favourites, args.tried)
+                seed_user(db, seed_writer, user_id, state)
+                seeded.append(user_id)
+
+            print(f"⏱️  inventory={size}: load / chat load / local load / auto-save")
+            results["scenarios"][f"load[{size}]"] = bench_load(db, user_ids, args.repeats)
+            results["scenarios"][f"chat_load[{size}]"] = bench_load(
+                db, user_ids, args.repeats, collections=EAGER_COLLECTIONS, fields=EAGER_ROOT_FIELDS
+            )
+            results["scenarios"][f"local_load[{size}]"] = bench_local_load(db, user_ids, args.repeats)
+            results["scenarios"][f"autosave[{size}]"] = bench_autosave(
+                db, user_ids, rng, args.minutes, args.edits_per_minute
+            )
+
+        if args.voice_commands:
+            print("⏱️  voice command delivery")
+            voice_user = f"{run_id}_voice"
+            seeded.append(voice_user)
+            results["scenarios"]["voice"] = bench_voice(db, voice_user, args.voice_commands)
+    finally:
+        if not args.keep:
+            for user_id in seeded:
+                delete_user(db, user_id)
+
+    print()
+    for scenario, metrics in results["scenarios"].items():
+        print(f"  {scenario:<28} " + "  ".join(f"{key}={value}" for key, value in metrics.items()))
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(baseline, results, args.threshold)
+        print(f"\n📈 Compared with {args.compare} (threshold {args.threshold:.0%})")
+        print("\n".join(lines))
+        if regressions:
+            print(f"\n❌ {regressions} regression(s)")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
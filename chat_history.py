@@ -0,0 +1,129 @@
+"""
+💬 Annapurna Chat History
+Chat turns are appended to Firestore as they happen, so a conversation
+survives reloads and the session only keeps the latest turns in memory:
+
+    users/{uid}/chats/{chat}                 title, preview, message_count, next_seq, created_at, updated_at
+    users/{uid}/chats/{chat}/messages/{seq}  role, content, seq, created_at
+
+Messages are never rewritten - each one is written once, under a
+zero-padded sequence number. Sequence numbers are handed out by a
+transaction on the chat's index entry, so two tabs adding to the same
+chat get different ones. Opening a chat reads only its latest page;
+older pages are fetched with a cursor on `seq` when asked for. Long
+message text goes through the field codec like recipes do.
+"""
+
+import uuid
+from datetime import datetime
+from firebase_admin import firestore
+from field_codec import decode_fields, encode_fields
+from user_data_store import user_ref
+
+CHATS_COLLECTION = "chats"
+MESSAGES_COLLECTION = "messages"
+PAGE_SIZE = 20          # messages read when a chat is opened / per "load older"
+SESSION_WINDOW = 40     # messages kept in session memory (the rest stay in Firestore)
+INDEX_SIZE = 20         # chats shown in the past-chats list
+TITLE_LENGTH = 60
+
+
+def chats_ref(db, user_id):
+    return user_ref(db, user_id).collection(CHATS_COLLECTION)
+
+
+def messages_ref(db, user_id, chat_id):
+    return chats_ref(db, user_id).document(chat_id).collection(MESSAGES_COLLECTION)
+
+
+def new_chat_id():
+    """Sorts by creation time, unique across devices"""
+    return f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def message_id(seq):
+    return f"{seq:08d}"
+
+
+def chat_title(messages):
+    """First user message, shortened"""
+    for message in messages:
+        if message.get("role") == "user" and message.get("content"):
+            text = " ".join(str(message["content"]).split())
+            return text if len(text) <= TITLE_LENGTH else text[:TITLE_LENGTH - 1] + "…"
+    return "New chat"
+
+
+@firestore.transactional
+def _reserve(transaction, ref, messages, stamp):
+    """Claim len(messages) seqs on the chat's index entry and update its summary; returns the first"""
+    snapshot = ref.get(transaction=transaction)
+    chat = (snapshot.to_dict() or {}) if snapshot.exists else {}
+    first_seq = chat.get("next_seq", chat.get("message_count", 0))
+    summary = {
+        "updated_at": stamp,
+        "next_seq": first_seq + len(messages),
+        "message_count": firestore.Increment(len(messages)),
+        "preview": " ".join(str(messages[-1]["content"]).split())[:120],
+    }
+    if not snapshot.exists:
+        summary.update(title=chat_title(messages), created_at=stamp)
+    transaction.set(ref, summary, merge=True)
+    return first_seq
+
+
+def append_messages(db, writer, user_id, chat_id, messages):
+    """
+    Give `messages` (role/content dicts) the chat's next free seqs and
+    queue them. Waits for one transaction on the chat's index entry
+    (callers wrap it in firestore_monitor.track()); returns the seq of
+    the first message.
+    """
+    if not messages:
+        return None
+    stamp = datetime.now().isoformat()
+    first_seq = _reserve(db.transaction(), chats_ref(db, user_id).document(chat_id), messages, stamp)
+    items = messages_ref(db, user_id, chat_id)
+    for offset, message in enumerate(messages):
+        seq = first_seq + offset
+        writer.set(items.document(message_id(seq)), encode_fields(MESSAGES_COLLECTION, {
+            "role": message["role"],
+            "content": message["content"],
+            "seq": seq,
+            "created_at": stamp,
+        }), merge=False)
+    return first_seq
+
+
+def _to_messages(docs):
+    """Snapshots (any order) → [{"role", "content", "seq"}] oldest first"""
+    messages = []
+    for doc in docs:
+        data = decode_fields(MESSAGES_COLLECTION, doc.to_dict() or {})
+        messages.append({"role": data.get("role", "assistant"), "content": data.get("content", ""), "seq": data.get("seq", 0)})
+    return sorted(messages, key=lambda message: message["seq"])
+
+
+def load_page(db, user_id, chat_id, before_seq=None, limit=PAGE_SIZE, timeout=10):
+    """
+    Latest `limit` messages of a chat, or the `limit` just before
+    `before_seq` (cursor). Oldest first, each with its "seq".
+    """
+    query = messages_ref(db, user_id, chat_id).order_by("seq", direction=firestore.Query.DESCENDING)
+    if before_seq is not None:
+        query = query.start_after({"seq": before_seq})
+    return _to_messages(query.limit(limit).stream(timeout=timeout))
+
+
+def list_chats(db, user_id, limit=INDEX_SIZE, timeout=10):
+    """Most recently used chats: [{"id", "title", "preview", "message_count", "updated_at"}]"""
+    query = chats_ref(db, user_id).order_by("updated_at", direction=firestore.Query.DESCENDING).limit(limit)
+    return [dict(doc.to_dict() or {}, id=doc.id) for doc in query.stream(timeout=timeout)]
+
+
+def load_recent_chat(db, user_id, limit=PAGE_SIZE):
+    """(chat summary or None, its latest messages) - what a fresh login reopens"""
+    chats = list_chats(db, user_id, limit=1)
+    if not chats:
+        return None, []
+    return chats[0], load_page(db, user_id, chats[0]["id"], limit=limit)
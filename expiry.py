@@ -0,0 +1,58 @@
+"""
+⏰ Annapurna Expiry Helpers
+Inventory items store the date they expire (expires_on); "days left" is
+always worked out from that date, so it can't drift no matter how often
+(or rarely) anyone logs in. Shared by the app and the nightly expiry job.
+"""
+
+from datetime import date, timedelta
+
+EXPIRING_SOON_DAYS = 3   # banner threshold
+
+
+def to_date(value):
+    """ISO string / date / datetime → date (None if missing or unreadable)"""
+    if value is None:
+        return None
+    if hasattr(value, "date") and callable(value.date):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def expires_on(days_left, reference=None):
+    """Days left (as of `reference`, default today) → ISO expiry date"""
+    reference = to_date(reference) or date.today()
+    return (reference + timedelta(days=int(days_left))).isoformat()
+
+
+def days_until(expiry_date, today=None):
+    """ISO expiry date → days left (negative once expired; None if unreadable)"""
+    expiry_date = to_date(expiry_date)
+    if expiry_date is None:
+        return None
+    return (expiry_date - (to_date(today) or date.today())).days
+
+
+def summarize_expiry(inventory_expiry, today=None, soon=EXPIRING_SOON_DAYS):
+    """
+    {item: days_left} → what the banner shows:
+    {"date": ..., "expired": [{"name", "days"}], "expiring": [{"name", "days"}]}
+    """
+    expired, expiring = [], []
+    for name, days in sorted(inventory_expiry.items(), key=lambda pair: str(pair[0])):
+        if not isinstance(days, (int, float)):
+            continue
+        if days <= 0:
+            expired.append({"name": name, "days": int(days)})
+        elif days <= soon:
+            expiring.append({"name": name, "days": int(days)})
+    return {
+        "date": (to_date(today) or date.today()).isoformat(),
+        "expired": expired,
+        "expiring": expiring,
+    }
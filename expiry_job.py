@@ -0,0 +1,139 @@
+"""
+🌙 Annapurna Nightly Expiry Job
+Runs once a day (headless) for every user instead of counting down
+expiry when someone logs in:
+
+1. Pages through users/ with a cursor (users are never all in memory)
+2. Recomputes each inventory item's days left from its stored expiry date
+   (items saved before dates existed get one, counted from today)
+3. Writes only what changed, in bounded batch() chunks (update(): an
+   item deleted while the job runs isn't brought back)
+4. Leaves an "expiring soon" summary on users/{uid} for the app's banner
+5. Users whose writes were in a chunk that failed are redone once at the end
+
+HOW TO USE:
+    python expiry_job.py                 # uses firebase_credentials.json
+    python expiry_job.py --dry-run       # report only, no writes
+
+Cron (every night at 02:30):
+    30 2 * * *  cd /path/to/annapurna && python expiry_job.py >> expiry_job.log 2>&1
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, datetime
+
+from expiry import days_until, expires_on, summarize_expiry, to_date
+from firestore_admin import (
+    BATCH_SIZE, CREDENTIALS_FILE, PAGE_SIZE, ChunkedBatch, CredentialsMissing,
+    connect, print_credentials_help, stream_users,
+)
+
+EXPIRY_FIELDS = ["schema_version", "expiry_summary"]   # field mask for the user pages
+
+
+def process_user(user_doc, today, batch):
+    """Refresh one user's inventory expiry; returns how many items changed"""
+    user = user_doc.to_dict() or {}
+    if user.get("schema_version", 1) < 2:
+        return None  # old single-document layout; moved over on the user's next login
+
+    expiry = {}
+    changed = 0
+    for item in user_doc.reference.collection("inventory").stream():
+        record = item.to_dict()
+        updates = {}
+
+        stored_date = to_date(record.get("expires_on"))
+        if stored_date is None and isinstance(record.get("expiry_days"), (int, float)):
+            # Saved before expiry dates existed: best guess is "days left as of today"
+            stored_date = to_date(expires_on(record["expiry_days"], today))
+            updates["expires_on"] = stored_date.isoformat()
+        if stored_date is None:
+            continue
+
+        days = days_until(stored_date, today)
+        if days != record.get("expiry_days"):
+            updates["expiry_days"] = days
+        if updates:
+            batch.update(item.reference, updates, owner=user_doc.id)
+            changed += 1
+        expiry[record.get("name", item.id)] = days
+
+    summary = summarize_expiry(expiry, today)
+    previous = user.get("expiry_summary")
+    if changed or (expiry and previous != summary) or (previous and not expiry):
+        batch.update(user_doc.reference, {
+            "expiry_summary": summary,
+            # lets open app sessions (local cache sync) notice and reload
+            "last_updated": datetime.now().isoformat(),
+        }, owner=user_doc.id)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute inventory expiry for every Annapurna user")
+    parser.add_argument("--credentials", default=CREDENTIALS_FILE)
+    parser.add_argument("--date", help="pretend today is this date (YYYY-MM-DD)")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="count changes without writing")
+    args = parser.parse_args()
+
+    try:
+        db = connect(args.credentials)
+    except CredentialsMissing:
+        print_credentials_help(args.credentials)
+        sys.exit(1)
+
+    today = to_date(args.date) or date.today()
+    batch = ChunkedBatch(db, size=args.batch_size, dry_run=args.dry_run)
+    started = time.time()
+    users = skipped = items = failed = 0
+
+    print(f"🌙 Expiry job for {today.isoformat()}{' (dry run)' if args.dry_run else ''}")
+    errored = set()
+    for user_doc in stream_users(db, args.page_size, fields=EXPIRY_FIELDS):
+        users += 1
+        try:
+            changed = process_user(user_doc, today, batch)
+        except Exception as e:
+            errored.add(user_doc.id)
+            print(f"❌ {user_doc.id}: {str(e)}")
+            continue
+        if changed is None:
+            skipped += 1
+        else:
+            items += changed
+        if users % 1000 == 0:
+            print(f"   ...{users} users, {items} items updated")
+    try:
+        batch.commit()
+    except Exception as e:
+        print(f"❌ Final batch failed: {str(e)}")
+
+    # A failed chunk drops the writes of every user in it, not just the one being processed
+    retry = sorted(errored | batch.failed_owners)
+    if retry:
+        print(f"🔁 Retrying {len(retry)} user(s) whose writes didn't go through")
+    for user_id in retry:
+        try:
+            user_doc = db.collection("users").document(user_id).get(field_paths=EXPIRY_FIELDS)
+            if user_doc.exists:
+                process_user(user_doc, today, batch)
+            batch.commit()  # one user per commit: a failure here is this user's alone
+        except Exception as e:
+            failed += 1
+            print(f"❌ {user_id}: {str(e)}")
+
+    elapsed = time.time() - started
+    print(f"✅ {users} users ({skipped} old layout, {failed} failed), "
+          f"{items} items updated ({batch.skipped} deleted meanwhile), "
+          f"{batch.committed} writes in {batch.commits} batches, {elapsed:.1f}s")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+🗜️ Annapurna Field Codec
+Large text and nested fields (diet chart schedules, recipes, the gym diet
+chart) are stored in Firestore as compressed blobs instead of raw
+strings/maps.
+
+A blob is bytes:  b"ANZ" + version byte + zlib(JSON of the value)
+
+Anything that isn't such a blob is returned unchanged, so documents
+written before the codec existed still read fine. Small values are left
+alone when compressing wouldn't pay off.
+"""
+
+import json
+import zlib
+
+MAGIC = b"ANZ"
+CODEC_VERSION = 1
+MIN_SIZE = 200            # bytes; smaller values are stored as-is
+COMPRESSION_LEVEL = 6
+
+# Fields stored through the codec, per document kind
+ENCODED_FIELDS = {
+    "root": ["gym_diet_chart"],
+    "diet_charts": ["schedule", "notes"],
+    "favourites": ["recipe"],
+    "tried_recipes": ["recipe"],
+    "messages": ["content"],
+}
+
+
+def is_encoded(value):
+    return isinstance(value, (bytes, bytearray)) and bytes(value[:3]) == MAGIC
+
+
+def encode_value(value):
+    """Value → compressed blob (or the value itself if it's small or doesn't shrink)"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    raw = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(raw) < MIN_SIZE:
+        return value
+    blob = MAGIC + bytes([CODEC_VERSION]) + zlib.compress(raw, COMPRESSION_LEVEL)
+    return blob if len(blob) < len(raw) else value
+
+
+def decode_value(value):
+    """Compressed blob → original value; anything else passes through"""
+    if not is_encoded(value):
+        return value
+    version = value[3]
+    if version != CODEC_VERSION:
+        raise ValueError(f"Unknown field codec version {version}")
+    return json.loads(zlib.decompress(bytes(value[4:])).decode("utf-8"))
+
+
+def encode_fields(kind, data):
+    """Copy of a document with its large fields encoded"""
+    fields = ENCODED_FIELDS.get(kind)
+    if not fields or not data:
+        return data
+    return {key: encode_value(value) if key in fields else value for key, value in data.items()}
+
+
+def decode_fields(kind, data):
+    """Copy of a document with any encoded fields decoded"""
+    fields = ENCODED_FIELDS.get(kind)
+    if not fields or not data:
+        return data
+    return {key: decode_value(value) if key in fields else value for key, value in data.items()}
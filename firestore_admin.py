@@ -0,0 +1,182 @@
+"""
+🛠️ Annapurna Firestore Admin Helpers
+Shared by the scripts that run outside Streamlit (voice listener, nightly
+expiry job, admin CLI):
+
+    connect()           firebase_credentials.json → Firestore client
+    user_pages()        users/{uid} documents a page at a time (cursor pagination)
+    stream_users()      the same, one document at a time
+    ChunkedBatch        db.batch() that commits itself before it gets too big
+"""
+
+import json
+import os
+import time
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from google.api_core.exceptions import NotFound
+
+CREDENTIALS_FILE = "firebase_credentials.json"
+PAGE_SIZE = 200                   # user documents per page
+BATCH_SIZE = 400                  # writes per batch commit (Firestore max is 500)
+BATCH_BYTES = 8 * 1024 * 1024     # stay well under the 10 MB request limit
+
+
+class CredentialsMissing(Exception):
+    """firebase_credentials.json isn't where the script expects it"""
+
+
+def print_credentials_help(path=CREDENTIALS_FILE):
+    print()
+    print(f"❌ ERROR: {path} NOT FOUND!")
+    print()
+    print("📝 INSTRUCTIONS:")
+    print("1. Go to Firebase Console: https://console.firebase.google.com")
+    print("2. Select your project")
+    print("3. Go to Project Settings → Service Accounts")
+    print("4. Click 'Generate New Private Key'")
+    print(f"5. Save the downloaded file as '{os.path.basename(path)}'")
+    print("6. Put it in the same folder as this script")
+    print()
+
+
+def connect(path=CREDENTIALS_FILE):
+    """Initialize firebase_admin from a service-account file and return a Firestore client"""
+    if not os.path.exists(path):
+        raise CredentialsMissing(path)
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        firebase_admin.initialize_app(credentials.Certificate(path))
+    return firestore.client()
+
+
+def user_pages(db, page_size=PAGE_SIZE, fields=None, start_after=None):
+    """
+    Yields lists of users/{uid} snapshots in document-id order. `fields` is
+    an optional field mask, `start_after` a user id to resume after.
+    """
+    users = db.collection("users")
+    query = users.order_by("__name__")
+    if fields is not None:
+        query = query.select(fields)
+    query = query.limit(page_size)
+
+    last = start_after
+    while True:
+        page_query = query.start_after({"__name__": users.document(last)}) if last else query
+        page = list(page_query.stream())
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last = page[-1].id
+
+
+def stream_users(db, page_size=PAGE_SIZE, fields=None, start_after=None):
+    for page in user_pages(db, page_size, fields, start_after):
+        yield from page
+
+
+def estimate_size(data):
+    """Rough request size of a write (good enough to stay under the limit)"""
+    return len(json.dumps(data, default=lambda value: "x" * len(value) if isinstance(value, bytes) else str(value)))
+
+
+class ChunkedBatch:
+    """
+    db.batch() that commits itself every `size` writes or `max_bytes` of
+    payload. Writes can be tagged with an owner (the user id): when a chunk
+    can't be committed, every owner with a write in it lands in
+    `failed_owners`, so the caller can redo those users.
+    """
+
+    def __init__(self, db, size=BATCH_SIZE, max_bytes=BATCH_BYTES, dry_run=False):
+        self.db = db
+        self.size = min(size, 500)
+        self.max_bytes = max_bytes
+        self.dry_run = dry_run
+        self._ops = []        # (kind, ref, data, merge) of the current chunk
+        self._owners = set()
+        self._count = 0
+        self._bytes = 0
+        self.committed = 0
+        self.commits = 0
+        self.bytes = 0
+        self.skipped = 0      # updates whose document was deleted meanwhile
+        self.failed_owners = set()
+
+    def set(self, ref, data, merge=True, owner=None):
+        self._queue("set", ref, data, merge, owner)
+
+    def update(self, ref, data, owner=None):
+        """Change fields of an existing document; skipped (not recreated) if it's gone"""
+        self._queue("update", ref, data, False, owner)
+
+    def delete(self, ref, owner=None):
+        self._queue("delete", ref, None, False, owner)
+
+    def _queue(self, kind, ref, data, merge, owner):
+        size = estimate_size(data) if data is not None else 0
+        if self._count and self._bytes + size > self.max_bytes:
+            self.commit()
+        if not self.dry_run:
+            self._ops.append((kind, ref, data, merge))
+        if owner is not None:
+            self._owners.add(owner)
+        self._count += 1
+        self._bytes += size
+        if self._count >= self.size:
+            self.commit()
+
+    def commit(self, retries=3):
+        if self._count and not self.dry_run:
+            try:
+                self._commit_ops(retries)
+            except Exception:
+                self.failed_owners |= self._owners
+                self._reset()  # dropped; failed_owners says whose writes to redo
+                raise
+            self.commits += 1
+        self.committed += self._count
+        self.bytes += self._bytes
+        self._reset()
+
+    def _reset(self):
+        self._ops = []
+        self._owners = set()
+        self._count = self._bytes = 0
+
+    def _commit_ops(self, retries):
+        for attempt in range(retries):
+            batch = self.db.batch()
+            for kind, ref, data, merge in self._ops:
+                if kind == "set":
+                    batch.set(ref, data, merge=merge)
+                elif kind == "update":
+                    batch.update(ref, data)
+                else:
+                    batch.delete(ref)
+            try:
+                batch.commit()
+                return
+            except NotFound:
+                break  # an update's document was deleted: apply the chunk write by write
+            except Exception:
+                if attempt == retries - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+        for kind, ref, data, merge in self._ops:
+            try:
+                if kind == "set":
+                    ref.set(data, merge=merge)
+                elif kind == "update":
+                    ref.update(data)
+                else:
+                    ref.delete()
+            except NotFound:
+                if kind != "update":
+                    raise
+                self.skipped += 1
@@ -0,0 +1,185 @@
+"""
+🩺 Annapurna Firestore Connection Monitor
+Probes Firestore from a background thread on an interval, so the UI can
+show connection status from cached numbers instead of doing a blocking
+read on every rerun.
+
+It also owns a circuit breaker: after a few failed (or very slow) calls
+the breaker opens and every Firestore call site fails fast until a probe
+succeeds again.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+PROBE_INTERVAL = 30      # seconds between background probes
+PROBE_TIMEOUT = 5        # seconds before a probe counts as failed
+SLOW_THRESHOLD = 2.0     # seconds; slower probes count as failures
+FAILURE_THRESHOLD = 3    # consecutive failures before the breaker opens
+RESET_TIMEOUT = 30       # seconds the breaker stays open before a trial call
+
+
+class FirestoreUnavailable(Exception):
+    """Raised instead of calling Firestore while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """closed → (N failures) → open → (timeout) → half_open → closed/open"""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0
+        self._lock = threading.Lock()
+
+    def _trial_due(self):
+        # open long enough, or a half-open trial that never reported back
+        return self.state != "closed" and time.time() - self.opened_at >= self.reset_timeout
+
+    def would_allow(self):
+        """Read-only: would a call go ahead now? (doesn't use up the half-open trial)"""
+        with self._lock:
+            return self.state == "closed" or self._trial_due()
+
+    def allow(self):
+        """True if a Firestore call may go ahead right now (hands out the one half-open trial)"""
+        with self._lock:
+            if self._trial_due():
+                self.state = "half_open"  # let one trial call through
+                self.opened_at = time.time()
+                return True
+            return self.state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.time()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None if empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class ConnectionMonitor:
+    """Background Firestore prober with latency stats and a circuit breaker"""
+
+    def __init__(self, db, interval=PROBE_INTERVAL, timeout=PROBE_TIMEOUT,
+                 slow_threshold=SLOW_THRESHOLD, breaker=None, samples=100):
+        self.db = db
+        self.interval = interval
+        self.timeout = timeout
+        self.slow_threshold = slow_threshold
+        self.breaker = breaker or CircuitBreaker()
+
+        self._latencies = deque(maxlen=samples)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_error = None
+        self.last_checked = None
+        self.last_ok = None
+
+    # ───────────── background probing ─────────────
+
+    def start(self):
+        """Start the probe thread (safe to call more than once)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="firestore-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def probe(self):
+        """One health-check read; updates latency stats and the breaker"""
+        started = time.time()
+        try:
+            self.db.collection("_health_check").document("test").get(timeout=self.timeout)
+            latency = time.time() - started
+            with self._lock:
+                self._latencies.append(latency)
+                self.last_checked = time.time()
+                if latency > self.slow_threshold:
+                    self.last_error = f"Slow response ({latency:.1f}s)"
+                else:
+                    self.last_ok = self.last_checked
+            if latency > self.slow_threshold:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        except Exception as e:
+            with self._lock:
+                self.last_checked = time.time()
+                self.last_error = str(e)
+            self.breaker.record_failure()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    # ───────────── used by call sites ─────────────
+
+    def available(self):
+        """False while the breaker is open → skip Firestore and fail fast (read-only; guard() takes the trial)"""
+        return self.breaker.would_allow()
+
+    def guard(self):
+        """Raise FirestoreUnavailable instead of hanging on a degraded Firestore"""
+        if not self.breaker.allow():
+            raise FirestoreUnavailable(self.last_error or "Firestore is unavailable")
+
+    @contextmanager
+    def track(self):
+        """
+        Wrap a Firestore call so its outcome feeds the breaker:
+            with monitor.track():
+                doc = doc_ref.get()
+        """
+        self.guard()
+        try:
+            yield
+        except FirestoreUnavailable:
+            raise
+        except Exception as e:
+            with self._lock:
+                self.last_error = str(e)
+            self.breaker.record_failure()
+            raise
+        else:
+            self.breaker.record_success()
+
+    def status(self):
+        """Cached snapshot for the UI (never touches the network)"""
+        with self._lock:
+            latencies = list(self._latencies)
+            return {
+                "state": self.breaker.state,
+                "connected": self.breaker.state == "closed" and self.last_ok is not None,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "samples": len(latencies),
+                "last_error": self.last_error,
+                "last_checked": self.last_checked,
+                "last_ok": self.last_ok,
+            }
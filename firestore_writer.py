@@ -0,0 +1,250 @@
+"""
+✍️ Annapurna Write-Behind Queue
+Firestore writes are queued here instead of being sent from inside the
+Streamlit script. One background worker per process waits a short
+window, merges repeated updates to the same document, and commits
+everything it has with db.batch().
+
+HOW TO USE:
+    writer = WriteBehindQueue(db)
+    writer.set(db.collection("users").document(uid), {"inventory": {...}})
+    writer.flush()                       # before shutdown
+    writer.flush(prefix="users/" + uid)  # before one user's sign-out
+"""
+
+import atexit
+import copy
+import threading
+import time
+from collections import OrderedDict
+from firebase_admin import firestore
+from firestore_monitor import FirestoreUnavailable
+
+BATCH_LIMIT = 450        # Firestore allows 500 writes per batch
+COALESCE_WINDOW = 0.5    # seconds to wait for more updates to the same doc
+MAX_RETRY_DELAY = 30     # seconds
+
+
+def merge_changes(base, update):
+    """
+    Deep-merges `update` into `base` the way two set(merge=True) calls
+    would apply. Returns None when the pair can't be expressed as one
+    write (a deleted map that gets new keys).
+    """
+    merged = copy.copy(base)
+    for key, value in update.items():
+        current = merged.get(key)
+        if isinstance(value, dict) and isinstance(current, dict):
+            nested = merge_changes(current, value)
+            if nested is None:
+                return None
+            merged[key] = nested
+        elif isinstance(value, dict) and current is firestore.DELETE_FIELD:
+            return None
+        elif isinstance(value, firestore.Increment) and isinstance(current, firestore.Increment):
+            merged[key] = firestore.Increment(current.value + value.value)  # both deltas count
+        elif isinstance(value, firestore.Increment) and type(current) in (int, float):
+            merged[key] = current + value.value
+        else:
+            merged[key] = value
+    return merged
+
+
+def _under(path, prefix):
+    """Document path `path` is `prefix` itself or inside it"""
+    return path == prefix or path.startswith(prefix.rstrip("/") + "/")
+
+
+class WriteBehindQueue:
+    """Background, coalescing, batched writer for Firestore documents"""
+
+    def __init__(self, db, window=COALESCE_WINDOW, batch_limit=BATCH_LIMIT, breaker=None):
+        self.db = db
+        self.breaker = breaker  # optional CircuitBreaker: hold writes while it's open
+        self.window = window
+        self.batch_limit = batch_limit
+
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()   # doc path -> {"ref": ref, "ops": [...]}
+        self._in_flight = 0
+        self._in_flight_paths = set()
+        self._flush_waiters = 0     # flush() calls waiting: skip the coalescing window
+        self._after = []            # (prefix, callback) waiting for writes under prefix
+        self._retry_delay = 0
+        self._worker = None
+
+        self.stats = {"enqueued": 0, "committed": 0, "batches": 0, "errors": 0, "last_error": None}
+        atexit.register(self.flush, 5)
+
+    # ───────────── public API ─────────────
+
+    def set(self, doc_ref, data, merge=True):
+        """Queue doc_ref.set(data, merge=merge)"""
+        self._enqueue(doc_ref, ("set", copy.deepcopy(data), merge))
+
+    def delete(self, doc_ref):
+        """Queue doc_ref.delete()"""
+        self._enqueue(doc_ref, ("delete", None, False))
+
+    def pending_count(self, prefix=None):
+        with self._cond:
+            if prefix is None:
+                return sum(len(entry["ops"]) for entry in self._pending.values()) + self._in_flight
+            queued = sum(len(entry["ops"]) for path, entry in self._pending.items() if _under(path, prefix))
+            return queued + sum(1 for path in self._in_flight_paths if _under(path, prefix))
+
+    def flush(self, timeout=10, prefix=None):
+        """
+        Commit now and wait. With `prefix` (e.g. "users/<uid>") only waits
+        for documents under it. Returns True if those writes drained.
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            self._flush_waiters += 1
+            self._retry_delay = 0
+            self._cond.notify_all()
+            try:
+                while self._has_pending(prefix):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flush_waiters -= 1
+        return True
+
+    def after(self, prefix, callback):
+        """
+        Call callback() once nothing under `prefix` is queued or in flight
+        (on the worker thread, or right away if that's already the case).
+        Writes that keep failing hold it back; it never runs out of order.
+        """
+        with self._cond:
+            if self._has_pending(prefix):
+                self._after.append((prefix, callback))
+                return
+        callback()
+
+    # ───────────── internals ─────────────
+
+    def _run_after(self):
+        with self._cond:
+            ready = [entry for entry in self._after if not self._has_pending(entry[0])]
+            self._after = [entry for entry in self._after if entry not in ready]
+        for prefix, callback in ready:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Write-behind callback for {prefix} failed: {str(e)}")
+
+    def _has_pending(self, prefix=None):
+        if prefix is None:
+            return bool(self._pending or self._in_flight)
+        return any(_under(path, prefix) for path in list(self._pending) + list(self._in_flight_paths))
+
+    def _enqueue(self, doc_ref, op):
+        with self._cond:
+            entry = self._pending.setdefault(doc_ref.path, {"ref": doc_ref, "ops": []})
+            ops = entry["ops"]
+            kind, data, merge = op
+
+            if kind == "delete" or (kind == "set" and not merge):
+                ops[:] = [op]  # replaces whatever was queued before
+            elif ops and ops[-1][0] == "set" and ops[-1][2]:
+                merged = merge_changes(ops[-1][1], data)
+                if merged is None:
+                    ops.append(op)
+                else:
+                    ops[-1] = ("set", merged, True)
+            else:
+                ops.append(op)
+
+            self.stats["enqueued"] += 1
+            self._ensure_worker()
+            self._cond.notify_all()
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="firestore-write-behind", daemon=True)
+            self._worker.start()
+
+    def _take_batch(self):
+        """Pop up to batch_limit ops, whole documents at a time"""
+        taken = []
+        count = 0
+        while self._pending:
+            path, entry = next(iter(self._pending.items()))
+            if taken and count + len(entry["ops"]) > self.batch_limit:
+                break
+            self._pending.popitem(last=False)
+            taken.append((path, entry))
+            count += len(entry["ops"])
+        self._in_flight = count
+        self._in_flight_paths = {path for path, _ in taken}
+        return taken
+
+    def _requeue(self, taken):
+        """Put failed writes back in front of anything queued since"""
+        for path, entry in reversed(taken):
+            newer = self._pending.pop(path, None)
+            if newer:
+                entry["ops"].extend(newer["ops"])
+            self._pending[path] = entry
+            self._pending.move_to_end(path, last=False)
+
+    def _commit(self, taken):
+        if self.breaker is not None and not self.breaker.allow():
+            raise FirestoreUnavailable("circuit open")
+
+        batch = self.db.batch()
+        for path, entry in taken:
+            for kind, data, merge in entry["ops"]:
+                if kind == "delete":
+                    batch.delete(entry["ref"])
+                else:
+                    batch.set(entry["ref"], data, merge=merge)
+        try:
+            batch.commit()
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            raise
+        if self.breaker is not None:
+            self.breaker.record_success()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+                # Give the script a moment to send more updates for the same docs
+                deadline = time.time() + self.window + self._retry_delay
+                while time.time() < deadline:
+                    if self._flush_waiters and not self._retry_delay:
+                        break
+                    self._cond.wait(deadline - time.time())
+                if not self._pending:
+                    continue
+                taken = self._take_batch()
+
+            try:
+                self._commit(taken)
+                with self._cond:
+                    self.stats["committed"] += self._in_flight
+                    self.stats["batches"] += 1
+                    self._retry_delay = 0
+            except Exception as e:
+                with self._cond:
+                    if not isinstance(e, FirestoreUnavailable):
+                        print(f"Write-behind commit failed: {str(e)}")
+                        self.stats["errors"] += 1
+                        self.stats["last_error"] = str(e)
+                    self._requeue(taken)
+                    self._retry_delay = min(MAX_RETRY_DELAY, max(1, self._retry_delay * 2))
+            finally:
+                with self._cond:
+                    self._in_flight = 0
+                    self._in_flight_paths = set()
+                    self._cond.notify_all()
+            self._run_after()
@@ -0,0 +1,80 @@
+"""
+🛒 Annapurna Grocery List Channel
+Keeps every open device's grocery list in step. Each item is its own
+document under users/{uid}/grocery_list, and one on_snapshot listener
+per user per process keeps an in-memory copy of them. App sessions ask
+for what was added/removed since they last looked and apply just that
+to their local set - no document reads after the first snapshot.
+
+    hub.subscribe(session_id, user_id)
+    changes = hub.changes(session_id, known)   # None, or (version, records, added, removed)
+
+changes() is polled by the app's grocery fragment, so a session that
+stops asking for SESSION_TTL (a closed tab) is dropped, and the user's
+listener with it once none of their sessions are left.
+"""
+
+import copy
+from listener_hub import SESSION_TTL, ListenerHub
+from user_data_store import user_ref
+
+GROCERY_COLLECTION = "grocery_list"
+
+
+class GroceryHub(ListenerHub):
+    """Per-user grocery_list listeners shared by that user's sessions"""
+
+    listener_name = "Grocery"
+
+    def __init__(self, db, session_ttl=SESSION_TTL):
+        super().__init__(db, session_ttl)
+        self._lists = {}      # user_id -> {"records": {doc_id: record}, "version": int}
+
+    def _watch(self, user_id):
+        self._lists[user_id] = {"records": {}, "version": 0}
+        return user_ref(self.db, user_id).collection(GROCERY_COLLECTION).on_snapshot(
+            lambda docs, changes, read_time: self._on_snapshot(user_id, changes)
+        )
+
+    def _forget(self, user_id):
+        self._lists.pop(user_id, None)
+
+    # ───────────── listener callback (runs on Firestore's thread) ─────────────
+
+    def _on_snapshot(self, user_id, changes):
+        with self._lock:
+            grocery = self._lists.get(user_id)
+            if grocery is None:
+                return
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    grocery["records"].pop(doc.id, None)
+                else:
+                    grocery["records"][doc.id] = doc.to_dict()
+            grocery["version"] += 1
+
+    # ───────────── used by the app ─────────────
+
+    def version(self, session_id):
+        """0 until the first snapshot arrives"""
+        with self._lock:
+            grocery = self._lists.get(self._sessions.get(session_id))
+            return grocery["version"] if grocery else 0
+
+    def changes(self, session_id, known):
+        """
+        What changed compared to `known` ({doc_id: record}, the copy the
+        session last applied). None until the first snapshot; otherwise
+        (version, records, added names, removed names).
+        """
+        with self._lock:
+            self.touch(session_id)
+            grocery = self._lists.get(self._sessions.get(session_id))
+            if grocery is None or not grocery["version"]:
+                return None
+            records = copy.deepcopy(grocery["records"])
+            version = grocery["version"]
+        added = {record["name"] for key, record in records.items() if key not in known and "name" in record}
+        removed = {record["name"] for key, record in known.items() if key not in records and "name" in record}
+        return version, records, added, removed
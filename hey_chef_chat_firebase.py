@@ -1,8 +1,7 @@
 import PyPDF2  # for PDF text extraction
 from io import BytesIO
 import streamlit as st
-from streamlit_autorefresh import st_autorefresh
-from groq import Groq
+import streamlit.components.v1 as components
 import re
 from datetime import datetime, timedelta
 import speech_recognition as sr
@@ -18,12 +17,44 @@ import threading
 import time
 import queue
 import base64
-from openai import OpenAI
 import random
 import firebase_admin
 from firebase_admin import credentials, firestore
 import uuid
+import json
+import hashlib
+import hmac
+import secrets
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from google_auth_oauthlib.flow import Flow
+from user_data_store import (
+    ChangeTracker, apply_migration, build_records, load_collection, load_user_records, records_to_state,
+    SUBCOLLECTIONS, EAGER_ROOT_FIELDS, EAGER_COLLECTIONS, DEFERRED_COLLECTIONS, COLLECTION_STATE_KEYS,
+)
+from local_cache import LocalCache, SyncEngine
+from storage_backends import LocalFirstStore, MemoryStore, is_guest_id
+from session_token import LOGIN_TTL, TOKEN_TTL, SessionRegistry
+from session_store import SESSION_BACKEND_URL, SessionStateStore, make_session_backend, session_key
+from field_codec import encode_fields
+from expiry import summarize_expiry
+from firestore_writer import WriteBehindQueue
+from firestore_monitor import ConnectionMonitor, FirestoreUnavailable
+from voice_channel import VoiceCommandHub
+from grocery_channel import GroceryHub
+from llm_gateway import GROQ_BASE_URL, LLM_BASE_URL_OVERRIDE, OPENROUTER_BASE_URL, LLMGateway, Provider
+from llm_cache import LLM_CACHE_PATH, ResponseCache, cached_stream
+from llm_context import build_context
+from nutrition import NUTRIENT_UNITS, NUTRIENTS, NutritionEngine, fallback_prompt, parse_fallback
+from recipe_followups import RecipeFollowUps
+from recipe_model import RECIPE_JSON_INSTRUCTIONS, Recipe, parse_reply, render_partial
+from meal_plans import MAX_SESSION_DAYS, apply_plan_writes, days_window, load_range, month_window, plan_writes
+from chat_history import (
+    SESSION_WINDOW as CHAT_WINDOW, append_messages, list_chats, load_page, load_recent_chat, new_chat_id,
+)
+from household import (
+    HouseholdError, PantryHub, create_household, get_household, join_household, leave_household, pantry_ops,
+)
 
 # ═══════════════════════════════════════════════════════════════
 # CUSTOM CSS FOR CHAT INPUT STYLING
@@ -76,13 +107,13 @@ def display_message(role, content):
                 st.code(content, language=None)
                 st.toast("Copied! 🎉", icon="✅")
 
-def format_recipe(recipe_text):
+def format_recipe(recipe, recipe_text):
     """
     Formats recipe with expandable sections and copy buttons.
     """
     # Ingredients expander
     with st.expander("🥘 Ingredients", expanded=True):
-        ingredients = [line for line in recipe_text.split("\n") if line.strip().startswith("-") or line.strip().startswith("•")]
+        ingredients = [ingredient.line() for ingredient in recipe.ingredients]
         if ingredients:
             for ing in ingredients:
                 st.markdown(ing)
@@ -94,7 +125,7 @@ def format_recipe(recipe_text):
     
     # Steps expander
     with st.expander("👨‍🍳 Cooking Steps", expanded=True):
-        steps = [line for line in recipe_text.split("\n") if line.strip() and (line.strip()[0].isdigit() or line.strip().startswith("Step"))]
+        steps = [f"{i}. {step}" for i, step in enumerate(recipe.step_texts(), 1)]
         if steps:
             for step in steps:
                 st.markdown(step)
@@ -111,13 +142,12 @@ def format_recipe(recipe_text):
             st.code(recipe_text, language=None)
             st.balloons()
             st.toast("Full recipe copied!", icon="📄")
-def auto_extract_ingredients_from_recipe(recipe_text):
+def auto_extract_ingredients_from_recipe():
     """
-    Automatically extracts ingredients list from last recipe.
+    Ingredients list of the last recipe.
     Returns: list of ingredient names (strings)
     """
-    ingredients = extract_ingredients(recipe_text, jain_mode=st.session_state.jain_mode)
-    return [ing['name'] for ing in ingredients]
+    return current_recipe().ingredient_names()
 # ═══════════════════════════════════════════════════════════════
 # FIREBASE INITIALIZATION (safe for Streamlit reruns)
 # ═══════════════════════════════════════════════════════════════
@@ -148,6 +178,94 @@ if APP_NAME not in firebase_admin._apps:
 # Always define db safely
 db = firestore.client(app=firebase_admin.get_app(APP_NAME))
 
+@st.cache_resource
+def get_firestore_monitor():
+    """Background connection prober + circuit breaker, one per process"""
+    return ConnectionMonitor(db).start()
+
+@st.cache_resource
+def get_firestore_writer():
+    """One write-behind queue (and worker thread) shared by every session in this process"""
+    return WriteBehindQueue(db, breaker=firestore_monitor.breaker)
+
+@st.cache_resource
+def get_voice_hub():
+    """One on_snapshot listener for voice commands, shared by every session"""
+    return VoiceCommandHub(db)
+
+firestore_monitor = get_firestore_monitor()
+voice_hub = get_voice_hub()
+
+# All writes go through this so reruns never wait on Firestore
+writer = get_firestore_writer()
+
+@st.cache_resource
+def get_local_cache():
+    """SQLite copy of user data on local disk (read/written synchronously)"""
+    return LocalCache()
+
+@st.cache_resource
+def get_sync_engine():
+    """Background push/pull between the local cache and Firestore"""
+    return SyncEngine(db, local_cache, writer, breaker=firestore_monitor.breaker).start()
+
+@st.cache_resource
+def get_loader_pool():
+    """Threads that fetch diet charts / favourites / tried recipes after login"""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="user-data-loader")
+
+@st.cache_resource
+def get_followup_pool():
+    """Threads that parse a new recipe and prefetch its nutrition / substitutes"""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="recipe-followups")
+
+@st.cache_resource
+def get_grocery_hub():
+    """One on_snapshot listener per user's grocery list, shared by their sessions"""
+    return GroceryHub(db)
+
+@st.cache_resource
+def get_pantry_hub():
+    """Live copies of household pantries (one on_snapshot listener per household), shared by every session"""
+    return PantryHub(db, breaker=firestore_monitor.breaker)
+
+@st.cache_resource
+def get_session_store():
+    """Session working state outside this process (SQLite file or Redis), so any replica can serve a reload"""
+    return SessionStateStore(make_session_backend(st.secrets.get("session_backend", SESSION_BACKEND_URL)))
+
+@st.cache_resource
+def get_response_cache():
+    """Recipe answers for identical prompts + settings (memory LRU/TTL, SQLite file behind it)"""
+    return ResponseCache(path=LLM_CACHE_PATH)
+
+@st.cache_resource
+def get_nutrition_engine():
+    """Per-100 g nutrient table (NumPy), plus ingredients the LLM filled in, shared by every session"""
+    return NutritionEngine()
+
+@st.cache_resource
+def get_guest_store():
+    """Guest data lives in process memory only (LRU/TTL, capped) - no Firestore traffic"""
+    return MemoryStore()
+
+local_cache = get_local_cache()
+sync_engine = get_sync_engine()
+loader_pool = get_loader_pool()
+followup_pool = get_followup_pool()
+guest_store = get_guest_store()
+pantry_hub = get_pantry_hub()
+grocery_hub = get_grocery_hub()
+session_store = get_session_store()
+session_registry = SessionRegistry(session_store.backend)  # issued session tokens + Google logins in progress
+response_cache = get_response_cache()
+nutrition_engine = get_nutrition_engine()
+account_store = LocalFirstStore(local_cache, sync_engine)
+
+def storage_for(user_id):
+    """Where this user's data is saved: memory for guests, local cache + Firestore for accounts"""
+    return guest_store if is_guest_id(user_id) else account_store
+
 # ================= SESSION STATE INITIALIZATION =================
 if "is_authenticated" not in st.session_state:
     st.session_state.is_authenticated = False
@@ -161,9 +279,157 @@ if "show_onboarding" not in st.session_state:
     st.session_state.show_onboarding = False
 if "user_preferences" not in st.session_state:
     st.session_state.user_preferences = {}
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex  # key for per-session inboxes
+if "change_tracker" not in st.session_state:
+    st.session_state.change_tracker = ChangeTracker()  # last saved copy of user data
 
 # ================= AUTHENTICATION FUNCTIONS =================
 
+SESSION_COOKIE = "annapurna_session"   # signed session token: reloads stay signed in
+LOGIN_COOKIE = "annapurna_login"       # OAuth state of the sign-in this browser started
+GOOGLE_SCOPES = [
+    "https://www.googleapis.com/auth/userinfo.profile",
+    "https://www.googleapis.com/auth/userinfo.email"
+]
+
+# Google adds "openid" to the granted scopes; don't treat that as an error
+os.environ.setdefault("OAUTHLIB_RELAX_TOKEN_SCOPE", "1")
+
+@st.cache_data
+def google_client_config():
+    """OAuth client config, built once per process instead of on every login render"""
+    return {
+        "web": {
+            "client_id": st.secrets["google_oauth"]["client_id"],
+            "client_secret": st.secrets["google_oauth"]["client_secret"],
+            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "redirect_uris": [st.secrets["google_oauth"]["redirect_uri"]],
+        }
+    }
+
+def make_google_flow(code_verifier):
+    # PKCE: the verifier is kept server-side (session_registry) across Google's redirect
+    return Flow.from_client_config(
+        google_client_config(),
+        scopes=GOOGLE_SCOPES,
+        redirect_uri=st.secrets["google_oauth"]["redirect_uri"],
+        code_verifier=code_verifier,
+        autogenerate_code_verifier=False
+    )
+
+def session_secret():
+    """Signs session tokens - a dedicated secret, never the OAuth client secret"""
+    secret = st.secrets.get("session_secret")
+    if not secret:
+        st.error("⚠️ `session_secret` is missing from secrets.toml (see README → Set Up API Keys)")
+        st.stop()
+    return secret
+
+def set_cookie(name, value, max_age):
+    """Queue a cookie for the browser; written by write_cookies() on the next render"""
+    st.session_state.setdefault("pending_cookies", {})[name] = (value, max_age)
+
+def write_cookies():
+    """Streamlit reads cookies (st.context.cookies) but can't set them: a tiny script on the page does"""
+    pending = st.session_state.pop("pending_cookies", None)
+    if not pending:
+        return
+    secure = "; Secure" if st.secrets["google_oauth"]["redirect_uri"].startswith("https://") else ""
+    script = "".join(
+        f"window.parent.document.cookie = {json.dumps(f'{name}={value}; Max-Age={max_age}; Path=/; SameSite=Lax{secure}')};"
+        for name, (value, max_age) in pending.items()
+    )
+    components.html(f"<script>{script}</script>", height=0)
+
+def start_session(user_id, email, name):
+    """Mark the session signed in and hand the browser a token (cookie) for next time"""
+    st.session_state.user_id = user_id
+    st.session_state.user_email = email
+    st.session_state.user_name = name
+    st.session_state.is_authenticated = True
+    token = session_registry.issue(session_secret(), {"uid": user_id, "email": email, "name": name})
+    st.session_state.session_token = token
+    set_cookie(SESSION_COOKIE, token, TOKEN_TTL)
+
+def resume_session():
+    """Reload / new tab with a valid, unrevoked token → signed in again without Google"""
+    token = st.context.cookies.get(SESSION_COOKIE)
+    if not token:
+        return False
+    claims = session_registry.verify(session_secret(), token)
+    if claims is None:
+        set_cookie(SESSION_COOKIE, "", 0)  # expired, revoked or tampered with
+        return False
+    st.session_state.user_id = claims["uid"]
+    st.session_state.user_email = claims.get("email")
+    st.session_state.user_name = claims.get("name")
+    st.session_state.is_authenticated = True
+    st.session_state.session_token = token
+    return True
+
+def end_session():
+    """Sign-out: revoke the token server-side and clear the cookie"""
+    token = st.session_state.get("session_token")
+    if token:
+        session_registry.revoke(session_registry.verify(session_secret(), token))
+
+def current_session_key():
+    """Key of this browser's saved session state (None without a session token)"""
+    token = st.session_state.get("session_token")
+    return session_key(st.session_state.user_id, token) if token else None
+
+def restore_session_state():
+    """Reload / other replica: bring back the open chat, cooking progress, timers and settings"""
+    key = current_session_key()
+    if key is None:
+        return
+    try:
+        restored = session_store.restore(key, st.session_state)
+        if restored:
+            print(f"🧳 Restored {restored} session keys")
+    except Exception as e:
+        print(f"Session restore failed: {str(e)}")
+
+def save_session_state():
+    """Write this session's working state out (skipped when nothing changed since the last save)"""
+    key = current_session_key()
+    if key is None:
+        return
+    try:
+        session_store.save(key, st.session_state, guest=is_guest_id(st.session_state.user_id))
+    except Exception as e:
+        print(f"Session save failed: {str(e)}")
+
+def complete_google_login():
+    """Google redirected back with ?code=...&state=... → check the state, exchange the code, sign the user in"""
+    code = st.query_params.get("code")
+    if not code:
+        return False
+    state = st.query_params.get("state") or ""
+    started_here = hmac.compare_digest(st.context.cookies.get(LOGIN_COOKIE) or "", state)
+    code_verifier = session_registry.finish_login(state)  # single use
+    set_cookie(LOGIN_COOKIE, "", 0)
+    if not started_here or code_verifier is None:
+        st.query_params.clear()
+        st.error("Google sign-in expired or didn't start in this browser - please sign in again.")
+        return False
+    try:
+        flow = make_google_flow(code_verifier)
+        flow.fetch_token(code=code)
+        profile = flow.authorized_session().get(
+            "https://www.googleapis.com/oauth2/v3/userinfo", timeout=10
+        ).json()
+    except Exception as e:
+        st.query_params.clear()
+        st.error(f"Google sign-in failed: {str(e)}")
+        return False
+    
+    st.query_params.clear()  # drop code/state from the URL
+    start_session(profile["sub"], profile.get("email", ""), profile.get("name", ""))
+    return True
+
 def show_login():
     """Display login page with Google OAuth and Guest mode"""
     st.title("🍳 Welcome to Annapurna")
@@ -174,28 +440,17 @@ def show_login():
     with col1:
         st.subheader("Sign in with Google")
         
-        # Create Google OAuth URL
-        flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": st.secrets["google_oauth"]["client_id"],
-                    "client_secret": st.secrets["google_oauth"]["client_secret"],
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "redirect_uris": [st.secrets["google_oauth"]["redirect_uri"]],
-                }
-            },
-            scopes=[
-                "https://www.googleapis.com/auth/userinfo.profile",
-                "https://www.googleapis.com/auth/userinfo.email"
-            ],
-            redirect_uri=st.secrets["google_oauth"]["redirect_uri"]
-        )
-        
-        authorization_url, state = flow.authorization_url(
-            access_type="offline",
-            include_granted_scopes="true"
-        )
+        # Google OAuth URL (built once per browser session, not on every rerun): fresh state + PKCE verifier
+        if "google_auth_url" not in st.session_state:
+            code_verifier = secrets.token_urlsafe(64)
+            state = session_registry.start_login(code_verifier)
+            st.session_state.google_auth_url, _ = make_google_flow(code_verifier).authorization_url(
+                state=state,
+                access_type="offline",
+                include_granted_scopes="true"
+            )
+            set_cookie(LOGIN_COOKIE, state, LOGIN_TTL)  # ties the redirect back to this browser
+        authorization_url = st.session_state.google_auth_url
         
         # Google Sign-In Button
         st.markdown(f"""
@@ -228,10 +483,7 @@ def show_login():
         st.info("Quick access without login\n(Data won't be saved)")
         
         if st.button("🚀 Continue as Guest", use_container_width=True):
-            st.session_state.user_id = f"guest_{uuid.uuid4().hex[:8]}"
-            st.session_state.user_email = "guest@kitchenmate.app"
-            st.session_state.user_name = "Guest"
-            st.session_state.is_authenticated = True
+            start_session(f"guest_{uuid.uuid4().hex[:8]}", "guest@kitchenmate.app", "Guest")
             st.session_state.show_onboarding = True
             st.rerun()
 
@@ -265,11 +517,13 @@ def onboarding():
             if not st.session_state.user_email.startswith("guest"):
                 try:
                     doc_ref = db.collection("users").document(st.session_state.user_id)
-                    doc_ref.set({
+                    profile = {
                         "email": st.session_state.user_email,
                         "name": st.session_state.user_name,
                         "preferences": prefs
-                    }, merge=True)
+                    }
+                    writer.set(doc_ref, profile, merge=True)
+                    local_cache.merge_root(st.session_state.user_id, profile)
                     st.success("✅ Preferences saved!")
                 except Exception as e:
                     st.warning(f"⚠️ Couldn't save to cloud: {str(e)}")
@@ -288,88 +542,381 @@ def onboarding():
             time.sleep(1)
             st.rerun()
 
+def apply_user_records(data, records):
+    """Put loaded user data into the session"""
+    # Nightly "expiring soon" summary (expiry_job.py) for the banner
+    if data.get("expiry_summary"):
+        st.session_state.expiry_summary = data["expiry_summary"]
+    
+    # Load preferences
+    if "preferences" in data:
+        prefs = data["preferences"]
+        st.session_state.user_preferences = prefs
+        st.session_state.allergies = prefs.get("allergies", "")
+        
+        diet = prefs.get("diet", "")
+        if diet == "Jain":
+            st.session_state.jain_mode = True
+        if diet in ["Pure Veg", "Vegan", "Jain"]:
+            st.session_state.pure_veg_mode = True
+    
+    # Shared household pantry replaces the account's own inventory (sync_pantry)
+    household_id = data.get("household_id") or None
+    if household_id != st.session_state.get("household_id"):
+        pantry_hub.unsubscribe(st.session_state.session_id)
+        for key in ("household", "pantry_records", "pantry_version"):
+            st.session_state.pop(key, None)
+    st.session_state.household_id = household_id
+    
+    # Load inventory, grocery list, diet charts, favourites, tried recipes - whichever were fetched
+    # (empty collections keep the app defaults unless the user already saved under the new layout)
+    loaded = [collection for collection in SUBCOLLECTIONS if collection in records]
+    keys = {key for collection in loaded for key in COLLECTION_STATE_KEYS[collection]}
+    if household_id:
+        keys -= set(COLLECTION_STATE_KEYS["inventory"])
+    for key, value in records_to_state(records).items():
+        if key in keys and (value or data.get("schema_version")):
+            st.session_state[key] = value
+    
+    if "grocery_list" in records:
+        st.session_state.grocery_known = records["grocery_list"]  # what sync_grocery_list diffs against
+    
+    # Everything we just loaded is already saved; collections still on their way aren't tracked yet
+    tracker = st.session_state.change_tracker
+    tracker.mark_persisted(st.session_state)
+    if len(loaded) == len(SUBCOLLECTIONS):
+        tracker.track_all()
+        st.session_state.pending_collections = {}
+    else:
+        tracker.track_only(loaded)
+    if household_id:
+        tracker.untrack("inventory")  # saved per item to the household instead (save_pantry)
+        sync_pantry(wait=10)
+    st.session_state.cache_version = local_cache.version(st.session_state.user_id)
+
+def sync_pantry(wait=0):
+    """
+    Bring the household pantry into the session when the listener has
+    something newer. This session's unsaved inventory edits are sent first.
+    """
+    household_id = st.session_state.get("household_id")
+    if not household_id:
+        return
+    pantry_hub.subscribe(st.session_state.session_id, household_id)
+    if pantry_hub.version(household_id) == st.session_state.get("pantry_version"):
+        return
+    
+    save_pantry()
+    loaded = pantry_hub.records(household_id, timeout=wait)
+    if loaded is None:
+        st.caption("⏳ Loading your household pantry...")
+        return
+    version, records = loaded
+    for key, value in records_to_state({"inventory": records}).items():
+        if key in COLLECTION_STATE_KEYS["inventory"]:
+            st.session_state[key] = value
+    st.session_state.pantry_records = build_records(st.session_state)["inventory"]  # what later edits are diffed against
+    st.session_state.pantry_version = version
+    st.session_state.pop("expiry_summary", None)  # the account's summary is about its own inventory
+
+def sync_grocery_list():
+    """
+    Apply other devices' grocery adds/removes (kept current by the listener)
+    to this session's set. Returns True if the list changed.
+    """
+    known = st.session_state.get("grocery_known")
+    if known is None:
+        return False
+    found = grocery_hub.changes(st.session_state.session_id, known)
+    if found is None or found[0] == st.session_state.get("grocery_version"):
+        return False
+    
+    version, records, added, removed = found
+    before = set(st.session_state.grocery_list)
+    st.session_state.grocery_list = (before - removed) | added
+    st.session_state.grocery_known = records
+    st.session_state.grocery_version = version
+    # Saved copy is now Firestore's; this session's unsaved adds/removes still show up as changes
+    st.session_state.change_tracker.mark_loaded("grocery_list", records)
+    try:
+        local_cache.merge_remote(st.session_state.user_id, None, {"grocery_list": records}, collections=["grocery_list"])
+    except Exception as e:
+        print(f"Local cache update failed: {str(e)}")
+    return st.session_state.grocery_list != before
+
+def enter_household(household):
+    """Switch this session's inventory over to a household's shared pantry"""
+    st.session_state.household = household
+    st.session_state.household_id = household["id"]
+    local_cache.merge_root(st.session_state.user_id, {"household_id": household["id"]})
+    st.session_state.change_tracker.untrack("inventory")
+    sync_pantry(wait=10)
+
+def save_pantry():
+    """Per-item household pantry writes (qty delta / merge / delete) for this session's edits"""
+    household_id = st.session_state.get("household_id")
+    saved = st.session_state.get("pantry_records")
+    if not household_id or saved is None:
+        return  # not loaded yet: nothing to diff against
+    current = build_records(st.session_state)["inventory"]
+    ops = pantry_ops(saved, current)
+    if ops:
+        pantry_hub.apply(household_id, ops)
+        st.session_state.pantry_records = current
+
+def use_collection(collection):
+    """
+    Merge a lazily loaded subcollection (diet_charts / favourites / tried_recipes)
+    into the session. Called by the tab that shows it; waits if it's still loading.
+    """
+    pending = st.session_state.get("pending_collections") or {}
+    future = pending.get(collection)
+    if future is None:
+        return
+    
+    user_id = st.session_state.user_id
+    try:
+        docs = future.result(timeout=15)
+    except FutureTimeout:
+        st.caption("⏳ Still loading your saved data...")
+        return
+    except Exception as e:
+        # Try again on the next rerun; changes here are kept in the session until then
+        pending[collection] = loader_pool.submit(load_collection, db, user_id, collection)
+        st.warning(f"⚠️ Couldn't load your saved {collection.replace('_', ' ')}: {str(e)}")
+        return
+    del pending[collection]
+    
+    # Saved copy + anything added in this session before it arrived
+    saved = records_to_state({collection: docs})
+    for key in COLLECTION_STATE_KEYS[collection]:
+        current = st.session_state.get(key)
+        if isinstance(saved[key], list):
+            st.session_state[key] = saved[key] + list(current or [])
+        else:
+            st.session_state[key] = {**saved[key], **(current or {})}
+    st.session_state.change_tracker.mark_loaded(collection, docs)
+    
+    try:
+        local_cache.merge_remote(user_id, None, {collection: docs}, collections=[collection])
+        if not pending:
+            # Cache now has the whole account → good for a warm login
+            local_cache.set_last_pulled(user_id, st.session_state.get("loaded_stamp"))
+    except Exception as e:
+        print(f"Local cache update failed: {str(e)}")
+
 def load_user_data():
-    """Load user's saved data from Firestore"""
-    if st.session_state.user_email.startswith("guest"):
-        return  # Skip for guest users
+    """Load user's saved data - local store first, Firestore on a cold cache"""
+    user_id = st.session_state.user_id
+    store = storage_for(user_id)
+    try:
+        # Warm cache: show it right away, the sync engine checks Firestore in the background
+        stored = store.load(user_id)
+        if stored is not None:
+            apply_user_records(*stored)
+            if store.remote:
+                sync_engine.watch(user_id)
+            return
+    except Exception as e:
+        print(f"Local data read failed: {str(e)}")
+    
+    if not store.remote:
+        return  # Guests start fresh and never touch Firestore
     
     try:
-        doc_ref = db.collection("users").document(st.session_state.user_id)
-        doc = doc_ref.get()
+        # Just what the Chat tab needs: preferences (field mask), inventory and grocery list
+        with firestore_monitor.track():
+            data, records, migration = load_user_records(
+                db, user_id, collections=EAGER_COLLECTIONS, fields=EAGER_ROOT_FIELDS
+            )
         
-        if doc.exists:
-            data = doc.to_dict()
+        if data is not None:
+            # Old single-document layout → move it into subcollections (in the background)
+            if migration:
+                apply_migration(db, writer, user_id, migration)
             
-            # Load preferences
-            if "preferences" in data:
-                prefs = data["preferences"]
-                st.session_state.user_preferences = prefs
-                st.session_state.allergies = prefs.get("allergies", "")
-                
-                diet = prefs.get("diet", "")
-                if diet == "Jain":
-                    st.session_state.jain_mode = True
-                if diet in ["Pure Veg", "Vegan", "Jain"]:
-                    st.session_state.pure_veg_mode = True
+            # Seed the local cache so the next login doesn't wait on Firestore
+            fetched = [collection for collection in SUBCOLLECTIONS if collection in records]
+            local_cache.merge_remote(user_id, data, records, collections=fetched)
+            st.session_state.loaded_stamp = data.get("last_updated") or "0"  # "0": sorts before any real stamp
+            apply_user_records(data, records)
             
-            # Load inventory
-            if "inventory" in data:
-                st.session_state.inventory = data["inventory"]
-            if "inventory_prices" in data:
-                st.session_state.inventory_prices = data["inventory_prices"]
-            if "inventory_expiry" in data:
-                st.session_state.inventory_expiry = data["inventory_expiry"]
-            if "grocery_list" in data:
-                st.session_state.grocery_list = set(data["grocery_list"])
-            if "diet_charts" in data:
-                st.session_state.diet_charts = data["diet_charts"]
+            # Diet charts, favourites, tried recipes: fetched concurrently in the background,
+            # merged in by the tabs that show them (use_collection)
+            st.session_state.pending_collections = {
+                collection: loader_pool.submit(load_collection, db, user_id, collection)
+                for collection in DEFERRED_COLLECTIONS if collection not in records
+            }
+            if not st.session_state.pending_collections:
+                local_cache.set_last_pulled(user_id, st.session_state.loaded_stamp)
+        
+        sync_engine.watch(user_id, pull_now=False)
             
+    except FirestoreUnavailable:
+        st.warning("⚠️ Cloud sync is unavailable right now - using local data for this session")
     except Exception as e:
         st.warning(f"Couldn't load saved data: {str(e)}")
 
+def new_chat_state(chat_id=None, messages=()):
+    """Bookkeeping for the chat in st.session_state.messages (messages = saved ones, with "seq")"""
+    return {
+        "id": chat_id,
+        "saved": len(messages),                              # leading session messages already in Firestore
+        "seqs": [m["seq"] for m in messages],                # their seqs (other tabs may have taken the ones between)
+        "oldest_seq": messages[0]["seq"] if messages else 0,  # seq of st.session_state.messages[0]
+        "older": [],                                         # earlier pages, fetched on request (display only)
+    }
+
+def save_chat():
+    """Append this session's new chat turns to Firestore, then keep only the latest ones in memory"""
+    chat = st.session_state.chat
+    messages = st.session_state.messages
+    new = messages[chat["saved"]:]
+    if new and not is_guest_id(st.session_state.user_id):
+        if chat["id"] is None:
+            chat["id"] = new_chat_id()
+        try:
+            # One small transaction for the seqs: fails fast (and feeds the breaker) when Firestore is down
+            with firestore_monitor.track():
+                first_seq = append_messages(db, writer, st.session_state.user_id, chat["id"], new)
+        except FirestoreUnavailable:
+            return  # still unsaved: tried again after the next turn
+        except Exception as e:
+            print(f"Chat save failed: {str(e)}")
+            return
+        chat["seqs"].extend(range(first_seq, first_seq + len(new)))
+        if chat["saved"] == 0:
+            chat["oldest_seq"] = first_seq
+        st.session_state.pop("chat_index", None)
+    chat["saved"] = len(messages)
+    
+    extra = len(messages) - CHAT_WINDOW
+    if extra > 0:
+        st.session_state.messages = messages[extra:]
+        chat["saved"] -= extra
+        del chat["seqs"][:extra]
+        chat["oldest_seq"] = chat["seqs"][0] if chat["seqs"] else chat["oldest_seq"] + extra
+
+def open_chat(chat_id=None, messages=()):
+    """Switch to another saved chat (or a fresh one when chat_id is None)"""
+    save_chat()
+    st.session_state.messages = [{"role": m["role"], "content": m["content"]} for m in messages]
+    st.session_state.chat = new_chat_state(chat_id, messages)
+
+def use_chat_history():
+    """Reopen the latest saved chat after login (fetched in the background). Called by the Chat tab."""
+    future = st.session_state.get("chat_loading")
+    if future is None:
+        return
+    try:
+        chat, messages = future.result(timeout=5)
+    except FutureTimeout:
+        st.caption("⏳ Loading your last chat...")
+        return
+    except Exception as e:
+        st.session_state.chat_loading = None
+        print(f"Chat history load failed: {str(e)}")
+        return
+    st.session_state.chat_loading = None
+    if chat is not None and not st.session_state.messages and st.session_state.chat["id"] is None:
+        open_chat(chat["id"], messages)
+
+def load_older_messages():
+    """One more page of the open chat, from before what's shown (cursor on seq)"""
+    chat = st.session_state.chat
+    cursor = chat["older"][0]["seq"] if chat["older"] else chat["oldest_seq"]
+    try:
+        chat["older"] = load_page(db, st.session_state.user_id, chat["id"], before_seq=cursor) + chat["older"]
+    except Exception as e:
+        st.warning(f"⚠️ Couldn't load older messages: {str(e)}")
+
+def use_meal_plan(first, last):
+    """Make sure days first..last (YYYY-MM-DD) are in st.session_state.meal_plan - reads only that range"""
+    windows = st.session_state.meal_plan_windows
+    if is_guest_id(st.session_state.user_id) or any(a <= first and last <= b for a, b in windows):
+        return
+    try:
+        remote = load_range(db, st.session_state.user_id, first, last)
+    except Exception as e:
+        st.warning(f"⚠️ Couldn't load your meal plan: {str(e)}")
+        return
+    
+    plan, saved = st.session_state.meal_plan, st.session_state.meal_plan_saved
+    for day, meals in remote.items():
+        # Meals changed in this session but not saved yet win over the saved copy
+        unsaved = {meal: dish for meal, dish in plan.get(day, {}).items() if saved.get(day, {}).get(meal) != dish}
+        plan[day] = {**meals, **unsaved}
+        saved[day] = dict(meals)
+    windows.append((first, last))
+    
+    # Months of browsing shouldn't pile up: forget saved days outside this range
+    if len(plan) > MAX_SESSION_DAYS:
+        for day in list(plan):
+            if not first <= day <= last and plan[day] == saved.get(day):
+                del plan[day]
+                saved.pop(day, None)
+        st.session_state.meal_plan_windows = [(first, last)]
+
+def save_meal_plan():
+    """Per-day, per-meal merge writes for meal plan edits (accounts only)"""
+    if is_guest_id(st.session_state.user_id):
+        return
+    writes = plan_writes(st.session_state.meal_plan_saved, st.session_state.meal_plan)
+    if writes:
+        apply_plan_writes(db, writer, st.session_state.user_id, writes)
+        st.session_state.meal_plan_saved = {day: dict(meals) for day, meals in st.session_state.meal_plan.items()}
+
 # ================= AUTH CHECK =================
 
-# Check if user is authenticated
-if not st.session_state.is_authenticated:
+# Check if user is authenticated (a saved session token or Google's redirect count too)
+if not st.session_state.is_authenticated and not resume_session() and not complete_google_login():
     show_login()
+    write_cookies()
     st.stop()
+write_cookies()
+
+# New process for this browser (reload, restart, another replica) → pick up where the session left off
+if st.session_state.is_authenticated and "session_restored" not in st.session_state:
+    restore_session_state()
+    st.session_state.session_restored = True
 
 # Load user data on first login
 if st.session_state.is_authenticated and "data_loaded" not in st.session_state:
+    # Days left are worked out from each item's stored expiry date on load;
+    # expiry_job.py refreshes the stored values and the banner summary nightly
     load_user_data()
-    
-    # Automatic expiration countdown
-    today = datetime.now().date()
-    
-    # Initialize last_opened if missing
-    if "last_opened_date" not in st.session_state:
-        st.session_state.last_opened_date = today
-    
-    # Calculate days passed since last open
-    days_passed = (today - st.session_state.last_opened_date).days
-    
-    if days_passed > 0:
-        updated = False
-        for item, days_left in list(st.session_state.inventory_expiry.items()):
-            if isinstance(days_left, (int, float)):
-                new_days = days_left - days_passed
-                st.session_state.inventory_expiry[item] = max(-30, new_days)  # don't go below -30
-                updated = True
-        
-        if updated:
-            # Optional: save updated expiry to Firestore
-            if not st.session_state.user_email.startswith("guest"):
-                try:
-                    db.collection("users").document(st.session_state.user_id).set({
-                        "inventory_expiry": dict(st.session_state.inventory_expiry)
-                    }, merge=True)
-                except:
-                    pass  # silent fail
-        
-        # Update last opened date
-        st.session_state.last_opened_date = today
-    
     st.session_state.data_loaded = True
+    if not is_guest_id(st.session_state.user_id):
+        st.session_state.chat_loading = loader_pool.submit(load_recent_chat, db, st.session_state.user_id)
+
+# Newer data pulled from Firestore (another device) → refresh this session from the cache
+elif st.session_state.get("data_loaded") and not st.session_state.user_email.startswith("guest"):
+    try:
+        if local_cache.version(st.session_state.user_id) != st.session_state.get("cache_version"):
+            # Save this session's edits locally first so they aren't overwritten
+            writes = st.session_state.change_tracker.collect_writes(st.session_state)
+            if writes:
+                local_cache.store_writes(st.session_state.user_id, build_records(st.session_state), writes)
+            cached = local_cache.load(st.session_state.user_id)
+            if cached is not None:
+                apply_user_records(*cached)
+    except Exception as e:
+        print(f"Local cache refresh failed: {str(e)}")
+
+# Grocery list: live per-item listener (adds/removes from other devices)
+if st.session_state.get("data_loaded") and not is_guest_id(st.session_state.user_id):
+    try:
+        grocery_hub.subscribe(st.session_state.session_id, st.session_state.user_id)
+        sync_grocery_list()
+    except Exception as e:
+        print(f"Grocery list sync failed: {str(e)}")
+
+# Household pantry changed (another member, or our own writes coming back) → refresh the inventory
+if st.session_state.get("data_loaded") and st.session_state.get("household_id"):
+    try:
+        sync_pantry()
+    except Exception as e:
+        print(f"Pantry refresh failed: {str(e)}")
 
 # Show onboarding if needed
 if st.session_state.show_onboarding:
@@ -377,22 +924,32 @@ if st.session_state.show_onboarding:
     st.stop()
 
 # ================= API KEYS =================
-GROQ_API_KEY = st.secrets["GROQ_API_KEY"]
-OPENROUTER_API_KEY = st.secrets["OPENROUTER_API_KEY"]
+# Offline (ANNAPURNA_LLM_BASE_URL → llm_stub_server.py) the LLM keys aren't needed
+GROQ_API_KEY = st.secrets.get("GROQ_API_KEY", "offline") if LLM_BASE_URL_OVERRIDE else st.secrets["GROQ_API_KEY"]
+OPENROUTER_API_KEY = st.secrets.get("OPENROUTER_API_KEY", "offline") if LLM_BASE_URL_OVERRIDE else st.secrets["OPENROUTER_API_KEY"]
 YOUTUBE_API_KEY = st.secrets["YOUTUBE_API_KEY"]
 
-# Initialize clients
-client = Groq(api_key=GROQ_API_KEY)
+@st.cache_resource
+def get_llm_gateway():
+    """Pooled Groq / OpenRouter clients with process-wide rate limiting and retries"""
+    return LLMGateway({
+        "groq": Provider(GROQ_BASE_URL, GROQ_API_KEY),
+        "openrouter": Provider(OPENROUTER_BASE_URL, OPENROUTER_API_KEY),
+    })
 
-openrouter_client = OpenAI(
-    api_key=OPENROUTER_API_KEY,
-    base_url="https://openrouter.ai/api/v1",
-)
+# Every LLM call goes through the gateway (same .chat.completions.create interface)
+llm_gateway = get_llm_gateway()
+client = llm_gateway.client("groq")
+openrouter_client = llm_gateway.client("openrouter")
 
 # ================= REST OF YOUR CODE CONTINUES HERE =================
 # ================= SESSION STATE =================
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "chat" not in st.session_state:
+    st.session_state.chat = new_chat_state()  # which saved chat `messages` belongs to
+if "context_memo" not in st.session_state:
+    st.session_state.context_memo = {}  # summary lines of older chat turns sent to the LLM
 if "grocery_list" not in st.session_state:
     st.session_state.grocery_list = set()
 if "inventory" not in st.session_state:
@@ -405,8 +962,14 @@ if "inventory_prices" not in st.session_state:
     st.session_state.inventory_prices = {}
 if "inventory_expiry" not in st.session_state:
     st.session_state.inventory_expiry = {}
+if "expiry_reference_date" not in st.session_state:
+    st.session_state.expiry_reference_date = datetime.now().date().isoformat()  # "days left" are counted from here
 if "meal_plan" not in st.session_state:
-    st.session_state.meal_plan = {}
+    st.session_state.meal_plan = {}            # {YYYY-MM-DD: {meal: dish}} - only the days loaded so far
+if "meal_plan_saved" not in st.session_state:
+    st.session_state.meal_plan_saved = {}      # what Firestore has for those days
+if "meal_plan_windows" not in st.session_state:
+    st.session_state.meal_plan_windows = []    # (first, last) ranges already read
 if "allergies" not in st.session_state:
     st.session_state.allergies = ""
 if "custom_recipes" not in st.session_state:
@@ -968,8 +1531,9 @@ def generate_weekly_plan_from_chart(chart_summary):
                     st.session_state.grocery_list.add(item.lower())
                 st.success(f"Added {len(missing_items)} missing items to grocery list!")
             
-            # Save plan to meal planner (simplified)
+            # Save plan to meal planner (simplified) - reads only these 7 days
             today = datetime.now().date()
+            use_meal_plan(*days_window(today))
             for i in range(7):
                 day_key = (today + timedelta(days=i)).strftime("%Y-%m-%d")
                 if day_key not in st.session_state.meal_plan:
@@ -1150,6 +1714,10 @@ ALL_FOOD_INGREDIENTS = (
 
 # Create a set for faster lookup
 FOOD_INGREDIENTS_SET = set([item.lower() for item in ALL_FOOD_INGREDIENTS])
+# Every accepted ingredient needs a nutrition row or alias (nutrition.py) - else it costs an LLM call
+missing_nutrition = nutrition_engine.unknown(FOOD_INGREDIENTS_SET)
+if missing_nutrition:
+    print(f"⚠️ No nutrition data for: {', '.join(missing_nutrition)}")
 # ================= JAIN DIET RESTRICTIONS =================
 # Ingredients NOT allowed in Jain diet (grown underground)
 JAIN_RESTRICTED_INGREDIENTS = [
@@ -1264,8 +1832,15 @@ def extract_ingredients(text, jain_mode=False):
         r'([a-z][\w\s\-]{3,})\s*(to taste|as needed|as required|a pinch of?|to garnish)',
     ]
     
-    for pattern in patterns:
-        for match in re.finditer(pattern, ing_text, re.IGNORECASE):
+    # One ingredient per line ("- 200 g paneer, cubed"); the first pattern that fits a line wins
+    lines = [re.sub(r'^(?:[-•*]|\d+[.)])\s*', '', line.strip()) for line in ing_text.split("\n")]
+    lines = [re.sub(r'(\d+)/(\d+)', lambda m: str(round(int(m.group(1)) / int(m.group(2)), 2)), line) for line in lines if line]
+    
+    for line in lines:
+        for pattern in patterns:
+            match = re.search(pattern, " " + line, re.IGNORECASE)
+            if not match:
+                continue
             qty_str = "as needed"
             name = ""
             groups = match.groups()
@@ -1283,13 +1858,20 @@ def extract_ingredients(text, jain_mode=False):
                 name = groups[0].strip()
                 qty_str = groups[1].strip() if len(groups) > 1 and groups[1] else "as needed"
             
-            # Clean name: remove "of", "a", "an", "some" if at start
+            # Clean name: remove "of", "a", "an", "some" at the start and "to taste" / "as needed" at the end
             name = re.sub(r'^(of|a|an|some)\s+', '', name).strip()
+            name = re.sub(r'\s+(to taste|as needed|as required|to garnish)$', '', name).strip()
             
-            # Skip invalid or short names
-            if not name or len(name) < 3:
-                continue
-            
+            # Only real food, each ingredient once
+            if len(name) >= 3 and is_valid_food_ingredient(name) and not any(ing['name'] == name for ing in ingredients):
+                ingredients.append({
+                    'name': name,
+                    'qty': qty_str,
+                    'jain_ok': is_jain_compatible(name) if jain_mode else True,
+                })
+            break
+    
+    return ingredients
 
 
 def extract_steps(text):
@@ -1322,7 +1904,8 @@ def extract_steps(text):
     
     return steps[:15]
 
-def get_system_prompt():
+def get_system_prompt(pantry_hints=True):
+    """pantry_hints=False: no low-stock / expiring items (answers that are cached and shared)"""
     base = """You are Annapurna - a chill, friendly Indian cooking assistant.
 Be casual and helpful. Use simple language.
 
@@ -1347,7 +1930,7 @@ Remember: Your job is to provide recipes, not ask clarifying questions!"""
     if st.session_state.allergies:
         base += f"\nUser allergies: {st.session_state.allergies}. Avoid these completely!"
 
-    low_items = [k for k, v in st.session_state.inventory.items() if v < 200]
+    low_items = [k for k, v in st.session_state.inventory.items() if v < 200] if pantry_hints else []
     if low_items:
         base += f"\nUser has LOW stock of: {', '.join(low_items)}. Prefer recipes using little of these or suggest substitutes."
 
@@ -1356,25 +1939,211 @@ Remember: Your job is to provide recipes, not ask clarifying questions!"""
 
     # ───── NEW: Prioritize expiring items ─────
     expiring_soon = []
-    for item, days in st.session_state.inventory_expiry.items():
+    for item, days in (st.session_state.inventory_expiry.items() if pantry_hints else ()):
         if isinstance(days, (int, float)) and 0 < days <= 3:
             expiring_soon.append(f"{item} ({days} days left)")
     
     if expiring_soon:
         base += f"\nUser has items expiring very soon: {', '.join(expiring_soon)}. ALWAYS prioritize using these items first in recipes! Suggest them prominently and use substitutes only if absolutely necessary."
 
-    return base
+    return base + RECIPE_JSON_INSTRUCTIONS
+
+def compute_nutrition(ingredients, servings, cancelled=None):
+    """
+    Per-serving macros from parsed ingredients, worked out locally. Only
+    ingredients the table doesn't know go to the LLM (once - the engine
+    remembers them). No st.* calls: also runs on the follow-up pool.
+    """
+    result = nutrition_engine.compute(ingredients, servings)
+    if result["unresolved"] and not (cancelled and cancelled.is_set()):
+        try:
+            response = client.chat.completions.create(
+                messages=[{"role": "user", "content": fallback_prompt(result["unresolved"])}],
+                model="llama-3.3-70b-versatile",
+                temperature=0,
+                max_tokens=300
+            )
+            nutrition_engine.learn(parse_fallback(response.choices[0].message.content))
+            result = nutrition_engine.compute(ingredients, servings)
+        except Exception as e:
+            print(f"Nutrition fallback failed: {str(e)}")
+    return result
+
+def recipe_nutrition(servings):
+    """
+    Nutrition for the shown recipe: the prefetched result, None while that's
+    still running, else worked out now (kept per recipe + servings)
+    """
+    prefetched = followup_result("nutrition")
+    if prefetched is not None or followup_pending("nutrition"):
+        return prefetched
+    
+    cache_key = (recipe_digest(st.session_state.last_recipe), servings)
+    cached = st.session_state.get("nutrition_result")
+    if cached and cached[0] == cache_key:
+        return cached[1]
+    with st.spinner("Calculating nutrition..."):
+        result = compute_nutrition(ingredient_rows(current_recipe()), servings)
+    st.session_state.nutrition_result = (cache_key, result)
+    return result
+
+# ================= RECIPE OBJECT (generated JSON, or recovered from markdown) =================
+
+def recipe_digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def remember_recipe(recipe):
+    """Keep the generated Recipe for the reply just stored in last_recipe"""
+    key = recipe_digest(st.session_state.last_recipe)
+    st.session_state.recipe_data = {"key": key, "recipe": recipe.to_dict()}
+    st.session_state.recipe_obj = (key, recipe)
+
+def current_recipe():
+    """Recipe for last_recipe: the generated one, else parsed from the markdown (once per recipe)"""
+    text = st.session_state.last_recipe or ""
+    key = recipe_digest(text)
+    cached = st.session_state.get("recipe_obj")
+    if cached and cached[0] == key:
+        return cached[1]
+    recipe = None
+    data = st.session_state.get("recipe_data")
+    if data and data.get("key") == key:
+        try:
+            recipe = Recipe.from_dict(data["recipe"])
+        except ValueError:
+            recipe = None
+    if recipe is None:
+        recipe = Recipe.from_legacy(text, extract_ingredients(text), extract_steps(text))
+    st.session_state.recipe_obj = (key, recipe)
+    return recipe
+
+def ingredient_rows(recipe, jain_mode=False):
+    """[{'name', 'qty', 'jain_ok'}] - what nutrition and the ingredient check work with"""
+    return [
+        {'name': ing.name.lower(), 'qty': ing.quantity(), 'jain_ok': is_jain_compatible(ing.name) if jain_mode else True}
+        for ing in recipe.ingredients
+    ]
+
+def show_reply(response, placeholder):
+    """Finished reply → chat history + last_recipe (markdown rendered from the Recipe if it is one)"""
+    recipe, text = parse_reply(response)
+    content = recipe.to_markdown() if recipe is not None else text
+    placeholder.markdown(content)
+    st.session_state.messages.append({"role": "assistant", "content": content})
+    st.session_state.last_recipe = content
+    if recipe is not None:
+        remember_recipe(recipe)
+    return content
+
+# ================= RECIPE FOLLOW-UPS (prefetched in the background) =================
+FOLLOWUP_WAIT = 2             # seconds a click waits for a background result before showing "still working"
+FOLLOWUP_CHECK_SECONDS = 1
+
+def missing_from_inventory(names, inventory):
+    """Ingredient names with no matching inventory item"""
+    return [name for name in names if not any(key in name or name in key for key in inventory)]
+
+def parse_recipe(recipe, jain_mode, cancelled=None):
+    """Ingredients and steps - what Start Cooking / Substitutes need (what's missing is checked on click)"""
+    ingredients = ingredient_rows(recipe, jain_mode)
+    return {
+        "ingredients": ingredients,
+        "names": [ing['name'] for ing in ingredients],
+        "steps": recipe.step_texts(),
+    }
+
+def substitute_prompt(missing):
+    return f"Practical Indian substitutes for: {', '.join(missing)}. One or two options each."
+
+def find_substitutes(missing, cancelled=None):
+    """Substitute suggestions for the missing ingredients ("" if nothing is missing)"""
+    if not missing or (cancelled and cancelled.is_set()):
+        return ""
+    response = client.chat.completions.create(
+        messages=[{"role": "user", "content": substitute_prompt(missing)}],
+        model="llama-3.3-70b-versatile",
+        temperature=0.6,
+        max_tokens=400
+    )
+    return response.choices[0].message.content.strip()
+
+def followups_key():
+    """What the follow-ups depend on: the recipe, Jain mode and servings (inventory edits don't restart them)"""
+    basis = json.dumps([
+        st.session_state.last_recipe, st.session_state.jain_mode, st.session_state.servings,
+    ], default=str)
+    return hashlib.sha1(basis.encode("utf-8")).hexdigest()
+
+def recipe_steps():
+    parsed = followup_result("parse")
+    return parsed["steps"] if parsed is not None else current_recipe().step_texts()
+
+def start_followups():
+    """New recipe shown → parse it and prefetch nutrition (local); cancel work for the previous one"""
+    if not st.session_state.last_recipe:
+        return
+    key = followups_key()
+    current = st.session_state.get("followups")
+    if current is not None:
+        if current.key == key:
+            return
+        current.cancel()
+    recipe = current_recipe()
+    jain_mode = st.session_state.jain_mode
+    servings = st.session_state.servings
+    st.session_state.followups = RecipeFollowUps(followup_pool, key, {
+        "parse": (lambda cancelled: parse_recipe(recipe, jain_mode), ()),
+        "nutrition": (lambda parsed, cancelled: compute_nutrition(parsed["ingredients"], servings, cancelled), ("parse",)),
+    })
 
-def get_nutrition_prompt(servings):
-    return f"""You are a nutrition calculator. For the given recipe, estimate nutritional values **strictly PER {servings} SERVING(S)**.
-Return format:
-Calories: X kcal
-Protein: X g
-Carbs: X g
-Fat: X g
-Fiber: X g
+def current_followups():
+    """The follow-ups of the recipe on screen, or None (none started, or stale)"""
+    followups = st.session_state.get("followups")
+    if followups is None or not st.session_state.last_recipe or followups.key != followups_key():
+        return None
+    return followups
 
-Be realistic using standard Indian/home-cooked food values. Do NOT give total for whole recipe — only per serving."""
+def followup_result(name, timeout=FOLLOWUP_WAIT):
+    """Result for the recipe on screen, waiting at most `timeout`; None if not started, still running, stale or failed"""
+    followups = current_followups()
+    if followups is None or not (followups.ready(name) or followups.pending(name)):
+        return None
+    try:
+        if not followups.ready(name):
+            with st.spinner("Almost ready..."):
+                return followups.result(name, timeout=timeout)
+        return followups.result(name)
+    except FutureTimeout:
+        return None  # still running: followup_watch() reruns the app when it's done
+    except Exception as e:
+        print(f"Recipe follow-up '{name}' failed: {str(e)}")
+        return None
+
+def followup_pending(name):
+    followups = current_followups()
+    return followups is not None and followups.pending(name)
+
+def substitutes_for(missing):
+    """
+    Substitutes for these missing items: asked on first use (the LLM call runs
+    on the follow-up pool), None while it runs. "" if it failed or there are
+    no follow-ups to run it on (the caller then streams it itself).
+    """
+    followups = current_followups()
+    if followups is None:
+        return ""
+    name = "substitutes:" + "|".join(missing)
+    followups.add(name, lambda parsed, cancelled: find_substitutes(missing, cancelled), ("parse",))
+    result = followup_result(name)
+    if result is None and not followups.pending(name):
+        return ""
+    return result
+
+@st.fragment(run_every=FOLLOWUP_CHECK_SECONDS)
+def followup_watch(name):
+    """Shown while a follow-up is still running; reruns the app once it's done"""
+    if not followup_pending(name):
+        st.rerun()
 
 # ================= MAIN APP =================
 st.set_page_config(
@@ -1510,15 +2279,14 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ────── EXPIRATION WARNING BANNER ──────
-expiring_items = []
-expired_items = []
+# Reads the nightly summary; worked out here only if it isn't from today (or the inventory changed)
+expiry_summary = st.session_state.get("expiry_summary")
+if not expiry_summary or expiry_summary.get("date") != datetime.now().date().isoformat():
+    expiry_summary = summarize_expiry(st.session_state.inventory_expiry)
+    st.session_state.expiry_summary = expiry_summary
 
-for item, days in st.session_state.inventory_expiry.items():
-    if isinstance(days, (int, float)):
-        if days <= 0:
-            expired_items.append(f"{item} (expired {abs(days)} days ago)")
-        elif days <= 3:
-            expiring_items.append(f"{item} ({days} days left)")
+expired_items = [f"{entry['name']} (expired {abs(entry['days'])} days ago)" for entry in expiry_summary["expired"]]
+expiring_items = [f"{entry['name']} ({entry['days']} days left)" for entry in expiry_summary["expiring"]]
 
 if expired_items or expiring_items:
     if expired_items:
@@ -1604,14 +2372,22 @@ with st.sidebar:
     st.markdown("---")
 
     # ──── FIREBASE STATUS ────
+    # Cached numbers from the background monitor (no Firestore read per rerun)
     st.caption("🔧 Firebase Status")
-    try:
-        db.collection("_health_check").document("test").get()
+    fb_status = firestore_monitor.status()
+    if fb_status["connected"]:
         st.success("✅ Connected")
-    except Exception as e:
-        st.error("❌ Not Connected")
+        if fb_status["p50"] is not None:
+            st.caption(f"Latency p50 {fb_status['p50'] * 1000:.0f} ms · p95 {fb_status['p95'] * 1000:.0f} ms")
+    elif fb_status["last_checked"] is None:
+        st.info("⏳ Checking connection...")
+    else:
+        st.error("❌ Not Connected" if fb_status["state"] != "closed" else "⚠️ Degraded")
         with st.expander("See Details"):
-            st.write(str(e))
+            st.write(fb_status["last_error"])
+            unsynced = writer.pending_count(prefix=f"users/{st.session_state.user_id}") + storage_for(st.session_state.user_id).pending(st.session_state.user_id)
+            if unsynced:
+                st.write(f"{unsynced} change(s) saved on this device, waiting to sync")
 
     st.markdown("---")
 
@@ -1778,10 +2554,79 @@ with st.sidebar:
 
     st.markdown("---")
 
+    # ──── HOUSEHOLD ────
+    if not is_guest_id(st.session_state.user_id):
+        st.subheader("🏠 Household")
+        household_id = st.session_state.get("household_id")
+        if household_id:
+            if "household" not in st.session_state:
+                try:
+                    st.session_state.household = get_household(db, household_id) or {}
+                except Exception as e:
+                    st.session_state.household = {}
+                    print(f"Household lookup failed: {str(e)}")
+            household = st.session_state.household
+            st.write(f"**{household.get('name', 'Shared Kitchen')}** · {len(household.get('members', [])) or '?'} member(s)")
+            st.caption(f"Invite code: `{household.get('invite_code', '…')}` · inventory updates live for everyone")
+            if st.button("Leave Household", use_container_width=True):
+                try:
+                    save_pantry()
+                    leave_household(db, st.session_state.user_id, household_id)
+                    local_cache.merge_root(st.session_state.user_id, {"household_id": None})
+                    pantry_hub.unsubscribe(st.session_state.session_id)
+                    for key in ("household_id", "household", "pantry_records", "pantry_version", "data_loaded"):
+                        st.session_state.pop(key, None)
+                    st.session_state.change_tracker = ChangeTracker()  # own inventory gets loaded again
+                    st.success("👋 Left the household - your own inventory is back")
+                    st.rerun()
+                except Exception as e:
+                    st.warning(f"⚠️ Couldn't leave the household: {str(e)}")
+        else:
+            with st.expander("👨‍👩‍👧 Share your pantry"):
+                household_name = st.text_input("Household name", placeholder="e.g., Sharma Kitchen")
+                if st.button("Create Household", use_container_width=True):
+                    try:
+                        # Your current inventory becomes the shared pantry
+                        enter_household(create_household(
+                            db, st.session_state.user_id, household_name,
+                            inventory=build_records(st.session_state)["inventory"],
+                        ))
+                        st.rerun()
+                    except Exception as e:
+                        st.warning(f"⚠️ Couldn't create the household: {str(e)}")
+                
+                invite_code = st.text_input("Invite code", placeholder="e.g., K7M2QX")
+                if st.button("Join Household", use_container_width=True) and invite_code:
+                    try:
+                        enter_household(join_household(db, st.session_state.user_id, invite_code))
+                        st.rerun()
+                    except HouseholdError as e:
+                        st.warning(f"⚠️ {str(e)}")
+                    except Exception as e:
+                        st.warning(f"⚠️ Couldn't join the household: {str(e)}")
+                st.caption("Your own inventory stays saved and comes back if you leave.")
+        
+        st.markdown("---")
+
     # ──── SIGN OUT ────
     if st.button("🚪 Sign Out", use_container_width=True, type="primary"):
+        # Push any queued writes before the session data is dropped
+        save_chat()
+        if not writer.flush(timeout=10, prefix=f"users/{st.session_state.user_id}"):
+            st.warning("⚠️ Some changes are still syncing in the background")
+        voice_hub.unsubscribe(st.session_state.session_id)
+        pantry_hub.unsubscribe(st.session_state.session_id)
+        grocery_hub.unsubscribe(st.session_state.session_id)
+        storage_for(st.session_state.user_id).forget(st.session_state.user_id)
+        try:
+            if current_session_key():
+                session_store.forget(current_session_key())
+            end_session()
+        except Exception as e:
+            print(f"Session state delete failed: {str(e)}")
         for key in list(st.session_state.keys()):
             del st.session_state[key]
+        set_cookie(SESSION_COOKIE, "", 0)  # written by the login page
         st.success("👋 Signed out successfully!")
         time.sleep(1)
         st.rerun()
@@ -1798,8 +2643,31 @@ render_header()
 col1, col2, col3 = st.columns([1, 2, 1])
 with col2:
     if st.button("🆕 Start Fresh Chat", use_container_width=True):
-        st.session_state.messages = []
+        open_chat()  # the current chat stays saved under 📚 Past Chats
         st.rerun()
+    
+    if not is_guest_id(st.session_state.user_id):
+        if st.button("📚 Past Chats", use_container_width=True):
+            st.session_state.show_chat_list = not st.session_state.get("show_chat_list", False)
+            st.session_state.pop("chat_index", None)
+        if st.session_state.get("show_chat_list"):
+            if "chat_index" not in st.session_state:
+                try:
+                    st.session_state.chat_index = list_chats(db, st.session_state.user_id)
+                except Exception as e:
+                    st.warning(f"⚠️ Couldn't load past chats: {str(e)}")
+                    st.session_state.chat_index = []
+            if not st.session_state.chat_index:
+                st.caption("No saved chats yet")
+            for saved_chat in st.session_state.chat_index:
+                label = f"{saved_chat.get('title', 'Chat')} · {str(saved_chat.get('updated_at', ''))[:10]}"
+                if st.button(label, key=f"open_chat_{saved_chat['id']}", use_container_width=True):
+                    try:
+                        open_chat(saved_chat["id"], load_page(db, st.session_state.user_id, saved_chat["id"]))
+                        st.session_state.show_chat_list = False
+                        st.rerun()
+                    except Exception as e:
+                        st.warning(f"⚠️ Couldn't open that chat: {str(e)}")
 
 tab1, tab2, tab3, tab4, tab5, tab6, tab_receipt, tab_ingredient_scan, tab_diet = st.tabs([
     "💬 Chat", "📅 Meal Planner", "🛒 Grocery & Inventory",
@@ -1824,8 +2692,12 @@ with tab1:
         
         # Show status of external voice listener
         import os
-        if True:  # Firebase is always available
+        if is_guest_id(st.session_state.user_id):
+            st.warning("⚠️ The voice listener needs a signed-in account - sign in with Google to use it")
+        elif True:  # Firebase is always available
             st.info("✅ **Firebase Voice Listener Ready** - Say 'Annapurna' on your computer!")
+            st.caption("Start the listener with your user id:")
+            st.code(f"python voice_listener_firebase.py --user {st.session_state.user_id}", language="bash")
         else:
             st.warning("⚠️ Start voice listener on your computer: `python voice_listener_firebase.py`")
         
@@ -1865,36 +2737,66 @@ with tab1:
 # ═══════════════════════════════════════════════════════════════
 # CHECK FOR VOICE COMMANDS FROM EXTERNAL LISTENER
 # ═══════════════════════════════════════════════════════════════
-def check_voice_commands_from_firebase():
-    """Check if voice listener has sent any commands via Firebase"""
-    try:
-        # Query for unprocessed commands, ordered by timestamp
-        commands_ref = db.collection('voice_commands').where('processed', '==', False).order_by('created_at').limit(1)
-        docs = commands_ref.get()
-        
-        for doc in docs:
-            command_data = doc.to_dict()
-            command_text = command_data.get('text', '')
-            
-            # Mark as processed
-            doc.reference.update({'processed': True})
-            
-            return command_text
-    except Exception as e:
-        # Silently fail if Firebase not available or error occurs
-        pass
-    
-    return None
+VOICE_INBOX_CHECK_SECONDS = 0.5
 
-# Check for voice commands from external listener (Firebase-based)
-voice_command_from_file = check_voice_commands_from_firebase()
+@st.fragment(run_every=VOICE_INBOX_CHECK_SECONDS)
+def voice_command_inbox():
+    """
+    Looks at this session's in-memory inbox (filled by the on_snapshot
+    listener). Only this fragment reruns on the timer; the whole app
+    reruns only when a command actually arrived.
+    """
+    command_text = voice_hub.poll(st.session_state.session_id)
+    if command_text:
+        st.session_state.pending_voice_command = command_text
+        st.toast(f"🎤 Voice Command Detected: {command_text}")
+        st.rerun()  # full app rerun to process the command
+
+if st.session_state.voice_enabled and not is_guest_id(st.session_state.user_id):
+    voice_hub.subscribe(st.session_state.session_id, st.session_state.user_id)
+    voice_command_inbox()
+else:
+    voice_hub.unsubscribe(st.session_state.session_id)
 
-# Store in session state if detected
-if voice_command_from_file:
-    st.session_state.pending_voice_command = voice_command_from_file
-    st.success(f"🎤 Voice Command Detected: **{voice_command_from_file}**")
-    # Force immediate rerun to process the command
-    st.rerun()
+# ═══════════════════════════════════════════════════════════════
+# LIVE GROCERY LIST
+# ═══════════════════════════════════════════════════════════════
+GROCERY_CHECK_SECONDS = 0.5
+
+@st.fragment(run_every=GROCERY_CHECK_SECONDS)
+def grocery_list_watch():
+    """Reruns the app only when another device added or removed a grocery item"""
+    if sync_grocery_list():
+        st.rerun()
+
+if st.session_state.get("data_loaded") and not is_guest_id(st.session_state.user_id):
+    grocery_list_watch()
+
+# ═══════════════════════════════════════════════════════════════
+# LIVE HOUSEHOLD PANTRY
+# ═══════════════════════════════════════════════════════════════
+PANTRY_CHECK_SECONDS = 2
+
+@st.fragment(run_every=PANTRY_CHECK_SECONDS)
+def household_pantry_watch():
+    """
+    The pantry listener keeps an in-memory copy up to date; this only
+    reruns the app when another member's change is in it.
+    """
+    pantry_hub.touch(st.session_state.session_id)
+    household_id = st.session_state.get("household_id")
+    loaded = pantry_hub.records(household_id) if household_id else None
+    if loaded is None or loaded[0] == st.session_state.get("pantry_version"):
+        return
+    version, records = loaded
+    fresh = records_to_state({"inventory": records})
+    if all(fresh[key] == st.session_state.get(key) for key in ("inventory", "inventory_prices", "inventory_expiry")):
+        st.session_state.pantry_version = version  # just our own writes landing
+    else:
+        st.rerun()
+
+if st.session_state.get("household_id"):
+    household_pantry_watch()
 
 # Check for voice commands in queue (old threading method - keeping for manual button)
 if st.session_state.new_command_available and not st.session_state.voice_command_queue.empty():
@@ -1913,13 +2815,6 @@ if st.session_state.listening_active and st.session_state.listening_status in ["
     time.sleep(1)  # Increased from 0.5 to 1 second
     st.rerun()
 
-# Automatic voice command polling using st_autorefresh
-# Only runs when voice is enabled - provides smooth voice command detection
-if st.session_state.voice_enabled:
-    # Refresh every 3 seconds to check for voice commands
-    # This won't interfere with chat input as long as user isn't actively typing
-    st_autorefresh(interval=3000, key="voice_poll_refresh")
-
 # Show error if any
 if st.session_state.listening_error:
     st.error(f"❌ Listening error: {st.session_state.listening_error}")
@@ -1938,6 +2833,17 @@ for msg in st.session_state.messages:
     # Voice Input Section
 video_id = None
 
+# Earlier turns of this chat: fetched from Firestore a page at a time, only when asked for
+use_chat_history()
+chat = st.session_state.chat
+if chat["id"] and not is_guest_id(st.session_state.user_id):
+    if (chat["older"][0]["seq"] if chat["older"] else chat["oldest_seq"]) > 0:
+        if st.button("⬆️ Load older messages"):
+            load_older_messages()
+    for msg in chat["older"]:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+
 # Show chat history with custom styling
 for msg in st.session_state.messages:
     display_message(msg["role"], msg["content"])
@@ -2294,10 +3200,10 @@ if uploaded_file is not None:
                     else:
                         st.session_state.gym_diet_chart = edited_summary
                         if not st.session_state.user_email.startswith("guest"):
-                            db.collection("users").document(st.session_state.user_id).set({
+                            writer.set(db.collection("users").document(st.session_state.user_id), encode_fields("root", {
                                 "gym_diet_chart": edited_summary,
                                 "chart_updated": datetime.now().isoformat()
-                            }, merge=True)
+                            }), merge=True)
                         st.success("Saved!")
 
                 if col2.button("📅 Generate Weekly Plan" if not is_receipt else "➕ Add Missing Items"):
@@ -2444,6 +3350,9 @@ if prompt:
         if st.session_state.servings > 1:
             full_prompt += f" (for {st.session_state.servings} people)"
        
+        # Only a dish name that opens the conversation can reuse (and give) a shared cached answer:
+        # a short follow-up like "less spicy" needs the chat history
+        cacheable = enhanced_prompt != prompt and not st.session_state.messages
         st.session_state.messages.append({"role": "user", "content": full_prompt})
         with st.chat_message("user"):
             st.markdown(enhanced_prompt)  # Show enhanced version, not original
@@ -2457,21 +3366,33 @@ if prompt:
 ])):
     # your streaming code here
                 try:
-                    stream = client.chat.completions.create(
-                        messages=[{"role": "system", "content": get_system_prompt()}, *st.session_state.messages],
+                    if cacheable:
+                        # Nothing to refer back to: without pantry hints an earlier answer for the
+                        # same dish + settings (any user's) is replayed from the cache
+                        context = [{"role": "system", "content": get_system_prompt(pantry_hints=False)},
+                                   {"role": "user", "content": full_prompt}]
+                        cache_settings = {
+                            "language_mode": st.session_state.language_mode,
+                            "jain_mode": bool(st.session_state.jain_mode),
+                            "allergies": st.session_state.allergies or "",
+                            "servings": st.session_state.servings,
+                        }
+                    else:
+                        context = build_context(get_system_prompt(), st.session_state.messages, st.session_state.context_memo)
+                        cache_settings = None
+                    stream = cached_stream(
+                        response_cache, client, context,
                         model="llama-3.3-70b-versatile",
+                        cache_settings=cache_settings,
                         temperature=0.75,
-                        max_tokens=700,
-                        stream=True
+                        max_tokens=700
                     )
                     response = ""
                     placeholder = st.empty()
-                    for chunk in stream:
-                        if chunk.choices[0].delta.content:
-                            response += chunk.choices[0].delta.content
-                            placeholder.markdown(response)
-                    st.session_state.messages.append({"role": "assistant", "content": response})
-                    st.session_state.last_recipe = response
+                    for piece in stream:
+                        response += piece
+                        placeholder.markdown(render_partial(response))
+                    response = show_reply(response, placeholder)
                    
                     if st.session_state.voice_enabled and response:
                         lang_code = "hi" if st.session_state.voice_language == "Hindi" else "en"
@@ -2506,25 +3427,23 @@ if st.button("😴 Feeling Lazy? Suggest from Inventory"):
             "Tasting for perfection… 👨‍🍳"
         ])):
             try:
-                stream = client.chat.completions.create(
-                    messages=[{"role": "system", "content": get_system_prompt()}, *st.session_state.messages],
+                stream = cached_stream(
+                    response_cache, client,
+                    build_context(get_system_prompt(), st.session_state.messages, st.session_state.context_memo),
                     model="llama-3.3-70b-versatile",
                     temperature=0.75,
-                    max_tokens=700,
-                    stream=True
+                    max_tokens=700
                 )
                 
                 response = ""
                 placeholder = st.empty()
                 
-                for chunk in stream:
-                    if chunk.choices[0].delta.content:
-                        response += chunk.choices[0].delta.content
-                        placeholder.markdown(response)
+                for piece in stream:
+                    response += piece
+                    placeholder.markdown(render_partial(response))
                 
                 # Save the final response
-                st.session_state.messages.append({"role": "assistant", "content": response})
-                st.session_state.last_recipe = response
+                response = show_reply(response, placeholder)
                 
                 # Voice output if enabled
                 if st.session_state.voice_enabled and response:
@@ -2545,26 +3464,18 @@ if st.button("😴 Feeling Lazy? Suggest from Inventory"):
                     st.session_state.listening_status = "listening"
    
 if st.session_state.messages and st.session_state.messages[-1]["role"] == "assistant":
+    start_followups()  # the buttons below then mostly just render
     col1, col2, col3, col4 = st.columns([2,2,2,2])
     with col1:
         if st.button("🍳 Start Cooking"):
-            # Auto-extract ingredients from recipe
-            auto_ingredients = auto_extract_ingredients_from_recipe(st.session_state.last_recipe)
+            # Ingredients + what's missing: usually already worked out in the background
+            parsed = followup_result("parse")
+            auto_ingredients = parsed["names"] if parsed is not None else auto_extract_ingredients_from_recipe()
+            missing_items = missing_from_inventory(auto_ingredients, st.session_state.inventory)
             
             if not auto_ingredients:
                 st.error("❌ Could not detect ingredients. Try rephrasing the recipe.")
             else:
-                # Check which are missing from inventory
-                missing_items = []
-                for item in auto_ingredients:
-                    found = False
-                    for inv_key in st.session_state.inventory:
-                        if inv_key in item or item in inv_key:
-                            found = True
-                            break
-                    if not found:
-                        missing_items.append(item)
-                
                 # Store for later use
                 st.session_state.detected_ingredients = auto_ingredients
                 st.session_state.missing_ingredients = missing_items
@@ -2596,7 +3507,7 @@ if st.session_state.messages and st.session_state.messages[-1]["role"] == "assis
     # ═══ RECIPE FORMATTER (keep this as-is) ═══
     if st.session_state.last_recipe:
         st.markdown("---")
-        format_recipe(st.session_state.last_recipe)
+        format_recipe(current_recipe(), st.session_state.last_recipe)
    
 if st.session_state.show_cooking_check and not st.session_state.cooking_mode:
     st.markdown("---")
@@ -2662,7 +3573,7 @@ if st.session_state.show_cooking_check and not st.session_state.cooking_mode:
             with col3:
                 if st.button("🍳 Cook Anyway"):
                     # Extract steps and start cooking
-                    st.session_state.cooking_steps = extract_steps(st.session_state.last_recipe)
+                    st.session_state.cooking_steps = recipe_steps()
                     if st.session_state.cooking_steps:
                         st.session_state.cooking_mode = True
                         st.session_state.current_step = 0
@@ -2684,7 +3595,7 @@ if st.session_state.show_cooking_check and not st.session_state.cooking_mode:
             
             with col2:
                 if st.button("👨‍🍳 Start Step-by-Step Cooking", type="primary"):
-                    st.session_state.cooking_steps = extract_steps(st.session_state.last_recipe)
+                    st.session_state.cooking_steps = recipe_steps()
                     if st.session_state.cooking_steps:
                         st.session_state.cooking_mode = True
                         st.session_state.current_step = 0
@@ -2695,31 +3606,32 @@ if st.session_state.show_cooking_check and not st.session_state.cooking_mode:
 
 if st.session_state.show_nutrition and not st.session_state.cooking_mode:
         st.markdown("---")
-        st.subheader(f"🥗 Nutrition per {st.session_state.servings} serving(s)")
-        with st.spinner("Calculating nutrition..."):
-            try:
-                stream = client.chat.completions.create(
-                    messages=[{"role": "system", "content": get_nutrition_prompt(st.session_state.servings)},
-                              {"role": "user", "content": st.session_state.last_recipe}],
-                    model="llama-3.3-70b-versatile",
-                    temperature=0.5,
-                    max_tokens=500,
-                    stream=True
-                )
-                response = ""
-                placeholder = st.empty()
-                for chunk in stream:
-                    if chunk.choices[0].delta.content:
-                        response += chunk.choices[0].delta.content
-                        placeholder.markdown(response)
-                
-                if st.session_state.voice_enabled and response:
+        st.subheader(f"🥗 Nutrition per serving (recipe for {st.session_state.servings})")
+        try:
+            result = recipe_nutrition(st.session_state.servings)
+            if result is None:
+                st.caption("⏳ Still working out nutrition...")
+                followup_watch("nutrition")
+            else:
+                per_serving = result["per_serving"]
+                cols = st.columns(len(NUTRIENTS))
+                for col, nutrient in zip(cols, NUTRIENTS):
+                    col.metric(nutrient.capitalize(), f"{per_serving[nutrient]:g} {NUTRIENT_UNITS[nutrient]}")
+                if result["items"]:
+                    with st.expander("How this was worked out"):
+                        for name, key, grams in result["items"]:
+                            st.caption(f"{name} → {key}, ~{grams:g} g")
+                if result["unresolved"]:
+                    st.caption(f"⚠️ Not counted (unknown ingredient): {', '.join(result['unresolved'])}")
+            
+                if st.session_state.voice_enabled:
+                    summary = ", ".join(f"{nutrient} {per_serving[nutrient]:g} {NUTRIENT_UNITS[nutrient]}" for nutrient in NUTRIENTS)
                     lang_code = "hi" if st.session_state.voice_language == "Hindi" else "en"
-                    audio_fp = text_to_speech(response, lang_code)
+                    audio_fp = text_to_speech(f"Per serving: {summary}", lang_code)
                     if audio_fp:
                         st.audio(audio_fp, format="audio/mp3", autoplay=False)
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
         if st.button("Close Nutrition"):
             st.session_state.show_nutrition = False
             st.rerun()
@@ -2727,34 +3639,39 @@ if st.session_state.show_nutrition and not st.session_state.cooking_mode:
 if st.session_state.show_substitutes and not st.session_state.cooking_mode:
         st.markdown("---")
         st.subheader("🔄 Ingredient Substitutes")
-        ingredients = extract_ingredients(st.session_state.last_recipe)
-        missing = [ing['name'] for ing in ingredients if not any(k in ing['name'] or ing['name'] in k for k in st.session_state.inventory)]
+        parsed = followup_result("parse") or parse_recipe(current_recipe(), st.session_state.jain_mode)
+        missing = missing_from_inventory(parsed["names"], st.session_state.inventory)
         if missing:
             st.markdown(f"**Finding alternatives for:** {', '.join(missing)}")
-            with st.spinner("Looking for Indian alternatives..."):
-                try:
-                    sub_prompt = f"Practical Indian substitutes for: {', '.join(missing)}. One or two options each."
-                    stream = client.chat.completions.create(
-                        messages=[{"role": "user", "content": sub_prompt}],
-                        model="llama-3.3-70b-versatile",
-                        temperature=0.6,
-                        max_tokens=400,
-                        stream=True
-                    )
-                    resp = ""
-                    placeholder = st.empty()
-                    for chunk in stream:
-                        if chunk.choices[0].delta.content:
-                            resp += chunk.choices[0].delta.content
-                            placeholder.markdown(resp)
-                    
-                    if st.session_state.voice_enabled and resp:
-                        lang_code = "hi" if st.session_state.voice_language == "Hindi" else "en"
-                        audio_fp = text_to_speech(resp, lang_code)
-                        if audio_fp:
-                            st.audio(audio_fp, format="audio/mp3", autoplay=False)
-                except Exception as e:
-                    st.error(str(e))
+            resp = substitutes_for(missing)
+            try:
+                if resp is None:
+                    st.caption("⏳ Looking for Indian alternatives...")
+                    followup_watch("substitutes:" + "|".join(missing))
+                elif not resp:
+                    with st.spinner("Looking for Indian alternatives..."):
+                        stream = client.chat.completions.create(
+                            messages=[{"role": "user", "content": substitute_prompt(missing)}],
+                            model="llama-3.3-70b-versatile",
+                            temperature=0.6,
+                            max_tokens=400,
+                            stream=True
+                        )
+                        placeholder = st.empty()
+                        for chunk in stream:
+                            if chunk.choices[0].delta.content:
+                                resp += chunk.choices[0].delta.content
+                                placeholder.markdown(resp)
+                else:
+                    st.markdown(resp)
+                
+                if st.session_state.voice_enabled and resp:
+                    lang_code = "hi" if st.session_state.voice_language == "Hindi" else "en"
+                    audio_fp = text_to_speech(resp, lang_code)
+                    if audio_fp:
+                        st.audio(audio_fp, format="audio/mp3", autoplay=False)
+            except Exception as e:
+                st.error(str(e))
         else:
             st.info("No missing ingredients!")
         if st.button("Close Substitutes"):
@@ -2782,14 +3699,16 @@ if st.session_state.cooking_mode:
             if audio_fp:
                 st.audio(audio_fp, format="audio/mp3", autoplay=True)  # ← autoplay=True
             # ───── NEW: TIMER FEATURE ─────
-        # Parse time from step text
+        # Generated recipes say how long each step takes; older ones: parse time from step text
+        recipe = current_recipe()
+        step_minutes = recipe.steps[current].minutes if recipe.structured and current < len(recipe.steps) else None
         time_pattern = r'(?:for|about|around|approximately)?\s*(\d+(?:\.\d+)?)\s*(minute|minutes|min|hour|hours|hr|second|seconds|sec|overnight)'
-        match = re.search(time_pattern, step_text.lower())
+        match = None if step_minutes else re.search(time_pattern, step_text.lower())
         
         timer_key = f"timer_{current}"
-        if match:
-            amount = float(match.group(1))
-            unit = match.group(2).lower()
+        if step_minutes or match:
+            amount = step_minutes or float(match.group(1))
+            unit = "minutes" if step_minutes else match.group(2).lower()
             
             if unit in ["minute", "minutes", "min"]:
                 seconds = int(amount * 60)
@@ -2973,6 +3892,9 @@ with tab2:
     tomorrow = datetime.now() + timedelta(days=1)
     selected_date = st.date_input("Plan for:", value=tomorrow)
     date_key = selected_date.strftime("%Y-%m-%d")
+    plan_view = st.radio("Show", ["Next 7 days", "This month"], horizontal=True, key="meal_plan_view")
+    view_first, view_last = days_window(selected_date) if plan_view == "Next 7 days" else month_window(selected_date)
+    use_meal_plan(view_first, view_last)
     meals = ["Breakfast", "Morning Snack", "Lunch", "Evening Snack", "Dinner"]
     planned = st.session_state.meal_plan.get(date_key, {})
     for meal in meals:
@@ -2987,6 +3909,13 @@ with tab2:
         st.markdown("### Planned Meals")
         for m, d in st.session_state.meal_plan[date_key].items():
             st.write(f"**{m}**: {d}")
+    
+    upcoming = sorted(day for day in st.session_state.meal_plan if view_first <= day <= view_last and st.session_state.meal_plan[day])
+    if upcoming:
+        st.markdown(f"### 🗓️ {plan_view}")
+        for day in upcoming:
+            meals_text = " · ".join(f"{m}: {d}" for m, d in st.session_state.meal_plan[day].items())
+            st.write(f"**{datetime.strptime(day, '%Y-%m-%d').strftime('%a %d %b')}** - {meals_text}")
 
 # ────────────── GROCERY & INVENTORY ──────────────
 with tab3:
@@ -3075,6 +4004,7 @@ with tab4:
 # ────────────── TRIED RECIPES ──────────────
 with tab5:
     st.subheader("🔥 Tried Recipes")
+    use_collection("tried_recipes")
     if not st.session_state.tried_recipes:
         st.info("No recipes tried yet! Cook something to see here.")
     else:
@@ -3086,6 +4016,7 @@ with tab5:
 # ────────────── FAVOURITE RECIPES ──────────────
 with tab6:
     st.subheader("❤️ Favourite Recipes")
+    use_collection("favourites")
     if not st.session_state.favourite_recipes:
         st.info("No favourites yet! Heart a recipe to add.")
     else:
@@ -3255,6 +4186,7 @@ with tab_ingredient_scan:
 # ────────────── DIET CHARTS TAB ──────────────
 with tab_diet:
     st.subheader("🥗 Diet Charts")
+    use_collection("diet_charts")
     st.info("Create personalized diet plans and meal schedules")
     
     # Create new diet chart
@@ -3382,20 +4314,20 @@ with tab_diet:
 
 if st.session_state.get("is_authenticated", False) and st.session_state.get("user_id"):
     try:
-        user_data = {
-            "inventory": dict(st.session_state.inventory),  # convert to plain dict for JSON
-            "inventory_prices": dict(st.session_state.inventory_prices),
-            "inventory_expiry": dict(st.session_state.inventory_expiry),
-            "grocery_list": list(st.session_state.grocery_list),
-            "diet_charts": dict(st.session_state.diet_charts),  # Save diet charts
-            "last_updated": datetime.now().isoformat()
-        }
+        # Only the records that changed since the last save (empty → skip the write):
+        # one small write per changed inventory item / chart / favourite
+        writes = st.session_state.change_tracker.collect_writes(st.session_state)
+        storage_for(st.session_state.user_id).touch(st.session_state.user_id)  # keeps this user in the sync
+        save_pantry()  # household members: inventory goes to the shared pantry, item by item
+        save_chat()    # new chat turns, appended; older ones leave session memory
+        save_meal_plan()
         
-        # Save (merge = True means update only these fields, don't overwrite others)
-        db.collection("users").document(st.session_state.user_id).set(
-            user_data,
-            merge=True
-        )
+        if writes:
+            # Accounts: local cache now, Firestore in the background. Guests: process memory only.
+            storage_for(st.session_state.user_id).save(st.session_state.user_id, build_records(st.session_state), writes)
+            st.session_state.change_tracker.mark_persisted(st.session_state)
+            if any(path[:1] == ("inventory",) for _, path, _ in writes):
+                st.session_state.pop("expiry_summary", None)  # banner works it out again next run
         
         # Optional: show tiny success message (remove if annoying)
         # st.caption("Inventory auto-saved ✓")
@@ -3403,6 +4335,9 @@ if st.session_state.get("is_authenticated", False) and st.session_state.get("use
     except Exception as e:
         # Silent fail (don't break app), but log for you
         print(f"Auto-save failed: {str(e)}")
+
+    # Working state (chat, cooking progress, timers...) for whichever replica serves the next run
+    save_session_state()
 # Improved floating PWA install button
 st.markdown("""
     <script>
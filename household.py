@@ -0,0 +1,367 @@
+"""
+🏠 Annapurna Household Pantry
+Several accounts can share one kitchen. The household's inventory lives
+in its own subcollection, and every change is sent as a small per-item
+update instead of rewriting the whole inventory:
+
+    households/{hid}                    name, invite_code, members, created_by
+    households/{hid}/inventory/{item}   name, qty, price, expires_on, expiry_days, recent_ops
+    users/{uid}.household_id            which household the account is in
+
+- Quantity changes, up or down, are deltas applied in a per-item
+  transaction (read qty, write max(0, qty + delta)): two members' edits
+  both count and the stored qty never goes below zero. Each change
+  carries an op id kept in the item's recent_ops, so a retry after a
+  commit whose response was lost doesn't apply it twice.
+- Price / expiry changes are field-level merges; removing an item
+  deletes only that item. Legacy text quantities ("1 L") are merged as
+  plain values.
+- One worker thread per process sends the changes in the order made,
+  retrying (with backoff, and not while the circuit breaker is open)
+  until they commit. The app never waits on it.
+
+Members see each other's changes live: one on_snapshot listener per
+household per process keeps an in-memory copy that app sessions read.
+Sessions that stop calling subscribe() (closed tabs) are dropped after
+SESSION_TTL, and the listener with them once no session uses it.
+"""
+
+import copy
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from collections import deque
+from firebase_admin import firestore
+from firestore_monitor import FirestoreUnavailable
+from listener_hub import SESSION_TTL, ListenerHub
+from user_data_store import diff_fields, user_ref
+
+HOUSEHOLDS_COLLECTION = "households"
+PANTRY_COLLECTION = "inventory"
+MAX_MEMBERS = 12
+INVITE_CODE_LENGTH = 6
+INVITE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"   # no 0/O or 1/I look-alikes
+RECENT_OPS = 20         # op ids remembered per pantry item (retry guard)
+MAX_RETRY_DELAY = 30    # seconds
+
+
+class HouseholdError(Exception):
+    """Bad invite code, household full, ... (message is shown to the user)"""
+
+
+def household_ref(db, household_id):
+    return db.collection(HOUSEHOLDS_COLLECTION).document(household_id)
+
+
+def pantry_ref(db, household_id):
+    """households/{hid}/inventory"""
+    return household_ref(db, household_id).collection(PANTRY_COLLECTION)
+
+
+# ═══════════════════════════════════════════════════════════════
+# MEMBERSHIP
+# ═══════════════════════════════════════════════════════════════
+
+def new_invite_code():
+    return "".join(random.SystemRandom().choice(INVITE_ALPHABET) for _ in range(INVITE_CODE_LENGTH))
+
+
+def create_household(db, user_id, name, inventory=None):
+    """
+    New household with `user_id` as its only member. `inventory`
+    ({doc_id: record}, e.g. the creator's own) seeds the shared pantry.
+    Returns the household document's data (with its "id").
+    """
+    household_id = uuid.uuid4().hex[:20]
+    household = {
+        "name": name.strip() or "Our Kitchen",
+        "invite_code": new_invite_code(),
+        "members": [user_id],
+        "created_by": user_id,
+        "created_at": firestore.SERVER_TIMESTAMP,
+    }
+    batch = db.batch()
+    batch.set(household_ref(db, household_id), household)
+    for key, record in (inventory or {}).items():
+        batch.set(pantry_ref(db, household_id).document(key), record)
+    batch.set(user_ref(db, user_id), {"household_id": household_id, "last_updated": datetime.now().isoformat()}, merge=True)
+    batch.commit()
+    return dict(household, id=household_id, created_at=None)
+
+
+def get_household(db, household_id):
+    doc = household_ref(db, household_id).get()
+    return dict(doc.to_dict(), id=doc.id) if doc.exists else None
+
+
+def join_household(db, user_id, invite_code):
+    """
+    Add `user_id` to the household with this invite code (and take them
+    out of the one they were in). Returns its data (with "id").
+    """
+    code = invite_code.strip().upper()
+    matches = list(
+        db.collection(HOUSEHOLDS_COLLECTION).where("invite_code", "==", code).limit(1).stream()
+    )
+    if not code or not matches:
+        raise HouseholdError("No household has that invite code")
+    ref = matches[0].reference
+
+    @firestore.transactional
+    def join(transaction):
+        snapshot = ref.get(transaction=transaction)
+        if not snapshot.exists:
+            raise HouseholdError("That household no longer exists")
+        household = snapshot.to_dict()
+        members = household.get("members", [])
+        user_snapshot = user_ref(db, user_id).get(field_paths=["household_id"], transaction=transaction)
+        previous = (user_snapshot.to_dict() or {}).get("household_id") if user_snapshot.exists else None
+        old_ref = household_ref(db, previous) if previous and previous != ref.id else None
+        # (every read before the first write, as transactions require)
+        if old_ref is not None and not old_ref.get(field_paths=["members"], transaction=transaction).exists:
+            old_ref = None
+        if user_id not in members:
+            if len(members) >= MAX_MEMBERS:
+                raise HouseholdError(f"That household is full ({MAX_MEMBERS} members)")
+            transaction.update(ref, {"members": firestore.ArrayUnion([user_id])})
+            members = members + [user_id]
+        if old_ref is not None:
+            # A user is in one household at a time: leave the old one
+            transaction.update(old_ref, {"members": firestore.ArrayRemove([user_id])})
+        transaction.set(user_ref(db, user_id), {
+            "household_id": ref.id, "last_updated": datetime.now().isoformat(),
+        }, merge=True)
+        return dict(household, id=ref.id, members=members)
+
+    return join(db.transaction())
+
+
+def leave_household(db, user_id, household_id):
+    """Take `user_id` out of the household; their own inventory is used again"""
+    batch = db.batch()
+    batch.update(household_ref(db, household_id), {"members": firestore.ArrayRemove([user_id])})
+    batch.set(user_ref(db, user_id), {
+        "household_id": firestore.DELETE_FIELD, "last_updated": datetime.now().isoformat(),
+    }, merge=True)
+    batch.commit()
+
+
+# ═══════════════════════════════════════════════════════════════
+# PER-ITEM CHANGES
+# ═══════════════════════════════════════════════════════════════
+
+def numeric_qty(value):
+    """The quantity as a number (None for legacy text like "1 L")"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def pantry_ops(old, new):
+    """
+    Per-item changes that turn the pantry records `old` into `new`
+    ({doc_id: record} each). Numeric quantities become deltas so they
+    combine with other members' edits instead of overwriting them:
+        ("adjust", key, fields, delta)   qty += delta (+ other changed fields)
+        ("set", key, fields, 0)          field-level merge (a text qty is set as-is)
+        ("delete", key, None, 0)
+    """
+    ops = []
+    for key, record in new.items():
+        saved = old.get(key)
+        qty = record.get("qty", 0)
+        if saved is None:
+            fields = {field: value for field, value in record.items() if field != "qty"}
+            if numeric_qty(qty) is None:
+                ops.append(("set", key, copy.deepcopy(dict(fields, qty=qty)), 0))
+            else:
+                ops.append(("adjust", key, copy.deepcopy(fields), qty))
+            continue
+        fields = diff_fields(
+            {field: value for field, value in saved.items() if field != "qty"},
+            {field: value for field, value in record.items() if field != "qty"},
+        )
+        new_qty, saved_qty = numeric_qty(record.get("qty") or 0), numeric_qty(saved.get("qty") or 0)
+        if new_qty is None or saved_qty is None:
+            if record.get("qty") != saved.get("qty"):
+                fields["qty"] = record.get("qty")
+            if fields:
+                ops.append(("set", key, fields, 0))
+            continue
+        delta = new_qty - saved_qty
+        if delta:
+            ops.append(("adjust", key, fields, delta))
+        elif fields:
+            ops.append(("set", key, fields, 0))
+    for key in old:
+        if key not in new:
+            ops.append(("delete", key, None, 0))
+    return ops
+
+
+def read_record(record):
+    """
+    A stored pantry record as the app sees it: no recent_ops, qty never
+    below zero (items written by older versions with a plain Increment)
+    """
+    record = {field: value for field, value in record.items() if field != "recent_ops"}
+    qty = numeric_qty(record.get("qty"))
+    if qty is not None and qty < 0:
+        record["qty"] = 0
+    return record
+
+
+@firestore.transactional
+def _apply_item(transaction, ref, op_id, kind, fields, delta):
+    """One pantry change to one item, inside a transaction"""
+    snapshot = ref.get(transaction=transaction)
+    data = (snapshot.to_dict() or {}) if snapshot.exists else None
+    if kind == "delete":
+        if data is not None:
+            transaction.delete(ref)
+        return
+    if kind == "clamp":
+        qty = numeric_qty((data or {}).get("qty"))
+        if qty is not None and qty < 0:
+            transaction.update(ref, {"qty": 0})
+        return
+
+    recent = list((data or {}).get("recent_ops") or [])
+    if op_id in recent:
+        return  # an earlier try committed; its response was lost
+    update = dict(fields, recent_ops=(recent + [op_id])[-RECENT_OPS:])
+    if kind == "adjust":
+        stored = numeric_qty((data or {}).get("qty")) or 0
+        update["qty"] = max(0, max(0, stored) + delta)
+    transaction.set(ref, update, merge=True)
+
+
+# ═══════════════════════════════════════════════════════════════
+# LIVE PANTRY (one listener per household, shared by sessions)
+# ═══════════════════════════════════════════════════════════════
+
+class PantryHub(ListenerHub):
+    """on_snapshot copies of household pantries, plus the per-item write path"""
+
+    listener_name = "Pantry"
+
+    def __init__(self, db, breaker=None, session_ttl=SESSION_TTL):
+        super().__init__(db, session_ttl)
+        self.breaker = breaker        # optional CircuitBreaker: hold writes while it's open
+        self._pantries = {}           # household_id -> {"records", "version", "ready": Event}
+        self._ops = deque()           # (household_id, op_id, kind, key, fields, delta), oldest first
+        self._clamping = set()        # (household_id, key) with a clamp queued
+        self._has_ops = threading.Condition(self._lock)
+        self._retry_delay = 0
+        self._worker = None
+        self.stats = {"applied": 0, "errors": 0, "last_error": None}
+
+    def _watch(self, household_id):
+        self._pantries[household_id] = {"records": {}, "version": 0, "ready": threading.Event()}
+        return pantry_ref(self.db, household_id).on_snapshot(
+            lambda docs, changes, read_time: self._on_snapshot(household_id, changes)
+        )
+
+    def _forget(self, household_id):
+        self._pantries.pop(household_id, None)
+
+    # ───────────── listener callback (runs on Firestore's thread) ─────────────
+
+    def _on_snapshot(self, household_id, changes):
+        with self._lock:
+            pantry = self._pantries.get(household_id)
+            if pantry is None:
+                return
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    pantry["records"].pop(doc.id, None)
+                    continue
+                data = doc.to_dict() or {}
+                pantry["records"][doc.id] = read_record(data)
+                qty = numeric_qty(data.get("qty"))
+                if qty is not None and qty < 0 and (household_id, doc.id) not in self._clamping:
+                    # Store the 0 the app shows, or a restock would land short
+                    self._clamping.add((household_id, doc.id))
+                    self._queue(household_id, "clamp", doc.id, None, 0)
+            pantry["version"] += 1
+            pantry["ready"].set()
+
+    # ───────────── used by the app ─────────────
+
+    def version(self, household_id):
+        """Changes whenever the pantry changed (0 until the first snapshot)"""
+        with self._lock:
+            pantry = self._pantries.get(household_id)
+            return pantry["version"] if pantry else 0
+
+    def records(self, household_id, timeout=0):
+        """(version, {doc_id: record}) - waits up to `timeout` for the first snapshot; None if not there yet"""
+        with self._lock:
+            pantry = self._pantries.get(household_id)
+        if pantry is None or not pantry["ready"].wait(timeout):
+            return None
+        with self._lock:
+            return pantry["version"], copy.deepcopy(pantry["records"])
+
+    def apply(self, household_id, ops):
+        """
+        Send pantry_ops() output. Never waits on Firestore: the worker
+        applies them in order, one transaction per item, until committed.
+        """
+        with self._lock:
+            for kind, key, fields, delta in ops:
+                self._queue(household_id, kind, key, fields, delta)
+
+    def pending_count(self, household_id=None):
+        with self._lock:
+            return sum(1 for op in self._ops if household_id in (None, op[0]))
+
+    # ───────────── write worker ─────────────
+
+    def _queue(self, household_id, kind, key, fields, delta):
+        """Called under the lock"""
+        self._ops.append((household_id, uuid.uuid4().hex, kind, key, fields, delta))
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="pantry-writes", daemon=True)
+            self._worker.start()
+        self._has_ops.notify_all()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._ops:
+                    self._has_ops.wait()
+                op = self._ops[0]
+                delay = self._retry_delay
+            if delay:
+                time.sleep(delay)
+            household_id, op_id, kind, key, fields, delta = op
+            try:
+                if self.breaker is not None and not self.breaker.allow():
+                    raise FirestoreUnavailable("circuit open")
+                ref = pantry_ref(self.db, household_id).document(key)
+                try:
+                    _apply_item(self.db.transaction(), ref, op_id, kind, fields, delta)
+                except Exception:
+                    if self.breaker is not None:
+                        self.breaker.record_failure()
+                    raise
+                if self.breaker is not None:
+                    self.breaker.record_success()
+            except Exception as e:
+                # Same op (same op id) again after a pause: it can't count twice
+                with self._lock:
+                    if not isinstance(e, FirestoreUnavailable):
+                        print(f"Pantry write failed: {str(e)}")
+                        self.stats["errors"] += 1
+                        self.stats["last_error"] = str(e)
+                    self._retry_delay = min(MAX_RETRY_DELAY, max(1, self._retry_delay * 2))
+                continue
+            with self._lock:
+                self._ops.popleft()
+                self._clamping.discard((household_id, key))
+                self._retry_delay = 0
+                self.stats["applied"] += 1
@@ -0,0 +1,107 @@
+"""
+👂 Annapurna Listener Hub
+The bookkeeping shared by the on_snapshot hubs (grocery list, household
+pantry, voice commands): one Firestore listener per key (a user or a
+household) per process, shared by the app sessions that use it.
+
+    hub.subscribe(session_id, key)   # starts the key's listener if needed
+    hub.touch(session_id)            # the session is still open
+    hub.unsubscribe(session_id)      # stops the listener once no session uses it
+
+Sessions that stop showing up for session_ttl (closed tabs) are dropped
+on the next subscribe(), and the listener with them once it's unused.
+A hub only provides _watch(key) (start the listener, return the Watch)
+and _on_snapshot for its own record shape; _forget(key) and
+_session_ended(session_id) drop whatever it keeps per key / session.
+"""
+
+import threading
+import time
+
+SESSION_TTL = 10 * 60   # seconds without subscribe()/touch() before a session is dropped
+
+
+class ListenerHub:
+    """Per-key on_snapshot listeners, reference-counted by the sessions using them"""
+
+    listener_name = "Firestore"   # for log lines
+
+    def __init__(self, db, session_ttl=SESSION_TTL):
+        self.db = db
+        self.session_ttl = session_ttl
+        self._lock = threading.RLock()
+        self._watches = {}    # key -> Watch
+        self._sessions = {}   # session_id -> key
+        self._seen = {}       # session_id -> last subscribe()/touch() time
+
+    # ───────────── hooks ─────────────
+
+    def _watch(self, key):
+        """Called under the lock for the first session of `key`: start its listener, return the Watch"""
+        raise NotImplementedError
+
+    def _forget(self, key):
+        """Called under the lock once no session uses `key`: drop its in-memory copy"""
+
+    def _session_ended(self, session_id):
+        """Called under the lock when a session unsubscribes or expires"""
+
+    # ───────────── subscriptions ─────────────
+
+    def subscribe(self, session_id, key):
+        """Make sure the key's listener runs while this session uses it"""
+        stale_watches = []
+        with self._lock:
+            now = time.time()
+            previous = self._sessions.get(session_id)
+            self._sessions[session_id] = key
+            self._seen[session_id] = now
+            if previous is not None and previous != key:
+                stale_watches.append(self._detach_if_unused(previous))
+            stale_watches.extend(self._expire_sessions(now))
+            if key not in self._watches:
+                self._watches[key] = self._watch(key)
+        for watch in stale_watches:
+            self._close(watch)
+
+    def unsubscribe(self, session_id):
+        with self._lock:
+            key = self._sessions.pop(session_id, None)
+            self._seen.pop(session_id, None)
+            self._session_ended(session_id)
+            idle_watch = self._detach_if_unused(key) if key is not None else None
+        self._close(idle_watch)
+
+    def touch(self, session_id):
+        """The session is still open (called from the app's polling fragments)"""
+        with self._lock:
+            if session_id in self._sessions:
+                self._seen[session_id] = time.time()
+
+    def _expire_sessions(self, now):
+        """Called under the lock: forget sessions idle for session_ttl; returns their watches to close"""
+        idle = [session_id for session_id, seen in self._seen.items() if now - seen > self.session_ttl]
+        watches = []
+        for session_id in idle:
+            self._seen.pop(session_id, None)
+            key = self._sessions.pop(session_id, None)
+            self._session_ended(session_id)
+            if key is not None:
+                watches.append(self._detach_if_unused(key))
+        return watches
+
+    def _detach_if_unused(self, key):
+        """Called under the lock; returns the watch to close (outside the lock)"""
+        if key in self._sessions.values():
+            return None
+        self._forget(key)
+        return self._watches.pop(key, None)
+
+    def _close(self, watch):
+        # Never under self._lock: the watch thread may be waiting on it in _on_snapshot
+        if watch is None:
+            return
+        try:
+            watch.unsubscribe()
+        except Exception as e:
+            print(f"{self.listener_name} listener unsubscribe failed: {str(e)}")
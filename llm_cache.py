@@ -0,0 +1,134 @@
+"""
+⚡ Annapurna LLM Response Cache
+Popular requests ("paneer butter masala", "quick breakfast") asked with
+the same settings get the same answer back instantly instead of another
+2-6 s generation. Only standalone requests are cached, sent without
+history or per-user pantry hints, so one user's answer fits the next:
+the key is the normalized request plus the settings that shape the
+answer (language, Jain mode, allergies, servings, model and sampling,
+and the system prompt they produce).
+
+    cache = ResponseCache(path=".annapurna_llm_cache.sqlite3")   # path=None → memory only
+    for piece in cached_stream(cache, client, messages, model=..., cache_settings={...}, temperature=...):
+        ...
+
+Memory tier: LRU with a TTL. Disk tier (optional): SQLite, shared by
+the app's processes on one machine and kept across restarts.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+LLM_CACHE_PATH = os.environ.get("ANNAPURNA_LLM_CACHE_DB", ".annapurna_llm_cache.sqlite3")
+LLM_CACHE_ENTRIES = 500          # answers kept in memory
+LLM_CACHE_TTL = 3 * 24 * 60 * 60   # seconds an answer stays valid
+REPLAY_CHUNK = 40                # characters per replayed piece (the renderer still "streams")
+
+
+def normalize_text(text):
+    """Case, spacing and trailing punctuation don't change the answer"""
+    text = " ".join(str(text).lower().split())
+    return re.sub(r"[\s.!?]+$", "", text)
+
+
+def cache_key(request, **settings):
+    """sha256 of the normalized request + the settings that shape the answer"""
+    payload = {"request": normalize_text(request), "settings": settings}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU/TTL answers in memory, optionally backed by a SQLite file"""
+
+    def __init__(self, max_entries=LLM_CACHE_ENTRIES, ttl=LLM_CACHE_TTL, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (text, stored_at), least recently used first
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evicted": 0}
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, text TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+
+    def get(self, key):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] >= cutoff:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+            self._entries.pop(key, None)
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT text, stored_at FROM responses WHERE key = ? AND stored_at >= ?", (key, cutoff)
+                ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._remember(key, row[0], row[1])
+            self.stats["disk_hits"] += 1
+            return row[0]
+
+    def put(self, key, text):
+        if not text:
+            return
+        stamp = time.time()
+        with self._lock:
+            self._remember(key, text, stamp)
+            if self._conn is not None:
+                self._conn.execute("INSERT OR REPLACE INTO responses (key, text, stored_at) VALUES (?, ?, ?)", (key, text, stamp))
+                self._conn.execute("DELETE FROM responses WHERE stored_at < ?", (stamp - self.ttl,))
+
+    def usage(self):
+        with self._lock:
+            return {"entries": len(self._entries), **self.stats}
+
+    def _remember(self, key, text, stamp):
+        """Called under the lock"""
+        self._entries[key] = (text, stamp)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+
+def cached_stream(cache, client, messages, model, cache_settings=None, **options):
+    """
+    Text pieces of the reply to `messages`. With `cache_settings` (a
+    standalone request: system prompt + one user message) it's replayed
+    from the cache on a hit and cached once complete on a miss; without,
+    it's just streamed from `client`.
+    """
+    messages = [{"role": message["role"], "content": message["content"]} for message in messages]
+    key = None
+    if cache_settings is not None:
+        system = "".join(message["content"] for message in messages if message["role"] == "system")
+        request = next((message["content"] for message in reversed(messages) if message["role"] == "user"), "")
+        key = cache_key(request, model=model, system=system, **options, **cache_settings)
+        text = cache.get(key)
+        if text is not None:
+            for start in range(0, len(text), REPLAY_CHUNK):
+                yield text[start:start + REPLAY_CHUNK]
+            return
+
+    pieces = []
+    stream = client.chat.completions.create(messages=messages, model=model, stream=True, **options)
+    for chunk in stream:
+        piece = chunk.choices[0].delta.content if chunk.choices else None
+        if piece:
+            pieces.append(piece)
+            yield piece
+    if key is not None:
+        cache.put(key, "".join(pieces))   # only reached when the stream finished
@@ -0,0 +1,129 @@
+"""
+🧠 Annapurna Chat Context
+Keeps what goes to the LLM bounded however long a chat gets:
+
+    [system + "Earlier in this chat: ..." summary] + last K turns verbatim
+
+Older turns are folded into a one-line-per-turn summary (what was asked,
+which recipe came back). Each message is summarized once and the line is
+kept in `memo`, so the summary grows incrementally instead of being
+rebuilt from scratch. Boilerplate every user turn carries (the allergy
+note - already in the system prompt - and the servings suffix) is only
+kept on the newest turn. The result fits a token budget; tokens are
+estimated from characters, no tokenizer needed.
+
+    messages = build_context(system_prompt, st.session_state.messages, memo)
+"""
+
+import hashlib
+import re
+
+CONTEXT_TURNS = 6               # latest user/assistant pairs sent verbatim
+CONTEXT_TOKEN_BUDGET = 3000     # whole request (system + summary + turns)
+SUMMARY_LINE_CHARS = 140
+CHARS_PER_TOKEN = 4
+
+ALLERGY_NOTE = re.compile(r"\s*User allergies: .*?\. Avoid these!", re.DOTALL)
+SERVINGS_NOTE = re.compile(r"\s*\(for \d+ people\)\s*$")
+RECIPE_REQUEST = re.compile(r"^Give me the complete recipe for (.+?) with all ingredients and step-by-step instructions\.", re.DOTALL)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def strip_boilerplate(text):
+    """User turn without the allergy note / servings suffix the app appends"""
+    return SERVINGS_NOTE.sub("", ALLERGY_NOTE.sub("", text)).strip()
+
+
+def _shorten(text, limit=SUMMARY_LINE_CHARS):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _recipe_title(text):
+    """First heading / bold line of an answer, else its first line"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    for line in lines[:6]:
+        if line.startswith("#") or line.startswith("**"):
+            return line.strip("#* ").rstrip(":")
+    return lines[0] if lines else ""
+
+
+def summary_line(message):
+    """One short line for a folded message"""
+    content = str(message.get("content", ""))
+    if message.get("role") == "user":
+        request = strip_boilerplate(content)
+        match = RECIPE_REQUEST.match(request)
+        return "- Asked: " + _shorten(f"recipe for {match.group(1)}" if match else request)
+    return "- You answered: " + _shorten(_recipe_title(content))
+
+
+def _digest(message):
+    return hashlib.sha1(f"{message.get('role')}\0{message.get('content')}".encode("utf-8")).hexdigest()
+
+
+def _turn_starts(messages):
+    """Indexes where a user turn begins (a turn = user message + the replies after it)"""
+    starts = [i for i, message in enumerate(messages) if message.get("role") == "user"]
+    return starts if starts and starts[0] == 0 else [0] + starts
+
+
+def build_context(system_prompt, messages, memo=None, keep_turns=CONTEXT_TURNS, budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Messages for the API: system prompt (+ summary of older turns) and the
+    latest turns verbatim, within `budget` tokens. `memo` ({digest: line},
+    e.g. kept in session state) caches summary lines between calls.
+    """
+    memo = {} if memo is None else memo
+    messages = [{"role": message["role"], "content": str(message["content"])} for message in messages]
+    if not messages:
+        return [{"role": "system", "content": system_prompt}]
+
+    starts = _turn_starts(messages)
+    first_kept = starts[max(0, len(starts) - keep_turns)]
+
+    def verbatim(start):
+        kept = messages[start:]
+        last_user = max((i for i, message in enumerate(kept) if message["role"] == "user"), default=-1)
+        return [
+            dict(message, content=strip_boilerplate(message["content"])) if message["role"] == "user" and i != last_user else message
+            for i, message in enumerate(kept)
+        ]
+
+    def summary_for(end):
+        lines = []
+        for message in messages[:end]:
+            key = _digest(message)
+            if key not in memo:
+                memo[key] = summary_line(message)
+            lines.append(memo[key])
+        return lines
+
+    def size(lines, kept):
+        text = system_prompt + "".join(lines) + "".join(message["content"] for message in kept)
+        return estimate_tokens(text) + 4 * (len(kept) + 1)
+
+    # Fold more turns into the summary until it fits (the newest turn always stays verbatim)
+    kept = verbatim(first_kept)
+    lines = summary_for(first_kept)
+    while size(lines, kept) > budget and first_kept < starts[-1]:
+        first_kept = next(start for start in starts if start > first_kept)
+        kept = verbatim(first_kept)
+        lines = summary_for(first_kept)
+
+    # Still too big → drop the oldest summary lines
+    while lines and size(lines, kept) > budget:
+        lines.pop(0)
+
+    # Forget lines for messages no longer in the session
+    live = {_digest(message) for message in messages}
+    for key in [key for key in memo if key not in live]:
+        del memo[key]
+
+    system = system_prompt
+    if lines:
+        system += "\n\nEarlier in this chat (summary):\n" + "\n".join(lines)
+    return [{"role": "system", "content": system}, *kept]
@@ -0,0 +1,288 @@
+"""
+🚦 Annapurna LLM Gateway
+Every LLM call in the app goes through here:
+
+    gateway = LLMGateway({"groq": Provider(GROQ_BASE_URL, key), "openrouter": Provider(OPENROUTER_BASE_URL, key)})
+    client = gateway.client("groq")          # drop-in: client.chat.completions.create(...)
+
+- One long-lived OpenAI-compatible client per provider, so HTTP
+  connections are pooled and reused across sessions and threads.
+- A process-wide token bucket per provider (requests and tokens), kept
+  in step with the provider's x-ratelimit-* headers: calls wait for
+  capacity instead of running into 429s.
+- 429 / 5xx / connection errors are retried with jittered exponential
+  backoff (honouring Retry-After). Streams are only retried until the
+  response starts - never halfway through.
+- A call spends at most MAX_CALL_WAIT seconds in total waiting for
+  capacity and backing off, so the script rendering it isn't held up
+  for long. When the next wait wouldn't fit, or retries run out on a
+  rate limit, LLMBusy is raised early with a message fit to show the
+  user.
+
+Point every provider at a local OpenAI-compatible server (for example
+llm_stub_server.py) with ANNAPURNA_LLM_BASE_URL to run the app offline.
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from openai import APIConnectionError, APIStatusError, APITimeoutError, OpenAI, RateLimitError
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+LLM_BASE_URL_OVERRIDE = os.environ.get("ANNAPURNA_LLM_BASE_URL")   # e.g. http://127.0.0.1:8765/v1
+
+LLM_TIMEOUT = 60          # seconds per HTTP request
+LLM_MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5        # seconds; doubles per attempt, full jitter
+BACKOFF_MAX = 20
+MAX_CALL_WAIT = 8         # seconds one call may spend waiting (capacity + backoff) before LLMBusy
+CHARS_PER_TOKEN = 4
+
+
+class LLMBusy(Exception):
+    """Rate limit still hit after every retry"""
+
+    def __init__(self, provider, retry_after=None):
+        self.provider = provider
+        self.retry_after = retry_after
+        wait = f" in about {int(retry_after) + 1} s" if retry_after else " in a few seconds"
+        super().__init__(f"Annapurna's AI is busy right now - please try again{wait}.")
+
+
+class Provider:
+    """Where a provider lives and how to reach it"""
+
+    def __init__(self, base_url, api_key):
+        self.base_url = LLM_BASE_URL_OVERRIDE or base_url
+        self.api_key = api_key
+
+
+# ═══════════════════════════════════════════════════════════════
+# RATE LIMITS
+# ═══════════════════════════════════════════════════════════════
+
+def parse_duration(value):
+    """'1m2.5s' / '350ms' / '7.66s' / '12' → seconds (None if unreadable)"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """Capacity refilled at a steady rate; corrected from the provider's headers"""
+
+    def __init__(self, capacity=None, refill_per_second=None):
+        self.capacity = capacity                  # None = unknown yet → don't throttle
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self.paused_until = 0.0
+        self._stamp = time.monotonic()
+
+    def _refill(self, now):
+        if self.capacity is not None and self.refill_per_second:
+            self.level = min(self.capacity, self.level + (now - self._stamp) * self.refill_per_second)
+        self._stamp = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` is available (0 = now)"""
+        self._refill(now)
+        pause = max(0.0, self.paused_until - now)
+        if self.capacity is None or not self.refill_per_second:
+            return pause
+        amount = min(amount, self.capacity)
+        short = amount - self.level
+        return max(pause, short / self.refill_per_second if short > 0 else 0.0)
+
+    def take(self, amount):
+        if self.capacity is not None:
+            self.level -= min(amount, self.capacity)
+
+    def update(self, limit, remaining, reset_seconds, now):
+        """limit / remaining / time-until-full as reported by the provider"""
+        if limit is None or remaining is None:
+            return
+        self._refill(now)
+        self.capacity = limit
+        self.level = min(self.level if self.level is not None else remaining, remaining)
+        if reset_seconds:
+            self.refill_per_second = max(limit - remaining, 1) / reset_seconds
+        elif self.refill_per_second is None:
+            self.refill_per_second = limit / 60.0
+
+    def pause(self, seconds, now):
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class RateLimiter:
+    """Request and token buckets for one provider, shared by every thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = TokenBucket()
+        self.tokens = TokenBucket()
+        self.stats = {"calls": 0, "waited": 0.0, "retries": 0, "rate_limited": 0, "busy": 0}
+
+    def acquire(self, estimated_tokens, max_wait=MAX_CALL_WAIT):
+        """
+        Block until a request of ~estimated_tokens fits. Returns None once
+        it's taken, or - without waiting - the seconds it would take when
+        that's more than max_wait.
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(estimated_tokens, now))
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(estimated_tokens)
+                    self.stats["calls"] += 1
+                    return None
+                if now + wait > deadline:
+                    self.stats["busy"] += 1
+                    return wait
+                self.stats["waited"] += wait
+            time.sleep(wait)
+
+    def update(self, headers):
+        if not headers:
+            return
+        def number(name):
+            try:
+                return float(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+        with self._lock:
+            now = time.monotonic()
+            self.requests.update(number("x-ratelimit-limit-requests"), number("x-ratelimit-remaining-requests"),
+                                 parse_duration(headers.get("x-ratelimit-reset-requests")), now)
+            self.tokens.update(number("x-ratelimit-limit-tokens"), number("x-ratelimit-remaining-tokens"),
+                               parse_duration(headers.get("x-ratelimit-reset-tokens")), now)
+
+    def pause(self, seconds):
+        """Provider said 429: nobody in this process calls it again before `seconds`"""
+        with self._lock:
+            now = time.monotonic()
+            self.requests.pause(seconds, now)
+            self.stats["rate_limited"] += 1
+
+    def note_retry(self):
+        with self._lock:
+            self.stats["retries"] += 1
+
+    def note_busy(self):
+        """A call gave up with LLMBusy"""
+        with self._lock:
+            self.stats["busy"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+# ═══════════════════════════════════════════════════════════════
+# GATEWAY
+# ═══════════════════════════════════════════════════════════════
+
+def estimate_tokens(kwargs):
+    """Prompt size (from characters) + the completion budget"""
+    chars = 0
+    for message in kwargs.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, list):   # vision: text parts only
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        chars += len(str(content))
+    return chars // CHARS_PER_TOKEN + int(kwargs.get("max_tokens") or 256)
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than Retry-After"""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    return max(delay, retry_after or 0)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    return parse_duration(headers.get("retry-after"))
+
+
+def _retryable(error):
+    if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+class LLMGateway:
+    """Pooled clients + rate limiting + retries for every provider"""
+
+    def __init__(self, providers, max_attempts=LLM_MAX_ATTEMPTS, max_wait=MAX_CALL_WAIT):
+        self.max_attempts = max_attempts
+        self.max_wait = max_wait
+        self._clients = {
+            name: OpenAI(api_key=provider.api_key, base_url=provider.base_url, max_retries=0, timeout=LLM_TIMEOUT)
+            for name, provider in providers.items()
+        }
+        self._limiters = {name: RateLimiter() for name in providers}
+
+    def client(self, provider):
+        """Object with .chat.completions.create(**kwargs), like the SDK clients"""
+        return _ProviderClient(self, provider)
+
+    def usage(self):
+        return {name: limiter.snapshot() for name, limiter in self._limiters.items()}
+
+    def create(self, provider, **kwargs):
+        """chat.completions.create() through the limiter, with retries, waiting max_wait at most in total"""
+        client = self._clients[provider]
+        limiter = self._limiters[provider]
+        estimated = estimate_tokens(kwargs)
+        deadline = time.monotonic() + self.max_wait
+        for attempt in range(self.max_attempts):
+            needed = limiter.acquire(estimated, max_wait=max(0.0, deadline - time.monotonic()))
+            if needed is not None:
+                raise LLMBusy(provider, needed)
+            try:
+                raw = client.chat.completions.with_raw_response.create(**kwargs)
+            except Exception as e:
+                if not _retryable(e):
+                    raise
+                retry_after = _retry_after(e)
+                if isinstance(e, RateLimitError):
+                    limiter.pause(retry_after or backoff_delay(attempt))
+                delay = backoff_delay(attempt, retry_after)
+                if attempt == self.max_attempts - 1 or time.monotonic() + delay > deadline:
+                    if isinstance(e, RateLimitError):
+                        limiter.note_busy()
+                        raise LLMBusy(provider, retry_after or delay) from e
+                    raise
+                limiter.note_retry()
+                time.sleep(delay)
+                continue
+            limiter.update(raw.headers)
+            return raw.parse()
+
+
+class _ProviderClient:
+    """gateway.client("groq").chat.completions.create(...)"""
+
+    def __init__(self, gateway, provider):
+        self.chat = self
+        self.completions = self
+        self._gateway = gateway
+        self._provider = provider
+
+    def create(self, **kwargs):
+        return self._gateway.create(self._provider, **kwargs)
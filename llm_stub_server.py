@@ -0,0 +1,183 @@
+"""
+🧪 Annapurna LLM Stub Server
+A local OpenAI-compatible /v1/chat/completions endpoint with canned,
+deterministic answers, so the whole app can run offline (and the
+gateway's throttling / retries can be exercised):
+
+    python llm_stub_server.py --port 8765 --rpm 30 --fail-rate 0.1
+    ANNAPURNA_LLM_BASE_URL=http://127.0.0.1:8765/v1 streamlit run hey_chef_chat_firebase.py
+
+Answers both plain and streamed (SSE) requests, sends Groq-style
+x-ratelimit-* headers, and replies 429 with Retry-After when the
+per-minute request limit is used up or when --fail-rate says so.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STREAM_PIECE = 24   # characters per streamed chunk
+
+
+def last_user_text(messages):
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content", "")
+            if isinstance(content, list):   # vision request
+                return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return str(content)
+    return ""
+
+
+def canned_answer(messages):
+    """Something shaped like what each call site expects"""
+    text = last_user_text(messages)
+    lowered = text.lower()
+    if "per 100 g" in lowered:   # nutrition fallback rows
+        names = [line.strip() for line in text.split("\n\n")[-1].splitlines() if line.strip()]
+        return "\n".join(f"{name} | 120 | 4 | 18 | 3 | 2" for name in names)
+    if "substitutes for" in lowered:
+        return "- **Cream** → thick curd or cashew paste\n- **Butter** → ghee or oil"
+    if "visible food ingredients" in lowered:
+        return "tomato\nonion\npaneer"
+    if "meal plan" in lowered:
+        days = "\n".join(f"Day {day}:\n- Breakfast: Poha (~300 cal, 8g protein)\n- Lunch: Dal rice (~500 cal, 18g protein)"
+                         for day in range(1, 8))
+        return days + "\n\nMissing ingredients:\npoha"
+    dish = " ".join(text.split()[:8]) or "Stub dish"
+    if any("OUTPUT FORMAT" in str(message.get("content", "")) for message in messages if message.get("role") == "system"):
+        return json.dumps({   # recipe_model's JSON schema
+            "type": "recipe", "title": dish.title(), "servings": 2,
+            "ingredients": [{"qty": "200", "unit": "g", "name": "paneer"}, {"qty": "2", "unit": "medium", "name": "onions"},
+                            {"qty": "2", "unit": "", "name": "tomatoes"}, {"qty": "1", "unit": "tbsp", "name": "oil"},
+                            {"qty": "", "unit": "", "name": "salt to taste"}],
+            "steps": [{"text": "Heat the oil.", "minutes": None}, {"text": "Cook the onions and tomatoes.", "minutes": 8},
+                      {"text": "Add the paneer and simmer.", "minutes": 5}],
+            "notes": "Enjoy! (offline stub answer)",
+        })
+    return (
+        f"## {dish.title()}\n\n**Ingredients:**\n- 200 g paneer\n- 2 medium onions\n- 2 tomatoes\n"
+        "- 1 tbsp oil\n- salt to taste\n\n**Steps:**\n1. Heat the oil.\n2. Cook the onions and tomatoes.\n"
+        "3. Add the paneer and simmer for 5 minutes.\n\nEnjoy! (offline stub answer)"
+    )
+
+
+class StubState:
+    """Per-minute request window shared by every handler thread"""
+
+    def __init__(self, rpm, tpm, fail_rate):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+        self.window_start = time.time()
+        self.used = 0
+
+    def take(self):
+        """(allowed, remaining, seconds until the window resets)"""
+        with self.lock:
+            now = time.time()
+            if now - self.window_start >= 60:
+                self.window_start, self.used = now, 0
+            reset = 60 - (now - self.window_start)
+            if self.used >= self.rpm or random.random() < self.fail_rate:
+                return False, max(0, self.rpm - self.used), reset
+            self.used += 1
+            return True, self.rpm - self.used, reset
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _limit_headers(self, remaining, reset):
+            self.send_header("x-ratelimit-limit-requests", str(state.rpm))
+            self.send_header("x-ratelimit-remaining-requests", str(remaining))
+            self.send_header("x-ratelimit-reset-requests", f"{reset:.2f}s")
+            self.send_header("x-ratelimit-limit-tokens", str(state.tpm))
+            self.send_header("x-ratelimit-remaining-tokens", str(state.tpm))
+            self.send_header("x-ratelimit-reset-tokens", "0s")
+
+        def _json(self, status, body, remaining, reset, extra=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self._limit_headers(remaining, reset)
+            for name, value in (extra or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._json(404, {"error": {"message": "not found"}}, state.rpm, 60)
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            allowed, remaining, reset = state.take()
+            if not allowed:
+                self._json(429, {"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_exceeded"}},
+                           remaining, reset, {"retry-after": f"{min(reset, 2):.0f}"})
+                return
+
+            answer = canned_answer(request.get("messages", []))
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = request.get("model", "stub")
+            created = int(time.time())
+            if not request.get("stream"):
+                self._json(200, {
+                    "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(answer) // 4, "total_tokens": len(answer) // 4},
+                }, remaining, reset)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self._limit_headers(remaining, reset)
+            self.end_headers()
+            pieces = [answer[i:i + STREAM_PIECE] for i in range(0, len(answer), STREAM_PIECE)]
+            for index, piece in enumerate(pieces + [None]):
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece} if piece is not None else {},
+                                 "finish_reason": None if piece is not None else "stop"}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(0.01)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible stub for Annapurna")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rpm", type=int, default=30, help="requests per minute before 429s")
+    parser.add_argument("--tpm", type=int, default=6000, help="tokens per minute reported in headers")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(StubState(args.rpm, args.tpm, args.fail_rate)))
+    print(f"🧪 LLM stub listening on http://{args.host}:{args.port}/v1 (rpm={args.rpm}, fail-rate={args.fail_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stub stopped")
+
+
+if __name__ == "__main__":
+    main()
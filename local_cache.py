@@ -0,0 +1,433 @@
+"""
+💾 Annapurna Local Cache (offline-first)
+Keeps a SQLite copy of every signed-in user's records on local disk.
+The app reads and writes this copy synchronously, so login and saves
+never wait on Firestore. A background SyncEngine reconciles it with
+Firestore:
+
+    push  rows changed locally (dirty) → minimal merge writes through the
+          write-behind queue; marked clean once the queue has committed
+          that user's writes (checked on later rounds, never waited for)
+    pull  only when users/{uid}.last_updated is newer than what we last
+          saw; rows with unpushed local edits are left alone
+
+Only users with a live session are synced: a user leaves the engine on
+sign-out (unwatch) or after USER_TTL without activity, once nothing of
+theirs is left to push.
+
+Each row holds the latest local value and the last value known to be in
+Firestore ("synced"), so pushes send just the fields that differ.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from user_data_store import SUBCOLLECTIONS, LEGACY_FIELDS, apply_migration, apply_writes, load_user_records, record_writes
+
+LOCAL_CACHE_PATH = os.environ.get("ANNAPURNA_CACHE_DB", ".annapurna_cache.sqlite3")
+ROOT = ""                # collection name used for the users/{uid} document itself
+PUSH_INTERVAL = 2        # seconds between pushes of dirty rows
+PULL_INTERVAL = 60       # seconds between last_updated checks per user
+USER_TTL = 30 * 60       # seconds without activity before a user stops being synced
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    user_id     TEXT NOT NULL,
+    collection  TEXT NOT NULL,
+    doc_id      TEXT NOT NULL,
+    data        TEXT,               -- latest local value (JSON), NULL when deleted
+    synced      TEXT,               -- last value known to be in Firestore (JSON)
+    dirty       INTEGER NOT NULL DEFAULT 0,
+    updated_at  REAL NOT NULL,
+    PRIMARY KEY (user_id, collection, doc_id)
+);
+CREATE INDEX IF NOT EXISTS records_dirty ON records (user_id, dirty);
+CREATE TABLE IF NOT EXISTS sync_state (
+    user_id      TEXT PRIMARY KEY,
+    last_pulled  TEXT,              -- users/{uid}.last_updated we last pulled or pushed
+    version      INTEGER NOT NULL DEFAULT 0   -- bumped whenever a pull changed rows
+);
+"""
+
+
+def _dumps(value):
+    return None if value is None else json.dumps(value, sort_keys=True, default=str)
+
+
+def _loads(text):
+    return None if text is None else json.loads(text)
+
+
+def _root_fields(root_data):
+    """What we keep of users/{uid} locally (old inline maps are dropped)"""
+    return {key: value for key, value in (root_data or {}).items() if key not in LEGACY_FIELDS}
+
+
+class LocalCache:
+    """SQLite mirror of users/{uid} and its subcollections"""
+
+    def __init__(self, path=LOCAL_CACHE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    # ───────────── reads (used on login) ─────────────
+
+    def load(self, user_id):
+        """
+        Returns (root_data, records) shaped like load_user_records(),
+        or None if this user has never been cached here.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT collection, doc_id, data FROM records WHERE user_id = ? AND data IS NOT NULL",
+                (user_id,),
+            ).fetchall()
+
+        root_data = None
+        records = {collection: {} for collection in SUBCOLLECTIONS}
+        for collection, key, data in rows:
+            if collection == ROOT:
+                root_data = _loads(data)
+            elif collection in records:
+                records[collection][key] = _loads(data)
+
+        if root_data is None:
+            return None
+        records["root"] = {}
+        return root_data, records
+
+    def version(self, user_id):
+        """Changes every time a pull brings in remote edits"""
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM sync_state WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def last_pulled(self, user_id):
+        with self._lock:
+            row = self._conn.execute("SELECT last_pulled FROM sync_state WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    # ───────────── local writes (used by the app) ─────────────
+
+    def store_writes(self, user_id, records, writes):
+        """
+        Apply the app's writes (from ChangeTracker.collect_writes) locally.
+        Rows are stored whole, from `records` (build_records of the session),
+        and marked dirty for the sync engine.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            for kind, path, _ in writes:
+                if not path:
+                    root = _loads(self._get(user_id, ROOT, "", "data")) or {}
+                    root.update(records["root"])
+                    self._upsert_local(user_id, ROOT, "", root, now)
+                elif kind == "delete":
+                    self._upsert_local(user_id, path[0], path[1], None, now)
+                else:
+                    self._upsert_local(user_id, path[0], path[1], records[path[0]][path[1]], now)
+
+    def merge_root(self, user_id, fields):
+        """Fields already written to Firestore elsewhere (e.g. preferences)"""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            data = _loads(self._get(user_id, ROOT, "", "data")) or {}
+            synced = _loads(self._get(user_id, ROOT, "", "synced")) or {}
+            data.update(fields)
+            synced.update(fields)
+            self._conn.execute(
+                "INSERT INTO records (user_id, collection, doc_id, data, synced, dirty, updated_at) "
+                "VALUES (?, ?, '', ?, ?, 0, ?) "
+                "ON CONFLICT (user_id, collection, doc_id) DO UPDATE SET data = excluded.data, synced = excluded.synced",
+                (user_id, ROOT, _dumps(data), _dumps(synced), time.time()),
+            )
+
+    def _get(self, user_id, collection, key, column):
+        row = self._conn.execute(
+            f"SELECT {column} FROM records WHERE user_id = ? AND collection = ? AND doc_id = ?",
+            (user_id, collection, key),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _upsert_local(self, user_id, collection, key, value, now):
+        self._conn.execute(
+            "INSERT INTO records (user_id, collection, doc_id, data, dirty, updated_at) VALUES (?, ?, ?, ?, 1, ?) "
+            "ON CONFLICT (user_id, collection, doc_id) DO UPDATE SET data = excluded.data, dirty = 1, updated_at = excluded.updated_at",
+            (user_id, collection, key, _dumps(value), now),
+        )
+
+    # ───────────── sync engine side ─────────────
+
+    def dirty_rows(self, user_id):
+        """[(collection, doc_id, data, synced, updated_at)] waiting to be pushed"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT collection, doc_id, data, synced, updated_at FROM records WHERE user_id = ? AND dirty = 1",
+                (user_id,),
+            ).fetchall()
+        return [(c, k, _loads(d), _loads(s), u) for c, k, d, s, u in rows]
+
+    def mark_synced(self, user_id, rows):
+        """Pushed rows are clean again - unless they were edited while the push was in flight"""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            for collection, key, data, _, updated_at in rows:
+                if data is None:
+                    self._conn.execute(
+                        "DELETE FROM records WHERE user_id = ? AND collection = ? AND doc_id = ? AND updated_at = ?",
+                        (user_id, collection, key, updated_at),
+                    )
+                else:
+                    self._conn.execute(
+                        "UPDATE records SET synced = data, dirty = 0 "
+                        "WHERE user_id = ? AND collection = ? AND doc_id = ? AND updated_at = ?",
+                        (user_id, collection, key, updated_at),
+                    )
+
+    def set_last_pulled(self, user_id, stamp, bump=False):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sync_state (user_id, last_pulled, version) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET last_pulled = excluded.last_pulled, "
+                "version = sync_state.version + ?",
+                (user_id, stamp, int(bump), int(bump)),
+            )
+
+    def merge_remote(self, user_id, root_data, records, collections=None):
+        """
+        Take Firestore's copy for every row without unpushed local edits.
+        `collections` limits the merge to what was actually fetched; with it,
+        root_data may be partial (field mask) or None.
+        Returns True if anything local changed.
+        """
+        scope = SUBCOLLECTIONS if collections is None else collections
+        remote = {}
+        for collection in scope:
+            for key, record in records.get(collection, {}).items():
+                remote[(collection, key)] = record
+
+        changed = False
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            if root_data is not None:
+                root = _root_fields(root_data)
+                if collections is not None:
+                    # Only some fields were read; keep the ones we already had
+                    root = _root_fields(dict(_loads(self._get(user_id, ROOT, "", "synced")) or {}, **root))
+                remote[(ROOT, "")] = root
+            local = {
+                (c, k): (d, dirty)
+                for c, k, d, dirty in self._conn.execute(
+                    "SELECT collection, doc_id, data, dirty FROM records WHERE user_id = ?", (user_id,)
+                )
+            }
+            for path, value in remote.items():
+                data, dirty = local.get(path, (None, 0))
+                text = _dumps(value)
+                if dirty:
+                    # Our edit wins; remember what Firestore has so the push diff is right
+                    if path[0] == ROOT and data is not None:
+                        # ...but the app doesn't edit the user document itself: take it from Firestore
+                        changed = changed or text != data
+                        data = text
+                    self._conn.execute(
+                        "UPDATE records SET data = ?, synced = ? WHERE user_id = ? AND collection = ? AND doc_id = ?",
+                        (data, text, user_id, path[0], path[1]),
+                    )
+                elif data != text:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO records (user_id, collection, doc_id, data, synced, dirty, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, 0, ?)",
+                        (user_id, path[0], path[1], text, text, now),
+                    )
+                    changed = True
+            for path, (data, dirty) in local.items():
+                if path[0] in scope and path not in remote and not dirty:
+                    self._conn.execute(
+                        "DELETE FROM records WHERE user_id = ? AND collection = ? AND doc_id = ?",
+                        (user_id, path[0], path[1]),
+                    )
+                    changed = True
+        return changed
+
+
+class SyncEngine:
+    """Background reconciliation between LocalCache and Firestore"""
+
+    def __init__(self, db, cache, writer, breaker=None,
+                 push_interval=PUSH_INTERVAL, pull_interval=PULL_INTERVAL):
+        self.db = db
+        self.cache = cache
+        self.writer = writer          # WriteBehindQueue
+        self.breaker = breaker
+        self.push_interval = push_interval
+        self.pull_interval = pull_interval
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._users = {}              # user_id -> {"next_pull", "seen", "leaving"}
+        self._pushes = {}             # user_id -> (rows, stamp) queued in the writer, not yet committed
+        self._thread = None
+        self.stats = {"pushed": 0, "pulls": 0, "checks": 0, "last_error": None}
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="local-cache-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def watch(self, user_id, pull_now=True):
+        """Keep this user in sync (pull_now: check Firestore for newer data right away)"""
+        now = time.time()
+        with self._lock:
+            entry = self._users.setdefault(user_id, {"next_pull": now + self.pull_interval})
+            if pull_now:
+                entry["next_pull"] = 0
+            entry["seen"] = now
+            entry["leaving"] = False
+        self._wake.set()
+
+    def notify(self, user_id):
+        """Local rows changed → push soon"""
+        self.watch(user_id, pull_now=False)
+
+    def touch(self, user_id):
+        """The user's session is still open (cheap: doesn't wake the sync thread)"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                entry["seen"] = time.time()
+                return
+        self.watch(user_id)  # dropped while idle: pick them up again
+
+    def unwatch(self, user_id):
+        """Signed out: push what's left, then stop syncing this user"""
+        with self._lock:
+            if user_id in self._users:
+                self._users[user_id]["leaving"] = True
+        self._wake.set()
+
+    def pending(self, user_id):
+        return len(self.cache.dirty_rows(user_id))
+
+    # ───────────── push / pull ─────────────
+
+    def push(self, user_id):
+        """Queue dirty rows as minimal merge writes (doesn't wait for them). Returns how many were queued."""
+        if not self._settle(user_id):
+            return 0  # the previous push is still on its way
+        rows = self.cache.dirty_rows(user_id)
+        if not rows:
+            return 0
+
+        writes = []
+        for collection, key, data, synced, _ in rows:
+            path = () if collection == ROOT else (collection, key)
+            if data is None:
+                if path:
+                    writes.append(("delete", path, None))
+            else:
+                writes += record_writes("root" if collection == ROOT else collection, path, synced, data)
+
+        stamp = datetime.now().isoformat()
+        apply_writes(self.db, self.writer, user_id, writes, stamp=stamp)
+        self._pushes[user_id] = (rows, stamp)
+        self._settle(user_id)
+        self.stats["pushed"] += len(rows)
+        return len(rows)
+
+    def _settle(self, user_id):
+        """Rows of a committed push are clean again. False while the writer still has this user's writes."""
+        pushed = self._pushes.get(user_id)
+        if pushed is None:
+            return True
+        if self.writer.pending_count(prefix=f"users/{user_id}"):
+            return False
+        del self._pushes[user_id]
+        rows, stamp = pushed
+        self.cache.mark_synced(user_id, rows)
+        # Our own write moved last_updated - don't pull it back
+        if (self.cache.last_pulled(user_id) or "") < stamp:
+            self.cache.set_last_pulled(user_id, stamp)
+        return True
+
+    def pull(self, user_id):
+        """Fetch the user's records if Firestore has something newer. Returns True if local rows changed."""
+        self.stats["checks"] += 1
+        snapshot = self.db.collection("users").document(user_id).get(field_paths=["last_updated"], timeout=10)
+        remote_stamp = (snapshot.to_dict() or {}).get("last_updated") if snapshot.exists else None
+        if not remote_stamp or remote_stamp <= (self.cache.last_pulled(user_id) or ""):
+            return False
+
+        root_data, records, migration = load_user_records(self.db, user_id)
+        if root_data is None:
+            return False
+        if migration:
+            apply_migration(self.db, self.writer, user_id, migration)  # queued; records already include the moved values
+        changed = self.cache.merge_remote(user_id, root_data, records)
+        self.cache.set_last_pulled(user_id, remote_stamp, bump=changed)
+        self.stats["pulls"] += 1
+        return changed
+
+    def _tracked_pull(self, user_id):
+        """pull(), with its outcome fed to the circuit breaker"""
+        if self.breaker is None:
+            return self.pull(user_id)
+        if not self.breaker.allow():
+            return False
+        try:
+            changed = self.pull(user_id)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return changed
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.push_interval)
+            self._wake.clear()
+            if self.breaker is not None and not self.breaker.would_allow():
+                continue  # read-only check: the half-open trial is left for a real call
+
+            with self._lock:
+                now = time.time()
+                users = list(self._users)
+                due = [uid for uid, entry in self._users.items() if entry["next_pull"] <= now and not entry["leaving"]]
+                for uid in due:
+                    self._users[uid]["next_pull"] = now + self.pull_interval
+
+            for user_id in users:
+                try:
+                    self.push(user_id)
+                    if user_id in due:
+                        self._tracked_pull(user_id)
+                except Exception as e:
+                    self.stats["last_error"] = str(e)
+                    print(f"Local cache sync failed for {user_id}: {str(e)}")
+            self._drop_idle()
+
+    def _drop_idle(self):
+        """Stop syncing users who signed out or went idle, once nothing of theirs is waiting to go up"""
+        cutoff = time.time() - USER_TTL
+        with self._lock:
+            candidates = [
+                uid for uid, entry in self._users.items()
+                if (entry["leaving"] or entry["seen"] < cutoff) and uid not in self._pushes
+            ]
+        for user_id in candidates:
+            if self.cache.dirty_rows(user_id):
+                continue
+            with self._lock:
+                entry = self._users.get(user_id)
+                if entry is not None and (entry["leaving"] or entry["seen"] < cutoff):
+                    del self._users[user_id]
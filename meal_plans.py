@@ -0,0 +1,76 @@
+"""
+📅 Annapurna Meal Plans
+One document per planned day, so the app can read just the days it
+shows ("next 7 days", "this month") instead of a user's whole history:
+
+    users/{uid}/meal_plans/{YYYY-MM-DD}   date, meals: {meal: dish}
+
+`date` is the same ISO string as the document id; ISO dates sort
+correctly as strings, so a date range is a plain >= / <= query on it.
+Edits are merged per meal, so saving Lunch never touches Dinner.
+"""
+
+import calendar
+from datetime import timedelta
+from firebase_admin import firestore
+from expiry import to_date
+from user_data_store import diff_fields, user_ref
+
+MEAL_PLANS_COLLECTION = "meal_plans"
+WINDOW_DAYS = 7            # "next 7 days"
+MAX_SESSION_DAYS = 93      # days kept in session memory (about three months)
+
+
+def meal_plans_ref(db, user_id):
+    return user_ref(db, user_id).collection(MEAL_PLANS_COLLECTION)
+
+
+def day_key(value):
+    """date / datetime / ISO string → 'YYYY-MM-DD'"""
+    return to_date(value).isoformat()
+
+
+def days_window(start, days=WINDOW_DAYS):
+    """(first, last) day keys of `days` days from `start`, inclusive"""
+    start = to_date(start)
+    return start.isoformat(), (start + timedelta(days=days - 1)).isoformat()
+
+
+def month_window(day):
+    """(first, last) day keys of the month `day` is in"""
+    day = to_date(day)
+    last = calendar.monthrange(day.year, day.month)[1]
+    return day.replace(day=1).isoformat(), day.replace(day=last).isoformat()
+
+
+def load_range(db, user_id, first, last, timeout=10):
+    """{day: {meal: dish}} for first..last (inclusive) - only those documents are read"""
+    query = meal_plans_ref(db, user_id).where("date", ">=", first).where("date", "<=", last)
+    return {doc.id: (doc.to_dict() or {}).get("meals", {}) for doc in query.stream(timeout=timeout)}
+
+
+def plan_writes(saved, current):
+    """
+    Per-day merge writes that turn the saved plan into `current`
+    ({day: {meal: dish}} each): [(day, data or None to delete)]
+    """
+    writes = []
+    for day, meals in current.items():
+        changes = diff_fields(saved.get(day, {}), meals)
+        if changes:
+            writes.append((day, {"date": day, "meals": changes}))
+    for day in saved:
+        if day not in current:
+            writes.append((day, None))
+    return writes
+
+
+def apply_plan_writes(db, writer, user_id, writes):
+    """Send plan_writes() output through `writer` (e.g. the write-behind queue)"""
+    plans = meal_plans_ref(db, user_id)
+    for day, data in writes:
+        if data is None:
+            writer.delete(plans.document(day))
+        else:
+            writer.set(plans.document(day), dict(data, updated_at=firestore.SERVER_TIMESTAMP), merge=True)
+    return len(writes)
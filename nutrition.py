@@ -0,0 +1,364 @@
+"""
+🥗 Annapurna Nutrition Engine
+Per-serving calories / protein / carbs / fat / fiber worked out locally
+from a recipe's parsed ingredients - same recipe, same numbers, no API
+call. Values are per 100 g (approximate IFCT / USDA figures for common
+Indian home ingredients). Every name in the app's ingredient categories
+(FOOD_INGREDIENTS_SET) is a row or an alias of one - `unknown(names)`
+lists any that aren't - so "chicken stock" is stock, not chicken.
+
+    engine = NutritionEngine()
+    result = engine.compute(extract_ingredients(recipe), servings=2)
+    result["per_serving"]   # {"calories": ..., "protein": ..., ...}
+    result["unresolved"]    # names not in the table → ask the LLM once:
+    engine.learn(parse_fallback(llm_reply))
+
+Ingredients the LLM resolved are remembered for the life of the process,
+under a normalized name ("Finely Chopped Thyme Sprigs" → "thyme sprig").
+"""
+
+import re
+import threading
+import numpy as np
+
+NUTRIENTS = ["calories", "protein", "carbs", "fat", "fiber"]
+NUTRIENT_UNITS = {"calories": "kcal", "protein": "g", "carbs": "g", "fat": "g", "fiber": "g"}
+
+# ═══════════════════════════════════════════════════════════════
+# PER-100 g TABLE: kcal, protein, carbs, fat, fiber
+# ═══════════════════════════════════════════════════════════════
+
+NUTRITION_TABLE = {
+    # Vegetables
+    "onion": (40, 1.1, 9.3, 0.1, 1.7), "tomato": (18, 0.9, 3.9, 0.2, 1.2),
+    "potato": (77, 2.0, 17.0, 0.1, 2.2), "garlic": (149, 6.4, 33.0, 0.5, 2.1),
+    "ginger": (80, 1.8, 18.0, 0.8, 2.0), "carrot": (41, 0.9, 9.6, 0.2, 2.8),
+    "beetroot": (43, 1.6, 9.6, 0.2, 2.8), "capsicum": (26, 1.0, 6.0, 0.3, 2.1),
+    "cabbage": (25, 1.3, 5.8, 0.1, 2.5), "cauliflower": (25, 1.9, 5.0, 0.3, 2.0),
+    "broccoli": (34, 2.8, 6.6, 0.4, 2.6), "spinach": (23, 2.9, 3.6, 0.4, 2.2),
+    "methi": (49, 4.4, 6.0, 0.9, 1.1), "coriander": (23, 2.1, 3.7, 0.5, 2.8),
+    "coriander powder": (298, 12.4, 55.0, 17.8, 41.9),
+    "curry leaves": (108, 6.1, 18.7, 1.0, 6.4), "mint": (44, 3.3, 8.4, 0.7, 6.8),
+    "beans": (31, 1.8, 7.0, 0.2, 2.7), "peas": (81, 5.4, 14.5, 0.4, 5.7),
+    "corn": (86, 3.3, 19.0, 1.4, 2.7), "cucumber": (15, 0.7, 3.6, 0.1, 0.5),
+    "radish": (16, 0.7, 3.4, 0.1, 1.6), "turnip": (28, 0.9, 6.4, 0.1, 1.8),
+    "pumpkin": (26, 1.0, 6.5, 0.1, 0.5), "bottle gourd": (14, 0.6, 3.4, 0.0, 0.5),
+    "bitter gourd": (17, 1.0, 3.7, 0.2, 2.8), "ridge gourd": (20, 1.2, 4.4, 0.2, 1.1),
+    "eggplant": (25, 1.0, 5.9, 0.2, 3.0), "okra": (33, 1.9, 7.5, 0.2, 3.2),
+    "mushroom": (22, 3.1, 3.3, 0.3, 1.0), "zucchini": (17, 1.2, 3.1, 0.3, 1.0),
+    "lettuce": (15, 1.4, 2.9, 0.2, 1.3), "celery": (16, 0.7, 3.0, 0.2, 1.6),
+    "spring onion": (32, 1.8, 7.3, 0.2, 2.6), "leek": (61, 1.5, 14.0, 0.3, 1.8),
+    "sweet potato": (86, 1.6, 20.0, 0.1, 3.0), "yam": (118, 1.5, 28.0, 0.2, 4.1),
+    "colocasia": (112, 1.5, 26.5, 0.2, 4.1),
+    # Spices (small amounts, but they add up in masala-heavy dishes)
+    "turmeric": (312, 9.7, 67.0, 3.3, 22.7), "cumin": (375, 17.8, 44.0, 22.0, 10.5),
+    "chilli": (282, 13.5, 50.0, 14.3, 34.8), "green chilli": (40, 2.0, 9.5, 0.2, 1.5),
+    "black pepper": (251, 10.4, 64.0, 3.3, 25.3), "cardamom": (311, 10.8, 68.0, 6.7, 28.0),
+    "cinnamon": (247, 4.0, 81.0, 1.2, 53.1), "clove": (274, 6.0, 66.0, 13.0, 33.9),
+    "bay leaf": (313, 7.6, 75.0, 8.4, 26.3), "fennel": (345, 15.8, 52.0, 14.9, 39.8),
+    "mustard": (508, 26.1, 28.0, 36.2, 12.2), "asafoetida": (297, 4.0, 68.0, 1.1, 4.1),
+    "ajwain": (305, 16.0, 43.0, 25.0, 39.0), "sesame": (573, 17.7, 23.0, 49.7, 11.8),
+    "poppy seeds": (525, 18.0, 28.0, 41.6, 19.5), "garam masala": (379, 14.0, 50.0, 15.0, 26.0),
+    "chaat masala": (250, 10.0, 45.0, 5.0, 15.0), "amchur": (319, 2.0, 75.0, 1.0, 12.0),
+    "saffron": (310, 11.4, 65.0, 5.9, 3.9), "paprika": (282, 14.1, 54.0, 12.9, 34.9),
+    "oregano": (265, 9.0, 69.0, 4.3, 42.5), "basil": (23, 3.2, 2.7, 0.6, 1.6),
+    "nutmeg": (525, 5.8, 49.0, 36.3, 20.8), "star anise": (337, 17.6, 50.0, 15.9, 14.6),
+    "white pepper": (296, 10.4, 69.0, 2.1, 26.2), "mace": (475, 6.7, 50.5, 32.4, 20.2),
+    "nigella": (345, 16.0, 52.0, 22.0, 10.5), "curry powder": (325, 14.3, 58.0, 14.0, 33.2),
+    "ginger powder": (335, 9.0, 72.0, 4.2, 14.1), "garlic powder": (331, 16.6, 73.0, 0.7, 9.0),
+    "anardana": (330, 5.0, 75.0, 3.0, 10.0), "vanilla": (288, 0.1, 12.7, 0.1, 0.0),
+    "thyme": (101, 5.6, 24.0, 1.7, 14.0), "rosemary": (131, 3.3, 20.7, 5.9, 14.1),
+    # Grains, pulses, nuts
+    "rice": (360, 7.1, 79.0, 0.7, 1.3), "brown rice": (367, 7.5, 76.0, 2.7, 3.4),
+    "atta": (340, 13.2, 72.0, 2.5, 10.7), "maida": (364, 10.3, 76.0, 1.0, 2.7),
+    "flour": (364, 10.3, 76.0, 1.0, 2.7), "semolina": (360, 12.7, 73.0, 1.1, 3.9),
+    "besan": (387, 22.4, 58.0, 6.7, 10.8), "corn flour": (381, 0.3, 91.0, 0.1, 0.9),
+    "rice flour": (366, 6.0, 80.0, 1.4, 2.4), "ragi": (328, 7.3, 72.0, 1.3, 11.5),
+    "jowar": (329, 10.6, 72.0, 1.9, 9.7), "bajra": (361, 11.6, 67.0, 5.0, 11.3),
+    "oats": (389, 16.9, 66.0, 6.9, 10.6), "quinoa": (368, 14.1, 64.0, 6.1, 7.0),
+    "moong dal": (348, 24.5, 60.0, 1.2, 8.2), "toor dal": (343, 22.3, 62.8, 1.7, 15.0),
+    "chana dal": (360, 20.8, 60.0, 5.6, 12.0), "masoor dal": (353, 24.6, 60.0, 1.1, 10.7),
+    "urad dal": (341, 25.2, 59.0, 1.6, 18.3), "dal": (345, 23.0, 60.0, 1.5, 11.0),
+    "lentil": (353, 24.6, 60.0, 1.1, 10.7), "chickpea": (364, 19.3, 61.0, 6.0, 17.4),
+    "kala chana": (360, 20.0, 61.0, 5.0, 18.0), "rajma": (333, 23.6, 60.0, 0.8, 15.2),
+    "black beans": (341, 21.6, 62.0, 1.4, 15.5), "soybean": (446, 36.5, 30.0, 19.9, 9.3),
+    "peanut": (567, 25.8, 16.0, 49.2, 8.5), "almond": (579, 21.2, 22.0, 49.9, 12.5),
+    "cashew": (553, 18.2, 30.0, 43.9, 3.3), "walnut": (654, 15.2, 14.0, 65.2, 6.7),
+    "pistachio": (560, 20.2, 28.0, 45.3, 10.6), "raisin": (299, 3.1, 79.0, 0.5, 3.7),
+    "dates": (282, 2.5, 75.0, 0.4, 8.0), "coconut": (354, 3.3, 15.0, 33.5, 9.0),
+    "white beans": (333, 23.4, 60.0, 0.9, 15.2), "pinto beans": (347, 21.4, 62.6, 1.2, 15.5),
+    "poha": (346, 6.6, 77.0, 1.2, 0.7),
+    # Dairy
+    "milk": (62, 3.2, 4.8, 3.3, 0.0), "cream": (340, 2.1, 2.8, 36.0, 0.0),
+    "butter": (717, 0.9, 0.1, 81.1, 0.0), "ghee": (900, 0.0, 0.0, 99.8, 0.0),
+    "paneer": (265, 18.3, 1.2, 20.8, 0.0), "cheese": (402, 24.9, 1.3, 33.1, 0.0),
+    "mozzarella": (280, 27.5, 3.1, 17.1, 0.0), "cream cheese": (342, 5.9, 4.1, 34.2, 0.0),
+    "curd": (61, 3.5, 4.7, 3.3, 0.0), "buttermilk": (40, 3.3, 4.8, 0.9, 0.0),
+    "khoya": (421, 14.6, 20.5, 31.2, 0.0), "condensed milk": (321, 7.9, 54.4, 8.7, 0.0),
+    "milk powder": (496, 26.3, 38.4, 26.7, 0.0), "evaporated milk": (134, 6.8, 10.0, 7.6, 0.0),
+    # Proteins
+    "chicken": (165, 31.0, 0.0, 3.6, 0.0), "mutton": (294, 25.6, 0.0, 20.9, 0.0),
+    "beef": (250, 26.0, 0.0, 15.0, 0.0), "pork": (242, 27.3, 0.0, 13.9, 0.0),
+    "fish": (128, 22.0, 0.0, 4.5, 0.0), "prawn": (99, 24.0, 0.2, 0.3, 0.0),
+    "crab": (97, 19.4, 0.0, 1.5, 0.0), "salmon": (208, 20.4, 0.0, 13.4, 0.0),
+    "tuna": (132, 28.2, 0.0, 1.3, 0.0), "egg": (155, 12.6, 1.1, 10.6, 0.0),
+    "tofu": (144, 17.3, 2.8, 8.7, 2.3), "soya chunks": (345, 52.0, 33.0, 0.5, 13.0),
+    "tempeh": (192, 20.3, 7.6, 10.8, 0.0),
+    # Oils & fats
+    "oil": (884, 0.0, 0.0, 100.0, 0.0), "margarine": (717, 0.2, 0.7, 80.7, 0.0),
+    "lard": (902, 0.0, 0.0, 100.0, 0.0),
+    # Sweeteners
+    "sugar": (387, 0.0, 100.0, 0.0, 0.0), "jaggery": (383, 0.4, 98.0, 0.1, 0.0),
+    "brown sugar": (380, 0.1, 98.0, 0.0, 0.0), "honey": (304, 0.3, 82.0, 0.0, 0.2),
+    "maple syrup": (260, 0.0, 67.0, 0.1, 0.0), "corn syrup": (286, 0.0, 77.6, 0.2, 0.0),
+    "date syrup": (300, 1.0, 75.0, 0.1, 1.0), "stevia": (0, 0.0, 0.0, 0.0, 0.0),
+    # Sauces, condiments, fruit
+    "ketchup": (112, 1.7, 26.0, 0.1, 0.3), "tomato puree": (38, 1.7, 9.0, 0.2, 1.9),
+    "tomato paste": (82, 4.3, 19.0, 0.5, 4.1), "soy sauce": (53, 8.1, 4.9, 0.6, 0.8),
+    "vinegar": (18, 0.0, 0.0, 0.0, 0.0), "tamarind": (239, 2.8, 62.5, 0.6, 5.1),
+    "lemon": (29, 1.1, 9.3, 0.3, 2.8), "orange": (47, 0.9, 11.8, 0.1, 2.4),
+    "pomegranate": (83, 1.7, 18.7, 1.2, 4.0), "mayonnaise": (680, 1.0, 0.6, 75.0, 0.0),
+    "pickle": (200, 2.0, 10.0, 17.0, 3.0), "chutney": (120, 2.0, 20.0, 4.0, 2.5),
+    "chilli sauce": (100, 1.5, 22.0, 0.5, 1.5), "hot sauce": (11, 0.5, 1.8, 0.4, 0.3),
+    "worcestershire sauce": (78, 0.0, 19.5, 0.0, 0.0), "fish sauce": (35, 5.1, 3.6, 0.0, 0.0),
+    "oyster sauce": (51, 1.4, 11.0, 0.3, 0.3), "hoisin sauce": (220, 3.3, 44.1, 3.4, 2.8),
+    "mustard sauce": (66, 4.4, 5.8, 4.0, 3.3),
+    # Breads & pasta
+    "bread": (265, 9.0, 49.0, 3.2, 2.7), "pav": (280, 8.5, 52.0, 4.0, 2.2),
+    "roti": (297, 9.8, 55.0, 3.7, 9.7), "naan": (310, 9.0, 54.0, 6.0, 2.2),
+    "paratha": (326, 6.4, 45.0, 13.0, 5.0), "pasta": (371, 13.0, 75.0, 1.5, 3.2),
+    "noodles": (384, 14.2, 71.0, 4.4, 3.3), "vermicelli": (352, 8.0, 78.0, 0.5, 2.0),
+    "couscous": (376, 12.8, 77.0, 0.6, 5.0),
+    # Others (no meaningful calories → still "resolved")
+    "salt": (0, 0.0, 0.0, 0.0, 0.0), "water": (0, 0.0, 0.0, 0.0, 0.0),
+    "stock": (7, 0.5, 0.8, 0.2, 0.0), "tea": (1, 0.0, 0.3, 0.0, 0.0),
+    "coffee": (2, 0.1, 0.0, 0.0, 0.0), "coffee powder": (353, 12.2, 75.4, 0.5, 0.0),
+    "juice": (45, 0.5, 10.4, 0.2, 0.2), "coconut water": (19, 0.7, 3.7, 0.2, 1.1),
+    "baking soda": (0, 0.0, 0.0, 0.0, 0.0),
+    "baking powder": (53, 0.0, 28.0, 0.0, 0.2), "yeast": (325, 40.4, 41.0, 7.6, 26.9),
+    "chocolate": (546, 4.9, 61.0, 31.0, 7.0), "cocoa": (228, 19.6, 58.0, 13.7, 37.0),
+    "breadcrumbs": (395, 13.4, 72.0, 5.3, 4.5), "gelatin": (335, 85.6, 0.0, 0.1, 0.0),
+    "agar agar": (306, 6.2, 80.9, 0.3, 7.7), "cornmeal": (370, 8.1, 79.0, 3.6, 7.3),
+}
+
+# Other names the app's ingredient lists use for the same thing
+ALIASES = {
+    "pyaz": "onion", "aloo": "potato", "lahsun": "garlic", "adrak": "ginger", "gajar": "carrot",
+    "bell pepper": "capsicum", "palak": "spinach", "fenugreek": "methi", "cilantro": "coriander",
+    "dhaniya": "coriander", "pudina": "mint", "lauki": "bottle gourd", "karela": "bitter gourd",
+    "turai": "ridge gourd", "brinjal": "eggplant", "baingan": "eggplant", "bhindi": "okra", "arbi": "colocasia",
+    "haldi": "turmeric", "jeera": "cumin", "chili": "chilli", "red chilli": "chilli", "kashmiri chilli": "chilli",
+    "chilli powder": "chilli", "elaichi": "cardamom", "dalchini": "cinnamon", "laung": "clove",
+    "tej patta": "bay leaf", "saunf": "fennel", "sarson": "mustard", "rai": "mustard", "hing": "asafoetida",
+    "carom seeds": "ajwain", "til": "sesame", "khus khus": "poppy seeds", "kesar": "saffron",
+    "jaiphal": "nutmeg", "dried mango": "amchur", "cayenne": "chilli", "javitri": "mace", "kalonji": "nigella",
+    "turmeric powder": "turmeric", "dried pomegranate": "anardana", "pav bhaji masala": "garam masala",
+    "chole masala": "garam masala", "biryani masala": "garam masala", "tandoori masala": "garam masala",
+    "sambhar powder": "curry powder", "rasam powder": "curry powder",
+    "basmati rice": "rice", "sona masoori": "rice", "jasmine rice": "rice", "wheat": "atta",
+    "whole wheat": "atta", "all purpose flour": "maida", "sooji": "semolina", "rava": "semolina",
+    "gram flour": "besan", "chickpea flour": "besan", "cornstarch": "corn flour", "finger millet": "ragi",
+    "sorghum": "jowar", "pearl millet": "bajra", "mung dal": "moong dal", "arhar dal": "toor dal",
+    "kabuli chana": "chickpea", "chana": "chickpea", "black chickpea": "kala chana", "kidney beans": "rajma",
+    "groundnut": "peanut", "badam": "almond", "kaju": "cashew", "akhrot": "walnut", "pista": "pistachio",
+    "kishmish": "raisin", "khajoor": "dates", "nariyal": "coconut",
+    "doodh": "milk", "malai": "cream", "heavy cream": "cream", "fresh cream": "cream", "whipping cream": "cream",
+    "makhan": "butter", "clarified butter": "ghee",
+    "cottage cheese": "paneer", "cheddar": "cheese", "parmesan": "cheese", "yogurt": "curd", "dahi": "curd",
+    "chaas": "buttermilk", "mawa": "khoya", "machli": "fish", "pomfret": "fish", "rohu": "fish",
+    "shrimp": "prawn", "lamb": "mutton", "goat": "mutton", "anda": "egg", "eggs": "egg", "soy": "soybean",
+    "tel": "oil", "mustard oil": "oil", "coconut oil": "oil", "olive oil": "oil", "sunflower oil": "oil",
+    "vegetable oil": "oil", "sesame oil": "oil", "groundnut oil": "oil", "peanut oil": "oil",
+    "cumin powder": "cumin", "dhaniya powder": "coriander powder", "chini": "sugar", "gur": "jaggery", "shahad": "honey",
+    "palm sugar": "jaggery", "coconut sugar": "jaggery", "artificial sweetener": "stevia",
+    "tomato sauce": "ketchup", "sirka": "vinegar", "imli": "tamarind", "nimbu": "lemon", "lime": "lemon",
+    "achar": "pickle", "chapati": "roti", "kulcha": "naan", "puri": "paratha", "bhatura": "paratha",
+    "bun": "pav", "macaroni": "pasta", "spaghetti": "pasta", "seviyan": "vermicelli", "namak": "salt",
+    "pani": "water", "broth": "stock", "vegetable stock": "stock", "chicken stock": "stock", "bone broth": "stock",
+    "chai": "tea", "tea leaves": "tea", "panko": "breadcrumbs",
+}
+
+# ═══════════════════════════════════════════════════════════════
+# QUANTITIES → GRAMS
+# ═══════════════════════════════════════════════════════════════
+
+UNIT_GRAMS = {
+    "g": 1, "gram": 1, "grams": 1, "kg": 1000, "ml": 1, "l": 1000, "liter": 1000, "litre": 1000,
+    "tsp": 5, "teaspoon": 5, "tbsp": 15, "tablespoon": 15, "cup": 200, "cups": 200,
+    "pinch": 0.5, "handful": 30, "pack": 200, "packet": 200,
+}
+# One "piece" / "medium" of these
+PIECE_GRAMS = {
+    "onion": 110, "tomato": 100, "potato": 150, "carrot": 60, "egg": 50, "green chilli": 5,
+    "garlic": 5, "lemon": 50, "capsicum": 120, "bread": 30, "pav": 40, "roti": 40, "naan": 90,
+    "paratha": 80, "cardamom": 0.2, "clove": 0.1, "bay leaf": 0.2, "cinnamon": 2, "cucumber": 200,
+}
+SIZE_FACTOR = {"small": 0.7, "medium": 1.0, "large": 1.4}
+WORD_NUMBERS = {"half": 0.5, "quarter": 0.25, "a": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+                "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+DEFAULT_PIECE_GRAMS = 50
+AS_NEEDED_GRAMS = 5       # "to taste" / "as needed": a teaspoon or so
+
+
+UNICODE_FRACTIONS = {"½": "1/2", "⅓": "1/3", "⅔": "2/3", "¼": "1/4", "¾": "3/4", "⅛": "1/8", "⅜": "3/8",
+                     "⅝": "5/8", "⅞": "7/8", "⅕": "1/5", "⅙": "1/6"}
+# "1.5", "1/2" or "1 1/2" (mixed number first, so it isn't read as just "1")
+NUMBER = r"\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?"
+QUANTITY_NUMBER = re.compile(rf"({NUMBER})(?:\s*-\s*({NUMBER}))?")
+
+
+def parse_number(text):
+    """'1.5' / '1/2' / '1 1/2' → float"""
+    amount = 0.0
+    for part in text.split():
+        numerator, _, denominator = part.partition("/")
+        amount += float(numerator) / float(denominator) if denominator and float(denominator) else float(numerator)
+    return amount
+
+
+def quantity_grams(qty, key):
+    """'200 g' / '2 tbsp' / '1 1/2 cups' / '½ cup' / '1-2 medium' / 'as needed' → grams of ingredient `key`"""
+    qty = str(qty or "").lower().strip()
+    for symbol, fraction in UNICODE_FRACTIONS.items():
+        qty = qty.replace(symbol, f" {fraction}")   # "1½" → "1 1/2"
+    qty = qty.replace("⁄", "/").strip()
+    number = QUANTITY_NUMBER.match(qty)
+    if number:
+        amount = parse_number(number.group(1))
+        if number.group(2):
+            amount = (amount + parse_number(number.group(2))) / 2   # "1-2" → 1.5
+        rest = qty[number.end():].strip()
+    else:
+        word = qty.split()[0] if qty.split() else ""
+        if word not in WORD_NUMBERS and word not in UNIT_GRAMS:
+            return AS_NEEDED_GRAMS
+        amount = WORD_NUMBERS.get(word, 1)
+        rest = qty[len(word):].strip() if word in WORD_NUMBERS else qty
+
+    unit = rest.split()[0] if rest.split() else ""
+    if unit in UNIT_GRAMS:
+        return amount * UNIT_GRAMS[unit]
+    return amount * PIECE_GRAMS.get(key, DEFAULT_PIECE_GRAMS) * SIZE_FACTOR.get(unit, 1.0)
+
+
+# ═══════════════════════════════════════════════════════════════
+# ENGINE
+# ═══════════════════════════════════════════════════════════════
+
+# Preparation words that don't change what the ingredient is
+PREP_WORDS = {
+    "fresh", "freshly", "chopped", "finely", "roughly", "thinly", "sliced", "diced", "minced", "grated",
+    "crushed", "ground", "roasted", "toasted", "boiled", "cooked", "raw", "peeled", "whole", "small",
+    "medium", "large", "big", "organic", "optional", "and", "or", "of", "a", "few",
+}
+
+
+def normalize_name(name):
+    """'Finely Chopped Fresh Tomatoes (ripe)' → 'tomato': how learned ingredients are keyed"""
+    name = re.sub(r"\(.*?\)", " ", str(name).lower())
+    words = [word for word in re.sub(r"[^a-z\s]", " ", name).split() if word not in PREP_WORDS]
+    if words:
+        last = words[-1]
+        if last.endswith("ies") and len(last) > 4:
+            words[-1] = last[:-3] + "y"
+        elif last.endswith("oes") and len(last) > 4:
+            words[-1] = last[:-2]
+        elif last.endswith("s") and not last.endswith(("ss", "us")) and len(last) > 3:
+            words[-1] = last[:-1]
+    return " ".join(words)
+
+
+def fallback_prompt(names):
+    """Ask the LLM for per-100 g values of ingredients the table doesn't know"""
+    names = sorted({normalize_name(name) for name in names} - {""})
+    return (
+        "For each ingredient give typical nutrition per 100 g, one line each, exactly:\n"
+        "name | kcal | protein g | carbs g | fat g | fiber g\n"
+        "Use the names exactly as listed. Numbers only, no units, no other text.\n\n" + "\n".join(names)
+    )
+
+
+def parse_fallback(text):
+    """'name | 1 | 2 | 3 | 4 | 5' lines → {name: (5 floats)} (bad lines are skipped)"""
+    rows = {}
+    for line in str(text).splitlines():
+        parts = [part.strip() for part in line.strip().strip("-*• ").split("|")]
+        if len(parts) != 6 or not parts[0]:
+            continue
+        try:
+            rows[parts[0].lower()] = tuple(float(re.sub(r"[^\d.]", "", part) or 0) for part in parts[1:])
+        except ValueError:
+            continue
+    return rows
+
+
+class NutritionEngine:
+    """Per-100 g table as a NumPy matrix; recipes are one matrix product"""
+
+    def __init__(self, table=NUTRITION_TABLE, aliases=ALIASES):
+        self._lock = threading.Lock()
+        self._aliases = dict(aliases)
+        self._keys = list(table)
+        self._rows = np.array([table[key] for key in self._keys], dtype=float)
+        self._index()
+
+    def _index(self):
+        self._position = {key: i for i, key in enumerate(self._keys)}
+        names = sorted(set(self._keys) | set(self._aliases), key=len, reverse=True)   # "mustard oil" before "mustard"
+        self._patterns = [(re.compile(rf"\b{re.escape(name)}(?:e?s)?\b"), name) for name in names]
+
+    def resolve(self, name):
+        """Table key for an ingredient name ('chopped red onions' → 'onion'), or None"""
+        name = " ".join(str(name).lower().split())
+        for pattern, known in self._patterns:
+            if pattern.search(name):
+                return self._aliases.get(known, known)
+        return None
+
+    def unknown(self, names):
+        """Names that are neither a table row nor an alias (should be empty for FOOD_INGREDIENTS_SET)"""
+        return sorted(name for name in names if name not in self._position and name not in self._aliases)
+
+    def learn(self, rows):
+        """Add per-100 g rows (e.g. parse_fallback() of an LLM reply), keyed by normalize_name()"""
+        normalized = {}
+        for name, values in rows.items():
+            key = normalize_name(name)
+            if key and key not in normalized and self.resolve(key) is None:
+                normalized[key] = values
+        rows = normalized
+        if not rows:
+            return
+        with self._lock:
+            self._keys.extend(rows)
+            self._rows = np.vstack([self._rows, np.array(list(rows.values()), dtype=float)])
+            self._index()
+
+    def compute(self, ingredients, servings=1):
+        """
+        ingredients: [{"name", "qty"}] (extract_ingredients output).
+        Returns {"per_serving": {nutrient: value}, "total": {...},
+        "items": [(name, key, grams)], "unresolved": [names]}
+        """
+        servings = max(1, int(servings or 1))
+        keys, grams, items, unresolved = [], [], [], []
+        for ingredient in ingredients:
+            key = self.resolve(ingredient["name"])
+            if key is None:
+                unresolved.append(ingredient["name"])
+                continue
+            amount = quantity_grams(ingredient.get("qty"), key)
+            keys.append(key)
+            grams.append(amount)
+            items.append((ingredient["name"], key, round(amount, 1)))
+
+        with self._lock:
+            rows = self._rows[[self._position[key] for key in keys]] if keys else np.zeros((0, len(NUTRIENTS)))
+        total = np.asarray(grams, dtype=float) @ rows / 100.0 if keys else np.zeros(len(NUTRIENTS))
+        per_serving = total / servings
+        return {
+            "per_serving": {name: round(float(value), 1) for name, value in zip(NUTRIENTS, per_serving)},
+            "total": {name: round(float(value), 1) for name, value in zip(NUTRIENTS, total)},
+            "items": items,
+            "unresolved": unresolved,
+        }
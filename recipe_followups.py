@@ -0,0 +1,103 @@
+"""
+🔮 Annapurna Recipe Follow-ups
+Right after a recipe arrives the user nearly always asks for one of
+Start Cooking / Nutrition / Substitutes. The cheap local ones are worked
+out in the background as soon as the recipe is shown, so the click just
+renders; LLM calls are added on the first click that needs them.
+
+    followups = RecipeFollowUps(pool, key, {
+        "parse": (parse_recipe, ()),                     # runs right away
+        "nutrition": (compute_nutrition, ("parse",)),    # gets parse's result as argument
+    })
+    followups.add("substitutes", find_substitutes, ("parse",))   # later, on a click
+    followups.result("nutrition", timeout=2)
+
+Tasks run on a shared thread pool and must not touch st.session_state
+(they get plain values). A task starts when the tasks it depends on are
+done - nothing waits inside the pool. Every task also gets `cancelled`
+(a threading.Event) to check before slow steps; cancel() is called when a
+newer recipe replaces this one.
+"""
+
+import threading
+from concurrent.futures import Future
+
+
+class RecipeFollowUps:
+    """Background results for one recipe (identified by `key`)"""
+
+    def __init__(self, pool, key, tasks):
+        self.key = key
+        self.cancelled = threading.Event()
+        self._pool = pool
+        self._tasks = dict(tasks)
+        self._lock = threading.Lock()
+        self._futures = {name: Future() for name in tasks}   # resolved as tasks finish
+        self._started = set()
+        self._running = []
+        self._start_ready()
+
+    def _start_ready(self):
+        """Submit every task whose dependencies are done (a failed dependency cancels its dependants)"""
+        submitted = []
+        with self._lock:
+            for name, (function, deps) in self._tasks.items():
+                if name in self._started or not all(self._futures[dep].done() for dep in deps):
+                    continue
+                self._started.add(name)
+                if self.cancelled.is_set() or any(
+                    self._futures[dep].cancelled() or self._futures[dep].exception() for dep in deps
+                ):
+                    self._futures[name].cancel()
+                    continue
+                args = [self._futures[dep].result() for dep in deps]
+                running = self._pool.submit(function, *args, cancelled=self.cancelled)
+                self._running.append(running)
+                submitted.append((name, running))
+        for name, running in submitted:
+            running.add_done_callback(lambda done, name=name: self._finish(name, done))
+
+    def _finish(self, name, done):
+        # Under the lock, so cancel() can't slip in between the check and set_result()
+        with self._lock:
+            future = self._futures[name]
+            if not future.cancelled():
+                if done.cancelled():
+                    future.cancel()
+                elif done.exception() is not None:
+                    future.set_exception(done.exception())
+                else:
+                    future.set_result(done.result())
+        self._start_ready()
+
+    def add(self, name, function, deps=()):
+        """Another task, started now (once its dependencies are done); no-op if it's already there"""
+        with self._lock:
+            if name in self._tasks:
+                return
+            self._tasks[name] = (function, deps)
+            self._futures[name] = Future()
+        self._start_ready()
+
+    def ready(self, name):
+        return self._futures[name].done()
+
+    def pending(self, name):
+        """Added and still running (or waiting for its dependencies)"""
+        future = self._futures.get(name)
+        return future is not None and not future.done()
+
+    def result(self, name, timeout=None):
+        """The task's result; raises its exception, CancelledError or TimeoutError"""
+        return self._futures[name].result(timeout=timeout)
+
+    def cancel(self):
+        """A newer recipe arrived: drop queued work and tell running tasks to stop early"""
+        self.cancelled.set()
+        with self._lock:
+            running = list(self._running)
+        for submitted in running:
+            submitted.cancel()   # may run _finish() right here, so not under the lock
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
@@ -0,0 +1,218 @@
+"""
+📖 Annapurna Recipe Model
+Recipes are generated as JSON (schema in RECIPE_JSON_INSTRUCTIONS),
+validated once into a Recipe and kept on the session - the rest of the
+app reads ingredients, quantities, steps and timer durations from it
+instead of re-parsing markdown on every rerun. Markdown for the chat is
+rendered from the object.
+
+    recipe, text = parse_reply(reply)   # (Recipe, None) / (None, chat text or legacy markdown)
+    recipe.to_markdown()
+    render_partial(reply_so_far)        # while it's still streaming in
+
+Older markdown recipes (saved chats, YouTube imports, favourites) still
+go through the regex parsers; Recipe.from_legacy() wraps their output.
+"""
+
+import json
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+RECIPE_JSON_INSTRUCTIONS = """
+
+OUTPUT FORMAT - reply with ONE JSON object and nothing else (no markdown, no code fences).
+For a recipe:
+{"type": "recipe", "title": "Paneer Butter Masala", "servings": 2,
+ "ingredients": [{"qty": "200", "unit": "g", "name": "paneer"}, {"qty": "", "unit": "", "name": "salt to taste"}],
+ "steps": [{"text": "Heat butter in a pan.", "minutes": null}, {"text": "Simmer the gravy.", "minutes": 10}],
+ "notes": "a short friendly closing line"}
+"minutes" is the time the step takes when it says so (else null); qty is a number or fraction as text.
+For anything that isn't a recipe: {"type": "chat", "message": "your reply"}"""
+
+MAX_STEPS = 15
+
+
+@dataclass
+class Ingredient:
+    name: str
+    qty: str = ""
+    unit: str = ""
+
+    def quantity(self):
+        """'200 g' / '2' / 'as needed'"""
+        return f"{self.qty} {self.unit}".strip() or "as needed"
+
+    def line(self):
+        return f"- {self.quantity()} {self.name}" if self.qty or self.unit else f"- {self.name}"
+
+
+@dataclass
+class Step:
+    text: str
+    minutes: Optional[float] = None
+
+
+@dataclass
+class Recipe:
+    title: str
+    ingredients: list = field(default_factory=list)   # [Ingredient]
+    steps: list = field(default_factory=list)         # [Step]
+    servings: Optional[int] = None
+    notes: str = ""
+    structured: bool = True                           # False: recovered from legacy markdown
+
+    # ───────────── building ─────────────
+
+    @classmethod
+    def from_dict(cls, data):
+        """Validate generated / stored JSON; ValueError if it isn't a usable recipe"""
+        if not isinstance(data, dict):
+            raise ValueError("recipe must be an object")
+        title = str(data.get("title") or "").strip()
+        ingredients = []
+        for item in data.get("ingredients") or []:
+            if isinstance(item, str):
+                item = {"name": item}
+            name = str(item.get("name") or "").strip() if isinstance(item, dict) else ""
+            if name:
+                ingredients.append(Ingredient(name, str(item.get("qty") or "").strip(), str(item.get("unit") or "").strip()))
+        steps = []
+        for item in (data.get("steps") or [])[:MAX_STEPS]:
+            if isinstance(item, str):
+                item = {"text": item}
+            text = str(item.get("text") or "").strip() if isinstance(item, dict) else ""
+            if text:
+                steps.append(Step(text, _minutes(item.get("minutes"))))
+        if not title or not ingredients or not steps:
+            raise ValueError("recipe needs a title, ingredients and steps")
+        servings = data.get("servings")
+        return cls(
+            title=title,
+            ingredients=ingredients,
+            steps=steps,
+            servings=int(servings) if isinstance(servings, (int, float)) and servings > 0 else None,
+            notes=str(data.get("notes") or "").strip(),
+        )
+
+    @classmethod
+    def from_legacy(cls, text, ingredients, steps):
+        """Wrap extract_ingredients() / extract_steps() output for a markdown recipe"""
+        first_line = next((line for line in text.splitlines() if line.strip()), "Recipe")
+        return cls(
+            title=first_line.strip("#* ").rstrip(":") or "Recipe",
+            ingredients=[_legacy_ingredient(item) for item in ingredients],
+            steps=[Step(step) for step in steps],
+            structured=False,
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+    # ───────────── reading ─────────────
+
+    def ingredient_names(self):
+        return [ingredient.name for ingredient in self.ingredients]
+
+    def step_texts(self):
+        return [step.text for step in self.steps]
+
+    def to_markdown(self):
+        lines = [f"## {self.title}"]
+        if self.servings:
+            lines.append(f"*Serves {self.servings}*")
+        lines += ["", "**Ingredients:**"] + [ingredient.line() for ingredient in self.ingredients]
+        lines += ["", "**Steps:**"] + [f"{i}. {step.text}" for i, step in enumerate(self.steps, 1)]
+        if self.notes:
+            lines += ["", self.notes]
+        return "\n".join(lines)
+
+
+def _legacy_ingredient(item):
+    """{"name", "qty": "200 g"} → Ingredient (qty split into number + unit)"""
+    quantity = str(item.get("qty") or "").strip()
+    if quantity == "as needed":
+        return Ingredient(item["name"])
+    number, _, unit = quantity.partition(" ")
+    if re.match(r"^\d", number):
+        return Ingredient(item["name"], number, unit.strip())
+    return Ingredient(item["name"], quantity)
+
+
+def _minutes(value):
+    try:
+        minutes = float(value)
+    except (TypeError, ValueError):
+        return None
+    return minutes if minutes > 0 else None
+
+
+# ═══════════════════════════════════════════════════════════════
+# MODEL REPLIES
+# ═══════════════════════════════════════════════════════════════
+
+def _json_text(text):
+    """The JSON object a reply consists of (code fences allowed), or None for markdown / plain text"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text).strip()
+    end = text.rfind("}")
+    return text[:end + 1] if text.startswith("{") and end > 0 else None
+
+
+def parse_reply(text):
+    """(Recipe, None) for a valid recipe, else (None, text to show)"""
+    raw = _json_text(text)
+    if raw is None:
+        return None, text
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return None, text
+    if isinstance(data, dict) and (data.get("type") == "chat" or ("message" in data and "ingredients" not in data)):
+        return None, str(data.get("message") or "").strip() or text
+    try:
+        return Recipe.from_dict(data), None
+    except ValueError:
+        return None, text
+
+
+def _partial_string(text, key):
+    """Value of "key": "..." even if the closing quote hasn't arrived yet"""
+    match = re.search(rf'"{key}"\s*:\s*"((?:[^"\\]|\\.)*)', text)
+    if not match:
+        return ""
+    value = match.group(1).rstrip("\\")
+    try:
+        return json.loads(f'"{value}"')
+    except ValueError:
+        return value
+
+
+def render_partial(text):
+    """Markdown for a reply that is still streaming: JSON shows the items complete so far"""
+    stripped = text.lstrip()
+    if not stripped.startswith(("{", "```")):
+        return text
+    message = _partial_string(stripped, "message")
+    if message:
+        return message
+    ingredients, steps = [], []
+    for chunk in re.findall(r"\{[^{}]*\}", stripped):
+        try:
+            item = json.loads(chunk)
+        except ValueError:
+            continue
+        if "name" in item:
+            ingredients.append(Ingredient(str(item["name"]), str(item.get("qty") or ""), str(item.get("unit") or "")))
+        elif "text" in item:
+            steps.append(item["text"])
+    title = _partial_string(stripped, "title")
+    if not title and not ingredients:
+        return ""   # nothing worth showing yet
+    lines = [f"## {title or '…'}"]
+    if ingredients:
+        lines += ["", "**Ingredients:**"] + [ingredient.line() for ingredient in ingredients]
+    if steps:
+        lines += ["", "**Steps:**"] + [f"{i}. {step}" for i, step in enumerate(steps, 1)]
+    return "\n".join(lines)
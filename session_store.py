@@ -0,0 +1,215 @@
+"""
+🧳 Annapurna Session State Store
+Keeps the working state of a browser session (open chat, cooking steps
+and timers, settings...) outside the Streamlit process, so any app
+replica can pick the session up after a reload or a restart - no
+sticky sessions needed.
+
+Only plain data is saved: queues, threads, futures and other live
+objects stay in the process and are rebuilt on the new replica. Data
+that already has its own home (inventory, grocery list, meal plans...
+in the local cache / Firestore) is only included for guests, who have
+no other storage.
+
+Backends (ANNAPURNA_SESSION_BACKEND or st.secrets["session_backend"]):
+    sqlite:///.annapurna_sessions.sqlite3   default; shared by processes on one machine
+    redis://host:6379/0                     any Redis-compatible server (needs `pip install redis`)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_BACKEND_URL = os.environ.get("ANNAPURNA_SESSION_BACKEND", "sqlite:///.annapurna_sessions.sqlite3")
+SESSION_TTL = 7 * 24 * 60 * 60   # seconds an untouched session is kept
+MAX_DIGESTS = 10000              # sessions whose last saved digest this process remembers (LRU)
+
+# Working state of any session
+SESSION_KEYS = [
+    "messages", "chat", "last_recipe", "servings", "allergies",
+    "jain_mode", "pure_veg_mode", "health_mode", "language_mode", "unit_system", "theme",
+    "voice_enabled", "voice_language",
+    "cooking_mode", "current_step", "cooking_steps", "ingredients_shown", "missing_ingredients",
+    "show_cooking_check", "show_nutrition", "show_substitutes",
+    "video_recipe", "detected_ingredients", "custom_recipes", "gym_diet_chart", "recipe_data",
+]
+SESSION_KEY_PREFIXES = ["timer_running_", "timer_remaining_", "timer_start_"]
+
+# Saved elsewhere for accounts; guests only have the session
+GUEST_KEYS = [
+    "inventory", "inventory_prices", "inventory_expiry", "expiry_reference_date", "grocery_list",
+    "meal_plan", "diet_charts", "favourite_recipes", "tried_recipes", "user_preferences",
+]
+
+
+# ═══════════════════════════════════════════════════════════════
+# BACKENDS
+# ═══════════════════════════════════════════════════════════════
+
+class SQLiteSessionBackend:
+    """One row per session in a local SQLite file (WAL, safe across processes)"""
+
+    def __init__(self, path, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, data):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (key, data, expires_at) VALUES (?, ?, ?)",
+                (key, data, time.time() + self.ttl),
+            )
+            self._writes += 1
+            if self._writes % 200 == 0:   # sweep expired sessions now and then
+                self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+
+class RedisSessionBackend:
+    """Redis (or anything speaking its protocol); entries expire on their own"""
+
+    def __init__(self, url, ttl=SESSION_TTL):
+        import redis  # optional dependency
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url, socket_timeout=2)
+
+    def get(self, key):
+        data = self._client.get(f"annapurna:session:{key}")
+        return data.decode("utf-8") if data is not None else None
+
+    def set(self, key, data):
+        self._client.set(f"annapurna:session:{key}", data, ex=self.ttl)
+
+    def delete(self, key):
+        self._client.delete(f"annapurna:session:{key}")
+
+
+def make_session_backend(url=SESSION_BACKEND_URL):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSessionBackend(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionBackend(url[len("sqlite:///"):])
+    raise ValueError(f"Unknown session backend '{url}' (use sqlite:///path or redis://host:port/db)")
+
+
+# ═══════════════════════════════════════════════════════════════
+# SNAPSHOT / RESTORE
+# ═══════════════════════════════════════════════════════════════
+
+def _encode(value):
+    if isinstance(value, (set, frozenset)):
+        return {"__set__": sorted(value, key=str)}
+    raise TypeError(f"{type(value).__name__} is not saved with the session")
+
+
+def _decode(obj):
+    if set(obj) == {"__set__"}:
+        return set(obj["__set__"])
+    return obj
+
+
+def session_key(user_id, token):
+    """One entry per signed-in browser: user id + a hash of its session token"""
+    return f"{user_id}:{hashlib.sha256(str(token).encode('utf-8')).hexdigest()[:16]}"
+
+
+class SessionStateStore:
+    """Saves / restores the plain-data parts of st.session_state"""
+
+    def __init__(self, backend, max_digests=MAX_DIGESTS):
+        self.backend = backend
+        self.ttl = getattr(backend, "ttl", SESSION_TTL)
+        self.max_digests = max_digests
+        self._lock = threading.Lock()
+        self._digests = OrderedDict()   # key -> (digest, saved at) of the last snapshot, least recent first
+
+    def _unchanged(self, key, digest):
+        """Same snapshot as last time, and its backend entry isn't halfway to expiring"""
+        with self._lock:
+            entry = self._digests.get(key)
+            if entry is None or time.time() - entry[1] > self.ttl / 2:
+                return False  # rewrite: renews the entry's TTL
+            self._digests.move_to_end(key)
+            return entry[0] == digest
+
+    def _remember(self, key, digest):
+        """Evicted like the backend's entries: past the TTL, or least recently used beyond max_digests"""
+        with self._lock:
+            now = time.time()
+            self._digests[key] = (digest, now)
+            self._digests.move_to_end(key)
+            while self._digests:
+                oldest_key, (_, saved_at) = next(iter(self._digests.items()))
+                if len(self._digests) <= self.max_digests and now - saved_at <= self.ttl:
+                    break
+                del self._digests[oldest_key]
+
+    def keys_for(self, state, guest):
+        keys = SESSION_KEYS + (GUEST_KEYS if guest else [])
+        keys += [key for key in state.keys() if any(str(key).startswith(prefix) for prefix in SESSION_KEY_PREFIXES)]
+        return keys
+
+    def snapshot(self, state, guest=False):
+        """JSON of the keys worth keeping; anything that won't serialize is left out"""
+        data = {}
+        for key in self.keys_for(state, guest):
+            if key not in state:
+                continue
+            value = state[key]
+            if key == "chat" and isinstance(value, dict):
+                value = dict(value, older=[])  # earlier pages are re-fetched on request
+            try:
+                json.dumps(value, default=_encode)
+            except (TypeError, ValueError):
+                continue
+            data[key] = value
+        return json.dumps(data, default=_encode, sort_keys=True)
+
+    def save(self, key, state, guest=False):
+        """Returns True if something was written"""
+        text = self.snapshot(state, guest)
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        if self._unchanged(key, digest):
+            return False
+        self.backend.set(key, text)
+        self._remember(key, digest)
+        return True
+
+    def restore(self, key, state):
+        """Put a saved snapshot back into `state`. Returns how many keys were restored."""
+        text = self.backend.get(key)
+        if text is None:
+            return 0
+        data = json.loads(text, object_hook=_decode)
+        for name, value in data.items():
+            state[name] = value
+        # No digest kept: we don't know when the entry expires, so the next save() renews it
+        with self._lock:
+            self._digests.pop(key, None)
+        return len(data)
+
+    def forget(self, key):
+        with self._lock:
+            self._digests.pop(key, None)
+        self.backend.delete(key)
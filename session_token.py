@@ -0,0 +1,121 @@
+"""
+🔑 Annapurna Session Tokens
+Small signed tokens that let a returning browser skip the Google sign-in
+round trip. The token only says who the user is and until when; it is
+signed with HMAC-SHA256 so it can't be edited or forged without the
+server's secret. The app keeps it in a cookie, never in the URL.
+
+    token = issue_token(secret, {"uid": ..., "email": ..., "name": ...})
+    claims = verify_token(secret, token)   # None if tampered or expired
+
+SessionRegistry keeps a server-side record per issued token (in the
+session store's backend), so signing out revokes a token before it
+expires. It also carries a Google login attempt (OAuth state → PKCE
+verifier) across the redirect:
+
+    registry = SessionRegistry(backend)
+    token = registry.issue(secret, claims)
+    claims = registry.verify(secret, token)  # None once revoked
+    registry.revoke(claims)
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+
+TOKEN_TTL = 24 * 60 * 60        # seconds a token stays valid
+TOKEN_VERSION = 2
+LOGIN_TTL = 10 * 60             # seconds to finish the Google sign-in
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(secret, payload):
+    return _b64encode(hmac.new(secret.encode("utf-8"), payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def issue_token(secret, claims, ttl=TOKEN_TTL):
+    """claims (uid, email, name, ...) → 'payload.signature'"""
+    body = dict(claims, v=TOKEN_VERSION, iat=int(time.time()), exp=int(time.time() + ttl))
+    payload = _b64encode(json.dumps(body, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+    return f"{payload}.{_sign(secret, payload)}"
+
+
+def verify_token(secret, token):
+    """Returns the claims, or None if the token is malformed, tampered with or expired"""
+    try:
+        payload, signature = str(token).split(".", 1)
+        if not hmac.compare_digest(signature, _sign(secret, payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+
+    if not isinstance(claims, dict):
+        return None
+    if claims.get("v") != TOKEN_VERSION or claims.get("exp", 0) < time.time() or not claims.get("uid"):
+        return None
+    return claims
+
+
+class SessionRegistry:
+    """Issued tokens and pending Google logins, kept server-side"""
+
+    def __init__(self, backend):
+        self.backend = backend   # get(key) / set(key, text) / delete(key), e.g. a session store backend
+
+    def _get(self, key):
+        try:
+            record = json.loads(self.backend.get(key) or "null")
+        except ValueError:
+            return None
+        if not isinstance(record, dict) or record.get("exp", 0) < time.time():
+            return None
+        return record
+
+    # ───────────── session tokens ─────────────
+
+    def issue(self, secret, claims, ttl=TOKEN_TTL):
+        """New token with its own id, recorded so it can be revoked"""
+        sid = secrets.token_urlsafe(16)
+        self.backend.set(f"auth:{sid}", json.dumps({"uid": claims["uid"], "exp": time.time() + ttl}))
+        return issue_token(secret, dict(claims, sid=sid), ttl)
+
+    def verify(self, secret, token):
+        """Claims of a valid, unrevoked token, else None"""
+        claims = verify_token(secret, token)
+        if claims is None or not claims.get("sid"):
+            return None
+        record = self._get(f"auth:{claims['sid']}")
+        if record is None or record.get("uid") != claims["uid"]:
+            return None
+        return claims
+
+    def revoke(self, claims):
+        if claims and claims.get("sid"):
+            self.backend.delete(f"auth:{claims['sid']}")
+
+    # ───────────── Google login attempts ─────────────
+
+    def start_login(self, code_verifier, ttl=LOGIN_TTL):
+        """New OAuth state for one sign-in; its PKCE verifier waits here for the redirect back"""
+        state = secrets.token_urlsafe(32)
+        self.backend.set(f"oauth:{state}", json.dumps({"verifier": code_verifier, "exp": time.time() + ttl}))
+        return state
+
+    def finish_login(self, state):
+        """PKCE verifier for a state this server issued (single use), else None"""
+        if not state:
+            return None
+        record = self._get(f"oauth:{state}")
+        self.backend.delete(f"oauth:{state}")
+        return record.get("verifier") if record else None
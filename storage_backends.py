@@ -0,0 +1,138 @@
+"""
+🗃️ Annapurna Storage Backends
+Where a session's user data is saved depends on who is signed in:
+
+    LocalFirstStore   signed-in accounts: local SQLite cache, synced to
+                      Firestore in the background (see local_cache.py)
+    MemoryStore       guests: process memory only, LRU + TTL eviction and
+                      memory caps - never a single Firestore read or write
+
+Both take the same calls, so the app doesn't care which one it has:
+    store.load(user_id)                   → (root_data, records) or None
+    store.save(user_id, records, writes)
+    store.pending(user_id)                → changes not yet in Firestore
+    store.touch(user_id)                  → the session is still in use
+    store.forget(user_id)
+"""
+
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from user_data_store import SCHEMA_VERSION, needs_migration
+
+GUEST_PREFIX = "guest_"
+GUEST_MAX_USERS = 1000             # guest sessions kept at once
+GUEST_MAX_BYTES = 64 * 1024 * 1024  # total size of all guest data
+GUEST_TTL = 6 * 60 * 60            # seconds a guest's data survives without being used
+
+
+def is_guest_id(user_id):
+    return str(user_id or "").startswith(GUEST_PREFIX)
+
+
+class LocalFirstStore:
+    """Signed-in users: local cache now, Firestore in the background"""
+
+    remote = True  # falls back to a Firestore read when the cache is cold
+
+    def __init__(self, cache, sync_engine):
+        self.cache = cache
+        self.sync_engine = sync_engine
+
+    def load(self, user_id):
+        # last_pulled is only set once the cache holds the whole account
+        if not self.cache.last_pulled(user_id):
+            return None
+        cached = self.cache.load(user_id)
+        if cached is not None and needs_migration(cached[0]):
+            return None  # cached before a layout change: load (and migrate) from Firestore
+        return cached
+
+    def save(self, user_id, records, writes):
+        self.cache.store_writes(user_id, records, writes)
+        self.sync_engine.notify(user_id)
+
+    def pending(self, user_id):
+        return self.sync_engine.pending(user_id)
+
+    def touch(self, user_id):
+        self.sync_engine.touch(user_id)
+
+    def forget(self, user_id):
+        # Local rows stay for the next login on this server; syncing stops once they're pushed
+        self.sync_engine.unwatch(user_id)
+
+
+class MemoryStore:
+    """Guests: process-local, LRU/TTL-evicted, capped by users and bytes"""
+
+    remote = False
+
+    def __init__(self, max_users=GUEST_MAX_USERS, max_bytes=GUEST_MAX_BYTES, ttl=GUEST_TTL):
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # user_id -> {"records", "size", "seen"}, least recently used first
+        self._bytes = 0
+        self.stats = {"evicted": 0, "expired": 0}
+
+    def load(self, user_id):
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            entry["seen"] = time.time()
+            self._entries.move_to_end(user_id)
+            records = copy.deepcopy(entry["records"])
+        root_data = {"schema_version": SCHEMA_VERSION}
+        return root_data, records
+
+    def save(self, user_id, records, writes):
+        """Keeps the whole current copy (writes only tell us something changed)"""
+        size = len(json.dumps(records, default=str))
+        with self._lock:
+            self._drop(user_id)
+            self._entries[user_id] = {"records": copy.deepcopy(records), "size": size, "seen": time.time()}
+            self._bytes += size
+            self._expire()
+            while self._entries and (len(self._entries) > self.max_users or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.stats["evicted"] += 1
+
+    def pending(self, user_id):
+        return 0  # nothing ever goes to Firestore
+
+    def touch(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry["seen"] = time.time()
+                self._entries.move_to_end(user_id)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._drop(user_id)
+
+    def usage(self):
+        with self._lock:
+            return {"users": len(self._entries), "bytes": self._bytes, **self.stats}
+
+    def _drop(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry["size"]
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        while self._entries:
+            user_id, entry = next(iter(self._entries.items()))
+            if entry["seen"] >= cutoff:
+                break  # LRU order: everything after this was used more recently
+            self._drop(user_id)
+            self.stats["expired"] += 1
@@ -0,0 +1,55 @@
+"""
+🧪 quantity_grams() - the quantity forms recipes use
+Run: python -m pytest -q
+"""
+
+import pytest
+from nutrition import UNIT_GRAMS, quantity_grams
+
+CUP = UNIT_GRAMS["cup"]
+
+
+@pytest.mark.parametrize("qty, grams", [
+    ("200 g", 200),
+    ("1.5 kg", 1500),
+    ("2 tbsp", 2 * UNIT_GRAMS["tbsp"]),
+    ("1-2 cups", 1.5 * CUP),
+    ("half cup", 0.5 * CUP),
+])
+def test_decimals_and_words(qty, grams):
+    assert quantity_grams(qty, "rice") == pytest.approx(grams)
+
+
+@pytest.mark.parametrize("qty, grams", [
+    ("1/2 cup", 0.5 * CUP),
+    ("3/4 tsp", 0.75 * UNIT_GRAMS["tsp"]),
+    ("1/2-1 cup", 0.75 * CUP),
+])
+def test_plain_fractions(qty, grams):
+    assert quantity_grams(qty, "rice") == pytest.approx(grams)
+
+
+@pytest.mark.parametrize("qty, grams", [
+    ("1 1/2 cups", 1.5 * CUP),
+    ("2 1/4 tbsp", 2.25 * UNIT_GRAMS["tbsp"]),
+])
+def test_mixed_fractions(qty, grams):
+    assert quantity_grams(qty, "rice") == pytest.approx(grams)
+
+
+@pytest.mark.parametrize("qty, grams", [
+    ("½ cup", 0.5 * CUP),
+    ("1½ cups", 1.5 * CUP),
+    ("1 ½ cups", 1.5 * CUP),
+    ("¾ tsp", 0.75 * UNIT_GRAMS["tsp"]),
+])
+def test_unicode_fractions(qty, grams):
+    assert quantity_grams(qty, "rice") == pytest.approx(grams)
+
+
+def test_fraction_of_pieces():
+    assert quantity_grams("1/2 medium", "onion") == pytest.approx(55)
+
+
+def test_as_needed():
+    assert quantity_grams("to taste", "salt") == 5
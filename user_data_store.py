@@ -0,0 +1,413 @@
+"""
+🗄️ Annapurna User Data Store
+How a user's kitchen data is laid out in Firestore, and which parts of
+it changed since the last save.
+
+LAYOUT (schema_version 3):
+    users/{uid}                      email, name, preferences, expiry_summary, ...
+    users/{uid}/inventory/{item}     name, qty, price, expires_on, expiry_days
+    users/{uid}/grocery_list/{item}  name
+    users/{uid}/diet_charts/{chart}  name, type, duration, schedule, notes, created
+    users/{uid}/favourites/{id}      name, recipe
+    users/{uid}/tried_recipes/{id}   recipe, rating, date
+
+Older users keep everything as maps inside users/{uid} (schema_version 1),
+or just the grocery list as an array there (2); migration_writes() moves
+that into the subcollections.
+
+Large fields (schedules, recipes) are stored compressed - see field_codec.py.
+
+Writes are described as plain tuples so any writer can apply them:
+    ("set", path, data)   path = () for the user doc, (collection, doc_id) otherwise
+    ("delete", path, None)
+"""
+
+import copy
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote
+from firebase_admin import firestore
+from field_codec import ENCODED_FIELDS, decode_fields, encode_fields, encode_value
+from expiry import days_until, expires_on
+
+SCHEMA_VERSION = 3
+
+# One document per record under users/{uid}
+SUBCOLLECTIONS = ["inventory", "grocery_list", "diet_charts", "favourites", "tried_recipes"]
+
+# Values that used to live inline on users/{uid} (schema_version 1; grocery_list until 3)
+LEGACY_FIELDS = ["inventory", "inventory_prices", "inventory_expiry", "diet_charts", "grocery_list"]
+
+# What the Chat tab needs at login (field mask + collections); the rest loads lazily
+EAGER_ROOT_FIELDS = ["preferences", "expiry_summary", "household_id", "schema_version", "last_updated"] + LEGACY_FIELDS
+EAGER_COLLECTIONS = ["inventory", "grocery_list"]
+DEFERRED_COLLECTIONS = ["diet_charts", "favourites", "tried_recipes"]
+
+# Session-state keys filled from each subcollection
+COLLECTION_STATE_KEYS = {
+    "inventory": ["inventory", "inventory_prices", "inventory_expiry", "expiry_reference_date"],
+    "grocery_list": ["grocery_list"],
+    "diet_charts": ["diet_charts"],
+    "favourites": ["favourite_recipes"],
+    "tried_recipes": ["tried_recipes"],
+}
+
+
+def user_ref(db, user_id):
+    return db.collection("users").document(user_id)
+
+
+def tried_id(entry):
+    """Stable document id for a tried_recipes entry: its stored id, else recipe + date"""
+    if entry.get("id"):
+        return entry["id"]
+    basis = f"{entry.get('recipe', '')}|{entry.get('date', '')}"
+    return hashlib.sha1(basis.encode("utf-8")).hexdigest()[:20]
+
+
+def doc_id(name):
+    """Firestore-safe document id for a free-text key (item or chart name)"""
+    safe = quote(str(name), safe=" ()-_',&+")  # '/' and '%' get escaped
+    if not safe or safe in (".", "..") or (safe.startswith("__") and safe.endswith("__")):
+        safe = "_" + safe
+    return safe
+
+
+# ═══════════════════════════════════════════════════════════════
+# SESSION STATE  ⇄  RECORDS
+# ═══════════════════════════════════════════════════════════════
+
+def build_records(state):
+    """Session-state values → {"root": {...}, collection: {doc_id: record}}"""
+    inventory = state.get("inventory") or {}
+    prices = state.get("inventory_prices") or {}
+    expiry = state.get("inventory_expiry") or {}
+    # "days left" in the session are counted from the day they were loaded
+    reference = state.get("expiry_reference_date")
+
+    items = {}
+    for item in set(inventory) | set(prices) | set(expiry):
+        record = {"name": item}
+        if item in inventory:
+            record["qty"] = inventory[item]
+        if item in prices:
+            record["price"] = prices[item]
+        if item in expiry:
+            record["expiry_days"] = expiry[item]
+            if isinstance(expiry[item], (int, float)):
+                record["expires_on"] = expires_on(expiry[item], reference)
+        items[doc_id(item)] = record
+
+    charts = {}
+    for name, chart in (state.get("diet_charts") or {}).items():
+        record = copy.deepcopy(dict(chart))
+        record["name"] = name
+        charts[doc_id(name)] = record
+
+    favourites = {
+        doc_id(name): {"name": name, "recipe": recipe}
+        for name, recipe in (state.get("favourite_recipes") or {}).items()
+    }
+
+    # Keyed by a stable id, so adding or removing one entry touches only that document
+    tried = {}
+    for entry in state.get("tried_recipes") or []:
+        key = tried_id(entry)
+        while key in tried:   # same recipe logged twice at the same moment
+            key += "+"
+        tried[key] = {field: copy.deepcopy(value) for field, value in dict(entry).items() if field != "id"}
+
+    # One tiny document per item, so devices add/remove items without overwriting each other
+    grocery = {doc_id(item): {"name": item} for item in state.get("grocery_list") or []}
+
+    return {
+        "root": {},
+        "inventory": items,
+        "grocery_list": grocery,
+        "diet_charts": charts,
+        "favourites": favourites,
+        "tried_recipes": tried,
+    }
+
+
+def records_to_state(records):
+    """Inverse of build_records → values for st.session_state"""
+    inventory, prices, expiry = {}, {}, {}
+    for record in records.get("inventory", {}).values():
+        name = record.get("name")
+        if name is None:
+            continue
+        if "qty" in record:
+            inventory[name] = record["qty"]
+        if "price" in record:
+            prices[name] = record["price"]
+        if record.get("expires_on"):
+            expiry[name] = days_until(record["expires_on"])
+        elif "expiry_days" in record:
+            expiry[name] = record["expiry_days"]  # saved before expiry dates existed
+
+    charts = {}
+    for record in records.get("diet_charts", {}).values():
+        chart = dict(record)
+        name = chart.pop("name", None)
+        if name is not None:
+            charts[name] = chart
+
+    favourites = {
+        record["name"]: record.get("recipe", "")
+        for record in records.get("favourites", {}).values() if "name" in record
+    }
+
+    tried = [
+        dict(record, id=key)
+        for key, record in sorted(records.get("tried_recipes", {}).items(), key=lambda item: (str(item[1].get("date", "")), item[0]))
+    ]
+
+    return {
+        "inventory": inventory,
+        "inventory_prices": prices,
+        "inventory_expiry": expiry,
+        "expiry_reference_date": datetime.now().date().isoformat(),
+        "diet_charts": charts,
+        "favourite_recipes": favourites,
+        "tried_recipes": tried,
+        "grocery_list": {record["name"] for record in records.get("grocery_list", {}).values() if "name" in record},
+    }
+
+
+# ═══════════════════════════════════════════════════════════════
+# DIFFING
+# ═══════════════════════════════════════════════════════════════
+
+def diff_fields(old, new):
+    """
+    Returns the nested changes that turn `old` into `new`, for
+    set(..., merge=True). Dicts are compared key by key, everything
+    else is replaced whole; removed keys become DELETE_FIELD.
+    """
+    changes = {}
+    for key, value in new.items():
+        if key not in old:
+            changes[key] = copy.deepcopy(value)
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = diff_fields(old[key], value)
+            if nested:
+                changes[key] = nested
+        elif value != old[key]:
+            changes[key] = copy.deepcopy(value)
+
+    for key in old:
+        if key not in new:
+            changes[key] = firestore.DELETE_FIELD
+
+    return changes
+
+
+def record_writes(kind, path, old, new):
+    """
+    Merge-set writes that turn the saved record `old` (None = not saved
+    yet) into `new`. Codec fields are compressed and always sent whole; one
+    that is still a plain map is deleted first, so keys removed from it
+    don't survive the merge.
+    """
+    if old is None:
+        return [("set", path, encode_fields(kind, new))]
+    changes = diff_fields(old, new)
+    cleared = {}
+    for field in ENCODED_FIELDS.get(kind, ()):
+        if field in changes and field in new:
+            changes[field] = encode_value(new[field])
+            if isinstance(changes[field], dict) and field in old:
+                cleared[field] = firestore.DELETE_FIELD
+    if not changes:
+        return []
+    return ([("set", path, cleared)] if cleared else []) + [("set", path, changes)]
+
+
+def diff_records(old, new, collections=None):
+    """
+    Per-document writes that turn one records dict into another.
+    `collections` limits which subcollections are compared (None = all).
+    """
+    writes = []
+    for collection in SUBCOLLECTIONS if collections is None else collections:
+        saved_docs = old.get(collection, {})
+        for key, record in new[collection].items():
+            writes += copy.deepcopy(record_writes(collection, (collection, key), saved_docs.get(key), record))
+        for key in saved_docs:
+            if key not in new[collection]:
+                writes.append(("delete", (collection, key), None))
+
+    return writes
+
+
+class ChangeTracker:
+    """Remembers the last persisted copy of the user's records"""
+
+    def __init__(self):
+        self.snapshot = {}
+        self.collections = None  # subcollections loaded into the session (None = all)
+
+    def mark_persisted(self, state):
+        """Record the current session-state values as saved"""
+        self.snapshot = build_records(state)
+
+    def track_only(self, collections):
+        """Ignore subcollections that haven't been loaded yet (their saved copy is unknown)"""
+        self.collections = list(collections)
+
+    def track_all(self):
+        self.collections = None
+
+    def untrack(self, collection):
+        """Stop saving a subcollection here (e.g. inventory while it's a shared household pantry)"""
+        self.collections = [c for c in (SUBCOLLECTIONS if self.collections is None else self.collections) if c != collection]
+
+    def mark_loaded(self, collection, docs):
+        """A lazily loaded subcollection arrived: start tracking it from the saved copy"""
+        self.snapshot[collection] = copy.deepcopy(docs)
+        if self.collections is not None and collection not in self.collections:
+            self.collections.append(collection)
+
+    def collect_writes(self, state):
+        """Writes needed to bring Firestore up to date. Empty list → nothing to save."""
+        return diff_records(self.snapshot, build_records(state), self.collections)
+
+    def is_dirty(self, state):
+        return bool(self.collect_writes(state))
+
+
+# ═══════════════════════════════════════════════════════════════
+# APPLYING WRITES / LOADING / MIGRATION
+# ═══════════════════════════════════════════════════════════════
+
+def apply_writes(db, writer, user_id, writes, stamp=None):
+    """
+    Send writes through `writer` (anything with set()/delete(), e.g. the
+    write-behind queue). Stamps last_updated + schema_version on the
+    user document whenever something changed.
+    """
+    if not writes:
+        return 0
+
+    stamp = stamp or datetime.now().isoformat()
+    root = user_ref(db, user_id)
+    stamped = False
+    for kind, path, data in writes:
+        ref = root if not path else root.collection(path[0]).document(path[1])
+        if kind == "delete":
+            writer.delete(ref)
+            continue
+        if not path:
+            data = dict(data, last_updated=stamp, schema_version=SCHEMA_VERSION)
+            stamped = True
+        writer.set(ref, data, merge=True)
+
+    if not stamped:
+        writer.set(root, {"last_updated": stamp, "schema_version": SCHEMA_VERSION}, merge=True)
+    return len(writes)
+
+
+def needs_migration(root_data):
+    return root_data.get("schema_version", 1) < SCHEMA_VERSION and any(
+        field in root_data for field in LEGACY_FIELDS
+    )
+
+
+def split_flat_document(root_data):
+    """schema_version 1 user document → records"""
+    return build_records({
+        "inventory": root_data.get("inventory"),
+        "inventory_prices": root_data.get("inventory_prices"),
+        "inventory_expiry": root_data.get("inventory_expiry"),
+        "diet_charts": root_data.get("diet_charts"),
+        "grocery_list": root_data.get("grocery_list"),
+    })
+
+
+def migration_writes(root_data, existing=None):
+    """
+    Writes that move the inline values of an older user document (maps in
+    schema_version 1, the grocery array in 2) into subcollections, then
+    drop them from the user document (in that order).
+    `existing` is {collection: doc ids already there}: those docs are newer
+    than the inline copy (a migration that stopped before its cleanup) and
+    are left alone.
+    """
+    if not needs_migration(root_data):
+        return []
+
+    existing = existing or {}
+    records = split_flat_document(root_data)
+    writes = []
+    for collection in SUBCOLLECTIONS:
+        present = set(existing.get(collection, ()))
+        for key, record in records[collection].items():
+            if key not in present:
+                writes.append(("set", (collection, key), encode_fields(collection, record)))
+
+    cleanup = {field: firestore.DELETE_FIELD for field in LEGACY_FIELDS if field in root_data}
+    writes.append(("set", (), cleanup))
+    return writes
+
+
+def apply_migration(db, writer, user_id, writes):
+    """
+    Apply migration_writes() through the writer without waiting: the
+    subcollection copies are queued now, the cleanup of the user document
+    only once nothing for this user is left to commit (queued together, it
+    could coalesce into an earlier write to the user document and land
+    first). If the process stops in between, the old fields stay and the
+    next load migrates again, skipping the docs that already made it.
+    """
+    root = user_ref(db, user_id)
+    for kind, path, data in writes:
+        if path:
+            writer.set(root.collection(path[0]).document(path[1]), data, merge=True)
+    cleanup = [write for write in writes if not write[1]]
+    writer.after(root.path, lambda: apply_writes(db, writer, user_id, cleanup))
+
+
+def load_collection(db, user_id, collection, timeout=10):
+    """{doc_id: record} for one subcollection"""
+    docs = user_ref(db, user_id).collection(collection).stream(timeout=timeout)
+    return {doc.id: decode_fields(collection, doc.to_dict()) for doc in docs}
+
+
+def load_user_records(db, user_id, collections=None, fields=None, timeout=10):
+    """
+    Read the user document plus its subcollections, concurrently.
+    `collections` picks subcollections (None = all), `fields` is a field
+    mask for the user document (None = whole document).
+    Returns (root_data or None, records, migration) where `migration`
+    are writes to apply if the document still uses the old layout.
+    """
+    collections = SUBCOLLECTIONS if collections is None else list(collections)
+    root = user_ref(db, user_id)
+    with ThreadPoolExecutor(max_workers=len(collections) + 1) as pool:
+        root_future = pool.submit(root.get, field_paths=fields, timeout=timeout)
+        futures = {c: pool.submit(load_collection, db, user_id, c, timeout) for c in collections}
+        root_doc = root_future.result()
+        if not root_doc.exists:
+            return None, build_records({}), []
+        root_data = decode_fields("root", root_doc.to_dict())
+        records = {"root": {}}
+        for collection, future in futures.items():
+            records[collection] = future.result()
+
+    migration = []
+    if needs_migration(root_data):
+        # One-off: the old maps cover every collection, so load the rest too
+        for collection in SUBCOLLECTIONS:
+            if collection not in records:
+                records[collection] = load_collection(db, user_id, collection, timeout)
+        migration = migration_writes(root_data, existing=records)
+        # Old inline maps win only where the subcollection has nothing yet
+        legacy = split_flat_document(root_data)
+        for collection in SUBCOLLECTIONS:
+            merged = dict(legacy[collection])
+            merged.update(records.get(collection, {}))
+            records[collection] = merged
+
+    return root_data, records, migration
@@ -0,0 +1,201 @@
+"""
+📡 Annapurna Voice Command Channel
+Delivers commands written by voice_listener_firebase.py to the Streamlit
+app with a Firestore on_snapshot listener instead of polling.
+
+Commands live under users/{uid}/voice_commands, so each user only sees
+their own. One listener runs per user per process; every app session
+with voice enabled gets its own in-memory inbox. Claiming a command is
+a precondition update (only succeeds if nobody changed the doc since we
+saw it), so two sessions can never both run the same command.
+Processed and expired commands are deleted by a background sweeper.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from firebase_admin import firestore
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from listener_hub import ListenerHub
+
+VOICE_COMMANDS_COLLECTION = "voice_commands"
+COMMAND_TTL = timedelta(minutes=10)   # unclaimed commands older than this are dropped
+INBOX_TTL = 600          # seconds an inbox survives without being polled
+CLAIMED_MEMORY = 500     # how many claimed command ids to remember
+SWEEP_INTERVAL = 300     # seconds between compaction passes
+SWEEP_BATCH = 200        # deletes per batch
+
+
+def voice_commands_ref(db, user_id):
+    """users/{uid}/voice_commands"""
+    return db.collection("users").document(user_id).collection(VOICE_COMMANDS_COLLECTION)
+
+
+def save_voice_command(db, user_id, text):
+    """Write one command for the app sessions of `user_id`"""
+    doc_ref = voice_commands_ref(db, user_id).document()
+    doc_ref.set({
+        "text": text,
+        "timestamp": datetime.now().isoformat(),
+        "processed": False,
+        "created_at": firestore.SERVER_TIMESTAMP,
+        # Also usable by a Firestore TTL policy on this field
+        "expires_at": datetime.now(timezone.utc) + COMMAND_TTL,
+    })
+    return doc_ref
+
+
+def _is_expired(data):
+    expires_at = data.get("expires_at")
+    return expires_at is not None and expires_at < datetime.now(timezone.utc)
+
+
+def sweep_voice_commands(db, user_id, batch_size=SWEEP_BATCH):
+    """Delete processed and expired commands for one user. Returns how many were deleted."""
+    commands = voice_commands_ref(db, user_id)
+    now = datetime.now(timezone.utc)
+    deleted = 0
+
+    for query in (commands.where("processed", "==", True),
+                  commands.where("expires_at", "<", now)):
+        while True:
+            docs = list(query.limit(batch_size).stream())
+            if not docs:
+                break
+            batch = db.batch()
+            for doc in docs:
+                batch.delete(doc.reference)
+            batch.commit()
+            deleted += len(docs)
+            if len(docs) < batch_size:
+                break
+    return deleted
+
+
+class VoiceCommandHub(ListenerHub):
+    """Per-user on_snapshot listeners fanned out to per-session inboxes"""
+
+    listener_name = "Voice"
+
+    def __init__(self, db, inbox_ttl=INBOX_TTL, sweep_interval=SWEEP_INTERVAL):
+        super().__init__(db, inbox_ttl)
+        self.sweep_interval = sweep_interval
+        self._inboxes = {}              # session_id -> deque of commands
+        self._claimed = OrderedDict()   # command id -> True (bounded)
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    # ───────────── subscriptions ─────────────
+
+    def subscribe(self, session_id, user_id):
+        """Create the session's inbox and make sure the user's listener is running"""
+        with self._lock:
+            if session_id not in self._inboxes or self._sessions.get(session_id) != user_id:
+                self._inboxes[session_id] = deque()  # new session, or same browser session with a different account
+            super().subscribe(session_id, user_id)
+            self._ensure_sweeper()
+
+    def _watch(self, user_id):
+        query = voice_commands_ref(self.db, user_id).where("processed", "==", False)
+        return query.on_snapshot(lambda docs, changes, read_time: self._on_snapshot(user_id, changes))
+
+    def _session_ended(self, session_id):
+        self._inboxes.pop(session_id, None)
+
+    # ───────────── listener callback (runs on Firestore's thread) ─────────────
+
+    def _on_snapshot(self, user_id, changes):
+        added = []
+        removed = set()
+        for change in changes:
+            doc = change.document
+            if change.type.name == "ADDED":
+                data = doc.to_dict()
+                if _is_expired(data):
+                    continue
+                added.append({
+                    "id": doc.id,
+                    "text": data.get("text", ""),
+                    "ref": doc.reference,
+                    "update_time": doc.update_time,
+                    "created_at": data.get("timestamp", ""),
+                })
+            elif change.type.name == "REMOVED":
+                removed.add(doc.id)  # claimed somewhere else / deleted
+
+        added.sort(key=lambda command: command["created_at"])
+        with self._lock:
+            added = [command for command in added if command["id"] not in self._claimed]
+            for session_id, commands in self._inboxes.items():
+                if self._sessions.get(session_id) != user_id:
+                    continue
+                if removed:
+                    kept = [command for command in commands if command["id"] not in removed]
+                    commands.clear()
+                    commands.extend(kept)
+                commands.extend(added)
+
+    # ───────────── used by the app ─────────────
+
+    def poll(self, session_id):
+        """Return the next command text for this session (or None). Never blocks on Firestore reads."""
+        while True:
+            with self._lock:
+                if session_id not in self._inboxes:
+                    return None
+                self.touch(session_id)
+                idle_watches = self._expire_sessions(time.time())
+                commands = self._inboxes.get(session_id, ())
+                candidate = None
+                while commands:
+                    command = commands.popleft()
+                    if command["id"] not in self._claimed:
+                        candidate = command
+                        break
+
+            for watch in idle_watches:
+                self._close(watch)
+            if candidate is None:
+                return None
+            if self._claim(candidate):
+                return candidate["text"]
+
+    def _claim(self, command):
+        """
+        Atomic claim: the update only applies if the doc is unchanged since
+        the listener saw it. Whoever loses the race gets FailedPrecondition.
+        """
+        try:
+            command["ref"].update(
+                {"processed": True, "processed_at": firestore.SERVER_TIMESTAMP},
+                option=self.db.write_option(last_update_time=command["update_time"]),
+            )
+        except (FailedPrecondition, NotFound):
+            return False  # another session got it first
+        except Exception as e:
+            print(f"Couldn't claim voice command: {str(e)}")
+            return False
+
+        with self._lock:
+            self._claimed[command["id"]] = True
+            while len(self._claimed) > CLAIMED_MEMORY:
+                self._claimed.popitem(last=False)
+        return True
+
+    # ───────────── TTL sweeper ─────────────
+
+    def _ensure_sweeper(self):
+        if self._sweeper is None or not self._sweeper.is_alive():
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="voice-command-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            with self._lock:
+                user_ids = list(self._watches)
+            for user_id in user_ids:
+                try:
+                    sweep_voice_commands(self.db, user_id)
+                except Exception as e:
+                    print(f"Voice command sweep failed for {user_id}: {str(e)}")
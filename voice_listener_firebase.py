@@ -5,72 +5,69 @@ When it hears you, it saves your command to FIREBASE (not a file!)
 This way, the Streamlit Cloud app can see your commands from anywhere!
 
 HOW TO USE:
-1. Run this file: python voice_listener_firebase.py
+1. Run this file: python voice_listener_firebase.py --user YOUR_USER_ID
+   (the app shows your user id in the Voice Assistant section)
 2. Leave it running (don't close the window)
 3. Say "Annapurna" followed by your command
 4. Your Streamlit app (even on cloud!) will respond!
 """
 
 import speech_recognition as sr
-import firebase_admin
-from firebase_admin import credentials, firestore
-from datetime import datetime
+import argparse
 import os
-import json
+from firestore_admin import CredentialsMissing, connect, print_credentials_help
+from voice_channel import save_voice_command
 
 # ═══════════════════════════════════════════════════════════════
-# FIREBASE SETUP
+# VOICE LISTENER CONFIGURATION
 # ═══════════════════════════════════════════════════════════════
 
-print("=" * 60)
-print("🔥 Initializing Firebase...")
-print("=" * 60)
-
-# Check if firebase credentials file exists
-if not os.path.exists("firebase_credentials.json"):
-    print()
-    print("❌ ERROR: firebase_credentials.json NOT FOUND!")
-    print()
-    print("📝 INSTRUCTIONS:")
-    print("1. Go to Firebase Console: https://console.firebase.google.com")
-    print("2. Select your project")
-    print("3. Go to Project Settings → Service Accounts")
-    print("4. Click 'Generate New Private Key'")
-    print("5. Save the downloaded file as 'firebase_credentials.json'")
-    print("6. Put it in the same folder as this script")
-    print()
-    input("Press Enter to exit...")
-    exit(1)
-
-# Initialize Firebase
-try:
-    cred = credentials.Certificate("firebase_credentials.json")
-    firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    print("✅ Firebase connected successfully!")
-    print()
-except Exception as e:
-    print(f"❌ Firebase initialization failed: {str(e)}")
-    input("Press Enter to exit...")
-    exit(1)
+WAKE_WORDS = ["annapurna", "anna purna", "anna poorna", "anapurna"]
 
 # ═══════════════════════════════════════════════════════════════
-# VOICE LISTENER CONFIGURATION
+# WHICH USER GETS THE COMMANDS / FIREBASE SETUP
 # ═══════════════════════════════════════════════════════════════
 
-WAKE_WORDS = ["annapurna", "anna purna", "anna poorna", "anapurna"]
+def get_user_id():
+    """--user, ANNAPURNA_USER_ID, or ask"""
+    parser = argparse.ArgumentParser(description="Annapurna voice listener")
+    parser.add_argument("--user", default=os.environ.get("ANNAPURNA_USER_ID"),
+                        help="Your Annapurna user id (or set ANNAPURNA_USER_ID)")
+    args = parser.parse_args()
+
+    user_id = args.user
+    if not user_id:
+        print("💡 Your user id is shown in the app under 🎤 Voice Assistant Mode")
+        user_id = input("Enter your Annapurna user id: ").strip()
+    if not user_id:
+        print("❌ ERROR: A user id is required so only YOUR app sessions get your commands")
+        exit(1)
+    return user_id
+
+def connect_firebase():
+    print("=" * 60)
+    print("🔥 Initializing Firebase...")
+    print("=" * 60)
 
-def save_command_to_firebase(command_text):
+    try:
+        db = connect()
+        print("✅ Firebase connected successfully!")
+        print()
+        return db
+    except CredentialsMissing:
+        print_credentials_help()
+        input("Press Enter to exit...")
+        exit(1)
+    except Exception as e:
+        print(f"❌ Firebase initialization failed: {str(e)}")
+        input("Press Enter to exit...")
+        exit(1)
+
+def save_command_to_firebase(db, user_id, command_text):
     """Save voice command to Firebase for Streamlit to read"""
     try:
-        # Create a new document in 'voice_commands' collection
-        doc_ref = db.collection('voice_commands').document()
-        doc_ref.set({
-            'text': command_text,
-            'timestamp': datetime.now().isoformat(),
-            'processed': False,
-            'created_at': firestore.SERVER_TIMESTAMP
-        })
+        # New document in users/{user_id}/voice_commands
+        save_voice_command(db, user_id, command_text)
         
         print(f"✅ Command saved to Firebase!")
         return True
@@ -148,6 +145,9 @@ def record_command():
 
 def main():
     """Main listening loop"""
+    user_id = get_user_id()
+    db = connect_firebase()
+
     print("=" * 60)
     print("🎤 Annapurna Voice Listener Started! (Firebase Version)")
     print("=" * 60)
@@ -156,7 +156,7 @@ def main():
     print("💡 Say 'Annapurna' followed by your command")
     print("💡 Example: 'Annapurna, how do I make pasta?'")
     print()
-    print("🌐 Commands will be sent to Firebase")
+    print(f"🌐 Commands will be sent to Firebase for user: {user_id}")
     print("📱 Your Streamlit app (anywhere) will receive them!")
     print()
     print("🛑 Press Ctrl+C to stop")
@@ -182,7 +182,7 @@ def main():
                 
                 if command:
                     # Save to Firebase
-                    if save_command_to_firebase(command):
+                    if save_command_to_firebase(db, user_id, command):
                         print(f"📤 Sent to cloud: '{command}'")
                     else:
                         print("❌ Failed to save command")